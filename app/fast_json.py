@@ -0,0 +1,124 @@
+import asyncio
+import functools
+import hashlib
+import json
+from typing import Any, Callable, Dict, Iterable, List
+
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from app.services.timing import mark, span
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional (requirements.txt lo instala)
+    orjson = None
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content)
+
+    def loads(body: bytes) -> Any:
+        # orjson.JSONDecodeError hereda de json.JSONDecodeError: FastAPI lo trata igual
+        return orjson.loads(body)
+else:
+    FastJSONResponse = JSONResponse
+
+    def dumps(content: Any) -> bytes:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(body: bytes) -> Any:
+        return json.loads(body)
+
+
+class FastJSONRequest(Request):
+    """Request cuyo body JSON se decodifica con orjson (si está instalado)"""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            body = await self.body()
+            with span("decode"):
+                self._json = loads(body)
+        return self._json
+
+
+class FastJSONRoute(APIRoute):
+    """
+    Ruta de FastAPI que decodifica el body con `loads`. Las respuestas rápidas
+    se devuelven como FastJSONResponse desde el endpoint: FastAPI entrega las
+    instancias de Response tal cual, sin pasar por jsonable_encoder ni por el
+    response_model (que queda solo como documentación en /docs).
+
+    En los endpoints async, lo anterior al endpoint (body, validación y
+    dependencias) queda como fase "validation" de Server-Timing.
+    """
+
+    def get_route_handler(self) -> Callable:
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint) and not getattr(endpoint, "timed", False):
+            @functools.wraps(endpoint)
+            async def timed_endpoint(**values):
+                mark("validation")
+                return await endpoint(**values)
+
+            timed_endpoint.timed = True
+            self.dependant.call = timed_endpoint
+        handler = super().get_route_handler()
+
+        async def fast_json_handler(request: Request) -> Response:
+            return await handler(FastJSONRequest(request.scope, request.receive))
+
+        return fast_json_handler
+
+
+class StaticJSON:
+    """
+    Respuesta JSON constante renderizada una sola vez a bytes, con ETag:
+    si el cliente envía If-None-Match con el mismo ETag se responde 304 sin body.
+    """
+
+    def __init__(self, content: Any):
+        self.body = dumps(content)
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+        self.headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+
+    def response(self, request: Request) -> Response:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or self.etag in if_none_match):
+            return Response(status_code=304, headers=self.headers)
+        return Response(self.body, media_type="application/json", headers=self.headers)
+
+
+def _field_name(loc: Iterable) -> str:
+    # ("body", "phoneNumber") → "phoneNumber"; ("header", "x-api-key") → "x-api-key"
+    parts = [str(part) for part in loc if part != "body"]
+    return ".".join(parts) or "body"
+
+
+def _join(names: List[str]) -> str:
+    return names[0] if len(names) == 1 else ", ".join(names[:-1]) + " and " + names[-1]
+
+
+def validation_message(errors: List[Dict]) -> str:
+    """
+    Mensaje de error con el formato que usaban los endpoints al validar a mano:
+    "countryCode and phoneNumber are required" / "Invalid otp: ..."
+    """
+    missing = [
+        _field_name(error["loc"]) for error in errors
+        if error["type"] in ("value_error.missing", "value_error.any_str.min_length")
+    ]
+    if missing:
+        return f"{_join(missing)} are required" if len(missing) > 1 else f"{missing[0]} is required"
+    error = errors[0]
+    if error["type"].startswith("value_error.jsondecode"):
+        return "Invalid JSON body"
+    return f"Invalid {_field_name(error['loc'])}: {error['msg']}"
+
+
+async def validation_exception_handler(request: Request, exc: RequestValidationError) -> Response:
+    """Errores de validación del body como 400 con `detail` legible (no el 422 de FastAPI)"""
+    return FastJSONResponse(status_code=400, content={"detail": validation_message(exc.errors())})
@@ -1,84 +1,195 @@
-from fastapi import FastAPI, HTTPException
-import httpx
-from app.services.otp_service import OTPService
-from app.routes.auth import auth_router
+import asyncio
+import signal
+import time
+from fastapi import FastAPI, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse
+from app.routes.auth import auth_router, otp_service, sms_service
+from app.routes.webhooks import webhooks_router
+from app.services.http_clients import http_clients
+from app.services.delivery_queue import delivery_queue
+from app.services.delivery_receipts import delivery_receipts
+from app.services.otp_journal import otp_journal
+from app.services.health import health_monitor
+from app.services.lifecycle import lifecycle
+from app.services.session_tokens import session_tokens
+from app.services.timing import slow_requests
+from app.services.logger import setup_logging, shutdown_logging, get_logger
+from app.settings import get_settings, reload_settings, on_reload, SettingsError
+from app.services.metrics import (
+    metrics, otp_store_entries, otp_store_load_factor, otp_store_expired, otp_store_evicted,
+    otp_journal_events, otp_journal_commits
+)
+from app.middleware import RequestContextMiddleware, MetricsMiddleware, ServerTimingMiddleware
+from app.fast_json import FastJSONResponse, FastJSONRoute, StaticJSON, validation_exception_handler
 
-app = FastAPI(title="Tijzi Backend", version="1.0.0")
+app = FastAPI(title="Tijzi Backend", version="1.0.0", default_response_class=FastJSONResponse)
+app.router.route_class = FastJSONRoute
+
+# Body inválido o incompleto: 400 con mensaje legible
+app.add_exception_handler(RequestValidationError, validation_exception_handler)
+
+# Latencia por ruta para /metrics
+app.add_middleware(MetricsMiddleware)
+# Desglose por fases (Server-Timing) y registro de peticiones lentas
+app.add_middleware(ServerTimingMiddleware)
+# Id de correlación por petición (X-Request-ID) para los logs estructurados
+app.add_middleware(RequestContextMiddleware)
+
+# Tamaño y expiraciones del almacén OTP: se leen al exportar /metrics
+otp_store_entries.set_function(lambda: {(): otp_service.storage_stats()["entries"]})
+otp_store_load_factor.set_function(
+    lambda: {(): otp_service.storage_stats()["load_factor"]} if otp_service.storage_stats().get("capacity") else {}
+)
+otp_store_expired.set_function(lambda: {(): otp_service.storage_stats().get("expired_total", 0)})
+otp_store_evicted.set_function(lambda: {(): otp_service.storage_stats().get("evicted_total", 0)})
+# Journal de auditoría: lo actualiza su hilo escritor, se lee al exportar
+otp_journal_events.set_function(lambda: {("written",): otp_journal.written_total, ("dropped",): otp_journal.dropped_total})
+otp_journal_commits.set_function(lambda: {(): otp_journal.commits_total})
+
+log = get_logger("app")
+
+def reload_config():
+    """
+    Recarga la configuración de proveedores (señal SIGHUP). Si es inválida se
+    mantiene la anterior.
+    """
+    try:
+        reload_settings()
+    except SettingsError as e:
+        log.error("settings.reload_failed", error=str(e))
+        return
+    log.info("settings.reloaded")
+
+# Los clientes HTTP llevan las credenciales en sus cabeceras: se recrean con
+# la configuración recargada
+on_reload(http_clients.reconfigure)
+
+@app.on_event("startup")
+async def startup():
+    # Logs JSON en segundo plano (cola + hilo escritor)
+    setup_logging()
+    # Configuración validada una vez (lanza SettingsError si está mal formada)
+    get_settings()
+    # Servicios construidos aquí y no al importar: la importación queda sin E/S
+    otp_service.get()
+    sms_service.get()
+    try:
+        loop = asyncio.get_event_loop()
+        loop.add_signal_handler(signal.SIGHUP, reload_config)
+        # SIGTERM drena primero (readiness 503 con el servidor aún escuchando);
+        # reemplaza al manejador de uvicorn, que sigue atendiendo SIGINT
+        loop.add_signal_handler(signal.SIGTERM, lifecycle.drain_on_signal)
+    except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+        # Sin SIGHUP (Windows) o fuera del hilo principal
+        pass
+    # Clientes HTTP compartidos (pool keep-alive por proveedor)
+    await http_clients.startup()
+    # Workers de entrega asíncrona de OTP
+    await delivery_queue.start()
+    # Escritor en lotes de los estados de entrega (webhooks)
+    delivery_receipts.start()
+    # Journal de auditoría OTP (group commit en su propio hilo)
+    otp_journal.start()
+    # Revocaciones de sesión de los otros workers (SESSION_REVOCATION_STORAGE)
+    session_tokens.start()
+    # Sondeo en segundo plano de los proveedores (para /health/deep)
+    await health_monitor.start()
+    # DNS y conexiones TLS abiertas antes de aceptar tráfico (HTTP_WARMUP=true)
+    if http_clients.warmup_enabled:
+        log.info("http.warmup", hosts=await http_clients.warm_up())
+    # Desde aquí /health/ready responde 200
+    lifecycle.mark_ready()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Uvicorn ya dejó de aceptar conexiones y esperó a las peticiones abiertas.
+    # Con SIGTERM el drenaje empezó antes (drain_on_signal); con SIGINT empieza aquí
+    lifecycle.begin_drain()
+    await health_monitor.stop()
+    # Entregas encoladas y envíos en curso (también los de clientes que se
+    # desconectaron): un único plazo SHUTDOWN_DRAIN_SECONDS para todo
+    deadline = time.monotonic() + lifecycle.drain_timeout
+    await delivery_queue.stop(timeout=lifecycle.drain_timeout)
+    abandoned = await lifecycle.wait_idle(deadline - time.monotonic())
+    if abandoned:
+        log.warning("shutdown.sends_abandoned", in_flight=abandoned)
+    await http_clients.shutdown()
+    # Estado en memoria a disco: estados de entrega, almacén OTP y journal
+    delivery_receipts.close()
+    if otp_service.built:
+        otp_service.close()
+    session_tokens.close()
+    otp_journal.close()
+    lifecycle.mark_stopped()
+    log.info("shutdown.complete", abandoned_sends=abandoned, **otp_journal.stats())
+    # Último paso: vaciar la cola de logs
+    shutdown_logging()
 
 # Incluir router de autenticación
 app.include_router(auth_router)
+# Webhooks de estado de entrega (Twilio y WhatsApp)
+app.include_router(webhooks_router)
+
+# Respuestas constantes: renderizadas una vez a bytes y servidas con ETag
+ROOT_RESPONSE = StaticJSON({
+    "message": "Tijzi Backend is working!",
+    "status": "OK",
+    "version": "1.0.0",
+    "endpoints": [
+        "/",
+        "/health",
+        "/health/ready",
+        "/health/deep",
+        "/metrics",
+        "/debug/slow-requests",
+        "/auth/send-code",
+        "/auth/verify-code"
+    ]
+})
 
-# Instancia global del servicio OTP
-otp_service = OTPService()
+HEALTH_RESPONSE = StaticJSON({
+    "status": "healthy",
+    "service": "tijzi-backend",
+    "version": "1.0.0"
+})
 
 @app.get("/")
-def read_root():
-    return {
-        "message": "Tijzi Backend is working!", 
-        "status": "OK",
-        "version": "1.0.0",
-        "endpoints": [
-            "/", 
-            "/health", 
-            "/auth/send-code", 
-            "/auth/verify-code"
-        ]
-    }
+def read_root(request: Request):
+    return ROOT_RESPONSE.response(request)
 
 @app.get("/health")
-def health_check():
-    return {
-        "status": "healthy", 
-        "service": "tijzi-backend",
-        "version": "1.0.0"
-    }
-
-@app.post("/test-otp")
-def test_otp_service(request: dict):
+def health_check(request: Request):
+    return HEALTH_RESPONSE.response(request)
+
+@app.get("/health/ready")
+def readiness_check():
+    """
+    Readiness para el balanceador: 200 solo cuando el arranque terminó y el
+    proceso no se está apagando (503 en "starting" y "draining").
+    /health es la liveness: responde mientras el proceso esté vivo.
+    """
+    return FastJSONResponse(lifecycle.snapshot(), status_code=200 if lifecycle.ready else 503)
+
+@app.get("/health/deep")
+def deep_health_check():
+    """
+    Estado de WhatsApp y Twilio según el último sondeo y sus circuit breakers.
+    Responde desde memoria, sin llamar a los proveedores.
+    """
+    return health_monitor.snapshot()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """
+    Métricas del proceso en formato texto de Prometheus
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/slow-requests")
+def slow_requests_endpoint():
     """
-    Test del servicio OTP (útil para desarrollo)
-    Body: {"phoneNumber": "+573001234567", "action": "generate|verify|status"}
+    Últimas peticiones que superaron SLOW_REQUEST_MS, con sus fases
+    (mismos nombres que la cabecera Server-Timing). Solo memoria del proceso.
     """
-    phone_number = request.get("phoneNumber", "+573001234567")
-    action = request.get("action", "generate")
-    
-    if action == "generate":
-        code = otp_service.generate_and_store_code(phone_number)
-        return {
-            "status": "OTP generated",
-            "phone_number": phone_number,
-            "code": code,
-            "message": "Code generated successfully"
-        }
-    
-    elif action == "verify":
-        code = request.get("code")
-        if not code:
-            raise HTTPException(status_code=400, detail="Code is required for verification")
-        
-        is_valid = otp_service.verify_code(phone_number, code)
-        if is_valid:
-            token = otp_service.generate_token(phone_number)
-            return {
-                "status": "verified",
-                "valid": True,
-                "token": token,
-                "phone_number": phone_number
-            }
-        else:
-            return {
-                "status": "invalid",
-                "valid": False,
-                "message": "Invalid or expired code"
-            }
-    
-    elif action == "status":
-        stored_codes = otp_service.get_stored_codes()
-        return {
-            "status": "debug_info",
-            "stored_codes": stored_codes,
-            "total_codes": len(stored_codes)
-        }
-    
-    else:
-        raise HTTPException(status_code=400, detail="Invalid action. Use: generate, verify, or status")
\ No newline at end of file
+    return slow_requests.snapshot()
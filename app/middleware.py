@@ -0,0 +1,134 @@
+import os
+import re
+import time
+from app.services.logger import request_id_var, new_request_id
+from app.services.metrics import http_request_duration
+from app.services.timing import RequestTiming, slow_requests, timing_var
+
+# Ids de correlación aceptados desde el cliente / proxy
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestContextMiddleware:
+    """
+    Middleware ASGI que asigna un id de correlación a cada petición.
+
+    Usa X-Request-ID si llega uno válido o genera uno nuevo; queda disponible
+    para los logs vía `request_id_var` y se devuelve en la respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_RE.match(candidate):
+                    request_id = candidate
+                break
+        request_id = request_id or new_request_id()
+        header = (b"x-request-id", request_id.encode("latin-1"))
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [header]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide la latencia de cada petición por método, ruta y estado.
+
+    La etiqueta es la plantilla de la ruta (`/auth/delivery/{delivery_id}`), no la
+    URL concreta, para que el número de series quede acotado.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = {}
+
+    def _route_label(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._routes.get(endpoint)
+        if path is None:
+            # El router deja el endpoint en el scope; su plantilla se busca una vez
+            for route in getattr(scope.get("app"), "routes", []):
+                self._routes[getattr(route, "endpoint", None)] = getattr(route, "path", "unmatched")
+            path = self._routes.get(endpoint, "unmatched")
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_request_duration.observe(
+                time.perf_counter() - started, scope["method"], self._route_label(scope), str(status)
+            )
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware ASGI que mide las fases de cada petición (app.services.timing)
+    y las devuelve en la cabecera Server-Timing. Las peticiones que superan
+    SLOW_REQUEST_MS quedan, con todas sus fases, en `slow_requests`
+    (GET /debug/slow-requests). SERVER_TIMING=false omite la cabecera.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.header_enabled = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes", "on")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.header_enabled:
+                    # Fases hasta las cabeceras (en streaming, el resto solo queda en slow_requests)
+                    header = (b"server-timing", timing.server_timing(timing.elapsed()).encode("latin-1"))
+                    message["headers"] = list(message.get("headers", [])) + [header]
+            await send(message)
+
+        token = timing_var.set(timing)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            timing_var.reset(token)
+            slow_requests.maybe_record(
+                timing, timing.elapsed(),
+                request_id=request_id_var.get(), method=scope["method"], path=scope["path"], status=status,
+            )
@@ -1,212 +1,262 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.requests import ClientDisconnect
 from app.services.otp_service import OTPService
 from app.services.sms_service import SMSService
-import httpx
+from app.services.http_clients import http_clients
+from app.services.outbound import provider_post
+from app.services.lazy import Lazy
+from app.services.lifecycle import require_accepting
+from app.services.delivery_queue import delivery_queue, DeliveryQueueFull
+from app.services.throttle import resend_throttle
+from app.services.dedup import request_dedup
+from app.services.deadline import deadline, with_deadline
+from app.services.timing import span
+from app.services.delivery_policy import delivery_policy
+from app.services.delivery_receipts import delivery_receipts
+from app.services.otp_journal import otp_journal
+from app.services.bulk import RecordReader, RequestStreamingResponse, fan_out, BULK_CONCURRENCY
+from app.services.languages import SUPPORTED_LANGUAGES
+from app.services.phone import normalize_phone, InvalidPhoneNumber
+from app.services.whatsapp_payloads import JSON_HEADERS
+from app.services.logger import get_logger
+from app.services.session_tokens import session_tokens, require_session
+from app.services.metrics import otp_send_total, otp_verify_total
+from app.settings import get_settings, on_reload
+from app.fast_json import FastJSONResponse, FastJSONRoute, StaticJSON, dumps
+from app.schemas import (
+    SendCodeRequest, VerifyCodeRequest, VerifySMSRequest, MultilingualRequest,
+    MessageResponse, SessionResponse, SMSSentResponse, SMSVerifiedResponse,
+    MultilingualResponse, QueuedResponse, SupportedLanguagesResponse, ErrorResponse
+)
+import hmac
 import os
+from typing import Optional
 
-# Router para endpoints de autenticación
-auth_router = APIRouter(prefix="/auth", tags=["authentication"])
+# Router para endpoints de autenticación (body decodificado y respuestas con orjson)
+auth_router = APIRouter(
+    prefix="/auth",
+    tags=["authentication"],
+    route_class=FastJSONRoute,
+    default_response_class=FastJSONResponse,
+    responses={400: {"model": ErrorResponse}}
+)
 
-# Instancia del servicio SMS
-sms_service = SMSService()
+# Respuesta 202 de los endpoints de envío en modo async
+QUEUED = {202: {"model": QueuedResponse}}
+# Los endpoints de envío responden 503 mientras el proceso se apaga
+ACCEPTING = [Depends(require_accepting)]
+
+# Loggers estructurados (JSON, teléfonos y códigos redactados)
+log = get_logger("auth")
+wa_log = get_logger("whatsapp")
+
+# Servicios SMS y OTP: se construyen en el startup de la app, no al importar
+# (el OTP abre su almacén; el SMS valida la configuración)
+sms_service = Lazy(SMSService)
+otp_service = Lazy(OTPService)  # compartido con app.main
+
+def reconfigure_sms(settings):
+    """Recarga de configuración: si el servicio SMS aún no existe tomará la nueva al construirse"""
+    if sms_service.built:
+        sms_service.configure(settings)
+
+on_reload(reconfigure_sms)
+
+# Modo de entrega: "sync" espera al proveedor, "async" encola el envío y responde 202
+DELIVERY_MODE = os.getenv("OTP_DELIVERY_MODE", "sync").lower()
+
+def e164_or_400(country_code, phone_number) -> str:
+    """countryCode + phoneNumber normalizados a E.164 (clave única del almacén OTP) o 400"""
+    try:
+        return normalize_phone(str(country_code), str(phone_number))
+    except InvalidPhoneNumber as e:
+        raise HTTPException(status_code=400, detail=f"Invalid phone number: {e}")
+
+def record_send(channel: str, language, success: bool, phone_number: str):
+    """Resultado de un envío para /metrics y el journal (idioma "default" si el endpoint no lo recibe)"""
+    otp_send_total.inc(channel, language or "default", "sent" if success else "failed")
+    otp_journal.append("sent" if success else "send_failed", phone_number, channel=channel, language=language)
+
+def refund_on_failure(send, channel: str, full_phone_number: str):
+    """`send` que devuelve el cooldown de reenvío si el mensaje no sale"""
+    async def run() -> dict:
+        try:
+            result = await send()
+        except BaseException:
+            resend_throttle.refund(channel, full_phone_number)
+            raise
+        if not result.get("success"):
+            resend_throttle.refund(channel, full_phone_number)
+        return result
+    return run
+
+def queue_delivery(send, channel: str, language, full_phone_number: str) -> FastJSONResponse:
+    """
+    Encola el envío en el pool de workers y responde 202 con el id de entrega.
+    Si el envío falla (o no cabe en la cola) se devuelve el cooldown de `channel`.
+    """
+    try:
+        # El plazo del envío cuenta desde que lo toma un worker
+        job = delivery_queue.submit(
+            with_deadline(refund_on_failure(send, channel, full_phone_number)),
+            channel, language, "***" + full_phone_number[-4:],
+        )
+    except DeliveryQueueFull:
+        resend_throttle.refund(channel, full_phone_number)
+        raise HTTPException(status_code=503, detail="Delivery queue is full, try again later")
+    
+    log.info("delivery.queued", channel=channel, delivery_id=job.id)
+    
+    return FastJSONResponse(
+        status_code=202,
+        content={
+            "success": True,
+            "message": "OTP queued for delivery",
+            "delivery_id": job.id,
+            "status_url": f"/auth/delivery/{job.id}",
+            "channel": channel,
+            "language": language,
+            "expires_in": "5 minutes"
+        }
+    )
+
+def graph_message_id(response) -> Optional[str]:
+    """wamid del mensaje aceptado por Graph ({"messages": [{"id": "wamid..."}]}), clave de sus estados"""
+    try:
+        return response.json()["messages"][0]["id"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
 
-# Instancia del servicio OTP
-otp_service = OTPService()
 async def send_whatsapp_otp(phone_number: str, otp_code: str) -> bool:
     """
-    Envía código OTP vía WhatsApp adaptando el payload según el template configurado
+    Envía código OTP vía WhatsApp con el payload del template configurado (TEMPLATE_NAME)
     """
     try:
-        # Obtener credenciales de variables de entorno
-        access_token = os.getenv("ACCESS_TOKEN")
-        phone_number_id = os.getenv("PHONE_NUMBER_ID")
-        template_name = os.getenv("TEMPLATE_NAME", "otp_tijzi")
-        
-        print(f"🔥 [WhatsApp] Template: {template_name}")
-        print(f"🔥 [WhatsApp] Access Token Length: {len(access_token) if access_token else 0}")
-        print(f"🔥 [WhatsApp] Phone Number ID: {phone_number_id}")
+        settings = get_settings()
         
-        if not access_token or not phone_number_id:
-            print("🔥 [WhatsApp ERROR] Missing credentials")
+        if not settings.whatsapp_configured:
+            wa_log.error("whatsapp.missing_credentials")
             return False
         
-        # URL base para WhatsApp API v22.0
-        base_url = f"https://graph.facebook.com/v22.0/{phone_number_id}/messages"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
-        
-        # Limpiar número de teléfono (remover +)
+        # Payload precompilado al cargar la configuración: solo se rellenan número y código
+        template = settings.whatsapp_payloads.default
         clean_phone = phone_number.replace("+", "")
         
-        # Adaptar payload según template
-        if template_name == "hello_world":
-            # Template de prueba: Sin parámetros
-            payload = {
-                "messaging_product": "whatsapp",
-                "to": clean_phone,
-                "type": "template",
-                "template": {
-                    "name": template_name,
-                    "language": {"code": "en_US"}
-                }
-            }
-            print(f"🔥 [WhatsApp] Using hello_world template")
-            
-        elif template_name in ["otp_login", "otp_tijzi", "otp_login_whatsapp"]:
-            # Templates OTP: Con body y button components
-            language_code = "es_CO" if template_name == "otp_tijzi_login" else "es"
-            payload = {
-                "messaging_product": "whatsapp",
-                "to": clean_phone,
-                "type": "template",
-                "template": {
-                    "name": template_name,
-                    "language": {"code": language_code},
-                    "components": [
-                        {
-                            "type": "body",
-                            "parameters": [{
-                                "type": "text", 
-                                "text": otp_code
-                            }]
-                        },
-                        {
-                            "type": "button",
-                            "sub_type": "url",
-                            "index": "0",
-                            "parameters": [{
-                                "type": "text",
-                                "text": otp_code
-                            }]
-                        }
-                    ]
-                }
-            }
-            print(f"🔥 [WhatsApp] Using OTP template with components")
-            
+        wa_log.debug("whatsapp.sending", phone=clean_phone, template=template.template_name)
+        
+        with span("payload"):
+            content = template.render(clean_phone, otp_code)
+        
+        # Enviar mensaje vía WhatsApp API (cliente compartido con keep-alive)
+        response = await provider_post(
+            http_clients.whatsapp, "whatsapp", "default", settings.phone_number_id, settings.whatsapp_messages_url,
+            operation="graph_messages", content=content, headers=JSON_HEADERS
+        )
+        
+        wa_log.debug("whatsapp.response", status=response.status_code, body=response.text)
+        
+        if response.status_code == 200:
+            wa_log.info("whatsapp.sent", phone=phone_number)
+            delivery_receipts.record_send(graph_message_id(response), "whatsapp", None, phone_number)
+            return True
         else:
-            # Template desconocido: estructura básica
-            payload = {
-                "messaging_product": "whatsapp",
-                "to": clean_phone,
-                "type": "template",
-                "template": {
-                    "name": template_name,
-                    "language": {"code": "es"}
-                }
-            }
-            print(f"🔥 [WhatsApp] Using basic template structure")
-
-        print(f"🔥 [WhatsApp] Sending to: {clean_phone}")
-        
-        # Enviar mensaje vía WhatsApp API
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                base_url,
-                json=payload,
-                headers=headers,
-                timeout=30.0
-            )
-            
-            print(f"🔥 [WhatsApp] Status: {response.status_code}")
-            print(f"🔥 [WhatsApp] Response: {response.text}")
-            
-            if response.status_code == 200:
-                print(f"🔥 [WhatsApp SUCCESS] Message sent to {phone_number}")
-                return True
-            else:
-                print(f"🔥 [WhatsApp ERROR] Failed with status {response.status_code}")
-                return False
+            wa_log.error("whatsapp.failed", status=response.status_code, body=response.text)
+            return False
             
     except Exception as e:
-        print(f"🔥 [WhatsApp EXCEPTION] {str(e)}")
+        wa_log.error("whatsapp.exception", error=str(e))
         return False
 
-@auth_router.post("/send-code")
-async def send_code(request: dict):
+@auth_router.post("/send-code", response_model=MessageResponse, responses=QUEUED, dependencies=ACCEPTING)
+async def send_code(request: SendCodeRequest, http_request: Request):
     """
     Envía código OTP vía WhatsApp
     Body: {"countryCode": "+57", "phoneNumber": "3004051582"}
     """
     try:
-        country_code = request.get("countryCode")
-        phone_number = request.get("phoneNumber")
+        # Número en E.164 validado (rechaza números imposibles antes de llamar al proveedor)
+        full_phone_number = e164_or_400(request.countryCode, request.phoneNumber)
         
-        if not country_code or not phone_number:
-            raise HTTPException(
-                status_code=400, 
-                detail="countryCode and phoneNumber are required"
-            )
+        async def handle():
+            # Límites de reenvío (antes de cualquier llamada al proveedor)
+            with span("throttle"):
+                resend_throttle.enforce("whatsapp", full_phone_number, http_request)
         
-        # Combinar código de país + número
-        full_phone_number = country_code + phone_number
+            # Generar código OTP
+            with span("otp_generate"):
+                code = await otp_service.generate_and_store_code_async(full_phone_number)
         
-        # Generar código OTP
-        code = otp_service.generate_and_store_code(full_phone_number)
+            log.debug("otp.generated", channel="whatsapp", phone=full_phone_number)
         
-        print(f"🔥 [DEBUG] Generated OTP: {code} for {full_phone_number}")
+            async def send():
+                sent = await send_whatsapp_otp(full_phone_number, code)
+                record_send("whatsapp", None, sent, full_phone_number)
+                return {"success": sent}
         
-        # Enviar vía WhatsApp
-        success = await send_whatsapp_otp(full_phone_number, code)
+            if DELIVERY_MODE == "async":
+                return queue_delivery(send, "whatsapp", None, full_phone_number)
         
-        if not success:
-            print(f"🔥 [ERROR] Failed to send WhatsApp to {full_phone_number}")
-            raise HTTPException(
-                status_code=500, 
-                detail="Failed to send WhatsApp message. Check logs for details."
-            )
+            # Enviar vía WhatsApp (si no sale, se devuelve el cooldown)
+            result = await refund_on_failure(send, "whatsapp", full_phone_number)()
+        
+            if not result["success"]:
+                log.error("otp.send_failed", channel="whatsapp", phone=full_phone_number)
+                raise HTTPException(
+                    status_code=500, 
+                    detail="Failed to send WhatsApp message. Check logs for details."
+                )
         
-        print(f"🔥 [SUCCESS] OTP sent to {full_phone_number}")
+            log.info("otp.sent", channel="whatsapp", phone=full_phone_number)
         
-        return {"message": "Code sent successfully"}
+            return FastJSONResponse({"message": "Code sent successfully"})
+        
+        # Doble toque / reintento: una sola ejecución por número en curso (Idempotency-Key opcional)
+        return await request_dedup.run("send-code", full_phone_number, http_request, request, with_deadline(handle))
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"🔥 [ERROR] Unexpected error: {str(e)}")
+        log.exception("auth.unexpected_error", endpoint="send-code", error=str(e))
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@auth_router.post("/verify-code")
-def verify_code(request: dict):
+@auth_router.post("/verify-code", response_model=SessionResponse)
+async def verify_code(request: VerifyCodeRequest, http_request: Request):
     """
     Verifica código OTP
     Body: {"countryCode": "+57", "phoneNumber": "3004051582", "otp": "123456"}
     """
     try:
-        country_code = request.get("countryCode")
-        phone_number = request.get("phoneNumber")
-        otp = request.get("otp")
-        
-        if not country_code or not phone_number or not otp:
-            raise HTTPException(
-                status_code=400,
-                detail="countryCode, phoneNumber and otp are required"
-            )
-        
-        # Combinar código de país + número
-        full_phone_number = country_code + phone_number
+        # Número en E.164 validado (rechaza números imposibles antes de llamar al proveedor)
+        full_phone_number = e164_or_400(request.countryCode, request.phoneNumber)
+        
+        async def handle():
+            log.debug("otp.verifying", phone=full_phone_number)
+        
+            # Verificar código
+            with span("otp_verify"):
+                valid = await otp_service.verify_code_async(full_phone_number, request.otp)
+            if valid:
+                otp_verify_total.inc("local", "valid")
+                with span("token"):
+                    token = otp_service.generate_token(full_phone_number, method="otp")
+                log.info("otp.verified", phone=full_phone_number)
+            
+                return FastJSONResponse({
+                    "session_token": token,
+                    "user_id": full_phone_number
+                })
+            else:
+                otp_verify_total.inc("local", "invalid")
+                log.warning("otp.invalid", phone=full_phone_number)
+                raise HTTPException(status_code=401, detail="Invalid or expired code")
         
-        print(f"🔥 [DEBUG] Verifying {otp} for {full_phone_number}")
+        # Doble toque / reintento: una sola verificación por número y código en curso (Idempotency-Key opcional)
+        return await request_dedup.run("verify-code", (full_phone_number, request.otp), http_request, request, handle)
         
-        # Verificar código
-        if otp_service.verify_code(full_phone_number, otp):
-            token = otp_service.generate_token(full_phone_number)
-            print(f"🔥 [SUCCESS] Token generated for {full_phone_number}")
-            
-            return {
-                "session_token": token,
-                "user_id": full_phone_number
-            }
-        else:
-            print(f"🔥 [ERROR] Invalid OTP for {full_phone_number}")
-            raise HTTPException(status_code=401, detail="Invalid or expired code")
-            
     except HTTPException:
         raise
     except Exception as e:
-        print(f"🔥 [ERROR] Unexpected error: {str(e)}")
+        log.exception("auth.unexpected_error", endpoint="verify-code", error=str(e))
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @auth_router.get("/debug-config")
@@ -214,123 +264,144 @@ def debug_config():
     """
     Endpoint útil para verificar configuración de variables de entorno
     """
-    access_token = os.getenv("ACCESS_TOKEN")
-    phone_number_id = os.getenv("PHONE_NUMBER_ID")
-    template_name = os.getenv("TEMPLATE_NAME", "otp_tijzi")
+    settings = get_settings()
+    access_token = settings.access_token
     
     return {
         "access_token_configured": bool(access_token),
         "access_token_length": len(access_token) if access_token else 0,
-        "phone_number_id_configured": bool(phone_number_id),
-        "phone_number_id": phone_number_id,
-        "template_name": template_name,
+        "phone_number_id_configured": bool(settings.phone_number_id),
+        "phone_number_id": settings.phone_number_id,
+        "template_name": settings.template_name,
         "backend_status": "✅ Functional"
     }
 
-@auth_router.post("/send-sms")
-async def send_sms_code(request: dict):
+@auth_router.post("/send-sms", response_model=SMSSentResponse, dependencies=ACCEPTING)
+async def send_sms_code(request: SendCodeRequest, http_request: Request):
     """
     Envío SMS usando Twilio Verify (genera código automáticamente)
     Body: {"countryCode": "+57", "phoneNumber": "3004051582"}
     """
     try:
-        country_code = request.get("countryCode")
-        phone_number = request.get("phoneNumber")
+        # Número en E.164 validado (rechaza números imposibles antes de llamar al proveedor)
+        full_phone_number = e164_or_400(request.countryCode, request.phoneNumber)
         
-        if not country_code or not phone_number:
-            raise HTTPException(
-                status_code=400, 
-                detail="countryCode and phoneNumber are required"
-            )
+        async def handle():
+            # Límites de reenvío (antes de cualquier llamada al proveedor)
+            with span("throttle"):
+                resend_throttle.enforce("sms", full_phone_number, http_request)
         
-        # Combinar código de país + número
-        full_phone_number = country_code + phone_number
+            log.debug("sms.verify_send", phone=full_phone_number)
         
-        print(f"🔥 [SMS TEST] Sending Twilio Verify to: {full_phone_number}")
+            # Enviar usando Twilio Verify (ellos generan el código); si no sale, se devuelve el cooldown
+            result = await refund_on_failure(
+                lambda: sms_service.send_verification_code(full_phone_number), "sms", full_phone_number
+            )()
+            record_send("sms_verify", None, result["success"], full_phone_number)
         
-        # Enviar usando Twilio Verify (ellos generan el código)
-        result = await sms_service.send_verification_code(full_phone_number)
+            if not result["success"]:
+                log.error("sms.verify_send_failed", phone=full_phone_number, error=result.get("error"))
+                raise HTTPException(
+                    status_code=500, 
+                    detail=f"Failed to send SMS: {result.get('error')}"
+                )
         
-        if not result["success"]:
-            print(f"🔥 [SMS ERROR] {result.get('error')}")
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Failed to send SMS: {result.get('error')}"
-            )
+            log.info("sms.verify_sent", phone=full_phone_number)
         
-        print(f"🔥 [SMS SUCCESS] Verification sent to {full_phone_number}")
+            return FastJSONResponse({
+                "message": "SMS verification sent successfully",
+                "phone_number": full_phone_number,
+                "method": "Twilio Verify API",
+                "status": result.get("status"),
+                "sid": result.get("sid")
+            })
         
-        return {
-            "message": "SMS verification sent successfully",
-            "phone_number": full_phone_number,
-            "method": "Twilio Verify API",
-            "status": result.get("status"),
-            "sid": result.get("sid")
-        }
+        # Doble toque / reintento: una sola ejecución por número en curso (Idempotency-Key opcional)
+        return await request_dedup.run("send-sms", full_phone_number, http_request, request, with_deadline(handle))
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"🔥 [SMS ERROR] Unexpected error: {str(e)}")
+        log.exception("auth.unexpected_error", endpoint="send-sms", error=str(e))
         raise HTTPException(status_code=500, detail=f"SMS error: {str(e)}")
 
-@auth_router.post("/verify-sms")
-async def verify_sms_code(request: dict):
+@auth_router.post("/verify-sms", response_model=SMSVerifiedResponse)
+async def verify_sms_code(request: VerifySMSRequest, http_request: Request):
     """
     Verificación SMS usando Twilio Verify
     Body: {"countryCode": "+57", "phoneNumber": "3004051582", "code": "123456"}
     """
     try:
-        country_code = request.get("countryCode")
-        phone_number = request.get("phoneNumber")
-        code = request.get("code")
-        
-        if not country_code or not phone_number or not code:
-            raise HTTPException(
-                status_code=400,
-                detail="countryCode, phoneNumber and code are required"
-            )
+        # Número en E.164 validado (rechaza números imposibles antes de llamar al proveedor)
+        full_phone_number = e164_or_400(request.countryCode, request.phoneNumber)
         
-        # Combinar código de país + número
-        full_phone_number = country_code + phone_number
+        async def handle():
+            log.debug("sms.verify_check", phone=full_phone_number)
         
-        print(f"🔥 [SMS Verify] Checking {code} for {full_phone_number}")
+            # Verificar usando Twilio Verify
+            result = await sms_service.verify_code(full_phone_number, request.code)
         
-        # Verificar usando Twilio Verify
-        result = await sms_service.verify_code(full_phone_number, code)
+            if not result["success"]:
+                otp_verify_total.inc("twilio_verify", "error")
+                otp_journal.append("verify_failed", full_phone_number, method="twilio_verify", error=True)
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Verification error: {result.get('error')}"
+                )
         
-        if not result["success"]:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Verification error: {result.get('error')}"
-            )
+            otp_verify_total.inc("twilio_verify", "valid" if result["valid"] else "invalid")
+            otp_journal.append("verified" if result["valid"] else "verify_failed", full_phone_number, method="twilio_verify")
         
-        if result["valid"]:
-            # Generar token de sesión (usando nuestro sistema)
-            token = otp_service.generate_token(full_phone_number)
-            
-            print(f"🔥 [SMS SUCCESS] Code verified for {full_phone_number}")
+            if result["valid"]:
+                # Generar token de sesión (usando nuestro sistema)
+                token = otp_service.generate_token(full_phone_number, method="twilio_verify")
             
-            return {
-                "message": "Code verified successfully",
-                "session_token": token,
-                "user_id": full_phone_number,
-                "method": "Twilio Verify",
-                "status": result.get("status")
-            }
-        else:
-            print(f"🔥 [SMS ERROR] Invalid code for {full_phone_number}")
-            raise HTTPException(
-                status_code=401, 
-                detail=result.get("error", "Invalid or expired code")
-            )
+                log.info("sms.code_verified", phone=full_phone_number)
             
+                return FastJSONResponse({
+                    "message": "Code verified successfully",
+                    "session_token": token,
+                    "user_id": full_phone_number,
+                    "method": "Twilio Verify",
+                    "status": result.get("status")
+                })
+            else:
+                log.warning("sms.code_invalid", phone=full_phone_number)
+                raise HTTPException(
+                    status_code=401, 
+                    detail=result.get("error", "Invalid or expired code")
+                )
+        
+        # Doble toque / reintento: una sola verificación por número y código en curso (Idempotency-Key opcional)
+        return await request_dedup.run("verify-sms", (full_phone_number, request.code), http_request, request, with_deadline(handle))
+        
     except HTTPException:
         raise
     except Exception as e:
-        print(f"🔥 [SMS ERROR] Unexpected error: {str(e)}")
+        log.exception("auth.unexpected_error", endpoint="verify-sms", error=str(e))
         raise HTTPException(status_code=500, detail=f"SMS verification error: {str(e)}")
 
+@auth_router.get("/me")
+def get_session(session: dict = Depends(require_session)):
+    """
+    Datos de la sesión del token (Authorization: Bearer <session_token>)
+    """
+    return {
+        "user_id": session["sub"],
+        "method": session.get("method"),
+        "issued_at": session["iat"],
+        "expires_at": session["exp"]
+    }
+
+@auth_router.post("/logout")
+def logout(session: dict = Depends(require_session)):
+    """
+    Revoca el token de sesión actual hasta su expiración
+    """
+    session_tokens.revoke(session)
+    log.info("session.revoked", user_id=session["sub"])
+    return {"message": "Session revoked"}
+
 @auth_router.get("/sms-debug")
 def sms_debug():
     """
@@ -348,53 +419,6 @@ def sms_debug():
         }
     }
 
-# ==========================================
-# PASO 1: AÑADIR AL FINAL DE auth.py
-# Configuración de idiomas soportados
-# ==========================================
-# ==========================================
-# MENSAJES SMS OPTIMIZADOS PARA AUTO-DETECCIÓN
-# Reemplazar en tu diccionario SUPPORTED_LANGUAGES
-# ==========================================
-
-SUPPORTED_LANGUAGES = {
-    "es": {
-        "name": "Español",
-        "whatsapp_template": "otp_tijzi_es",
-        "whatsapp_language_code": "es",
-        # ✅ FORMATO OPTIMIZADO - código al inicio + palabra clave
-        "sms_message": "{code} es tu código de verificación de Tijzi. Válido por 5 minutos."
-    },
-    "en": {
-        "name": "English", 
-        "whatsapp_template": "otp_tijzi_en",
-        "whatsapp_language_code": "en",
-        # ✅ FORMATO OPTIMIZADO - formato que iOS/Android reconocen
-        "sms_message": "{code} is your Tijzi verification code. Valid for 5 minutes."
-    },
-    "pt": {
-        "name": "Português",
-        "whatsapp_template": "otp_tijzi_pt", 
-        "whatsapp_language_code": "pt_BR",
-        # ✅ FORMATO OPTIMIZADO
-        "sms_message": "{code} é seu código de verificação Tijzi. Válido por 5 minutos."
-    },
-    "it": {
-        "name": "Italiano",
-        "whatsapp_template": "otp_tijzi_it",
-        "whatsapp_language_code": "it",
-        # ✅ FORMATO OPTIMIZADO
-        "sms_message": "{code} è il tuo codice di verifica Tijzi. Valido per 5 minuti."
-    },
-    "fr": {
-        "name": "Français",
-        "whatsapp_template": "otp_tijzi_fr",
-        "whatsapp_language_code": "fr",
-        # ✅ FORMATO OPTIMIZADO
-        "sms_message": "{code} est votre code de vérification Tijzi. Valide 5 minutes."
-    }
-}
-
 # ==========================================
 # PASO 2: AÑADIR DESPUÉS DEL PASO 1
 # Función WhatsApp multi-idioma
@@ -405,98 +429,75 @@ async def send_whatsapp_otp_multilingual(phone_number: str, otp_code: str, langu
     Envía código OTP vía WhatsApp con template según idioma
     """
     try:
-        # Verificar idioma soportado
-        if language not in SUPPORTED_LANGUAGES:
-            print(f"🔥 [WhatsApp ERROR] Unsupported language: {language}")
-            return False
-        
-        lang_config = SUPPORTED_LANGUAGES[language]
+        settings = get_settings()
         
-        # Obtener credenciales
-        access_token = os.getenv("ACCESS_TOKEN")
-        phone_number_id = os.getenv("PHONE_NUMBER_ID")
-        template_name = lang_config["whatsapp_template"]
-        language_code = lang_config["whatsapp_language_code"]
-        
-        print(f"🔥 [WhatsApp] Language: {language} ({lang_config['name']})")
-        print(f"🔥 [WhatsApp] Template: {template_name}")
-        print(f"🔥 [WhatsApp] Language Code: {language_code}")
-        
-        if not access_token or not phone_number_id:
-            print("🔥 [WhatsApp ERROR] Missing credentials")
+        # Payload precompilado del idioma (None si no está soportado)
+        template = settings.whatsapp_payloads.for_language(language)
+        if template is None:
+            wa_log.error("whatsapp.unsupported_language", language=language)
             return False
         
-        # URL para WhatsApp API
-        base_url = f"https://graph.facebook.com/v22.0/{phone_number_id}/messages"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
+        if not settings.whatsapp_configured:
+            wa_log.error("whatsapp.missing_credentials")
+            return False
         
-        # Limpiar número de teléfono
         clean_phone = phone_number.replace("+", "")
         
-        # Payload con template específico del idioma
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": clean_phone,
-            "type": "template",
-            "template": {
-                "name": template_name,
-                "language": {"code": language_code},
-                "components": [
-                    {
-                        "type": "body",
-                        "parameters": [{
-                            "type": "text", 
-                            "text": otp_code
-                        }]
-                    },
-                    {
-                        "type": "button",
-                        "sub_type": "url",
-                        "index": "0",
-                        "parameters": [{
-                            "type": "text",
-                            "text": otp_code
-                        }]
-                    }
-                ]
-            }
-        }
+        wa_log.debug("whatsapp.sending", phone=clean_phone, language=language, template=template.template_name)
         
-        print(f"🔥 [WhatsApp] Sending to: {clean_phone}")
+        with span("payload"):
+            content = template.render(clean_phone, otp_code)
         
-        # Enviar mensaje
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                base_url,
-                json=payload,
-                headers=headers,
-                timeout=30.0
-            )
-            
-            print(f"🔥 [WhatsApp] Status: {response.status_code}")
-            print(f"🔥 [WhatsApp] Response: {response.text}")
-            
-            if response.status_code == 200:
-                print(f"🔥 [WhatsApp SUCCESS] Message sent in {language} to {phone_number}")
-                return True
-            else:
-                print(f"🔥 [WhatsApp ERROR] Failed with status {response.status_code}")
-                return False
+        # Enviar mensaje (cliente compartido con keep-alive)
+        response = await provider_post(
+            http_clients.whatsapp, "whatsapp", "default", settings.phone_number_id, settings.whatsapp_messages_url,
+            operation="graph_messages", content=content, headers=JSON_HEADERS
+        )
+        
+        wa_log.debug("whatsapp.response", status=response.status_code, body=response.text)
+        
+        if response.status_code == 200:
+            wa_log.info("whatsapp.sent", phone=phone_number, language=language)
+            delivery_receipts.record_send(graph_message_id(response), "whatsapp", language, phone_number)
+            return True
+        else:
+            wa_log.error("whatsapp.failed", status=response.status_code, body=response.text)
+            return False
                 
     except Exception as e:
-        print(f"🔥 [WhatsApp EXCEPTION] {str(e)}")
+        wa_log.error("whatsapp.exception", error=str(e))
         return False
 
+async def whatsapp_sender(phone_number: str, otp_code: str, language: str) -> dict:
+    """Adaptador de send_whatsapp_otp_multilingual para la política de entrega"""
+    success = await send_whatsapp_otp_multilingual(phone_number, otp_code, language)
+    record_send("whatsapp", language, success, phone_number)
+    return {"success": success}
+
+async def sms_sender(phone_number: str, otp_code: str, language: str) -> dict:
+    """Adaptador de SMSService.send_sms_multilingual para la política de entrega"""
+    result = await sms_service.send_sms_multilingual(phone_number, otp_code, language, SUPPORTED_LANGUAGES)
+    record_send("sms", language, result["success"], phone_number)
+    if result["success"]:
+        delivery_receipts.record_send(result.get("sid"), "sms", language, phone_number)
+    return result
+
+def configured_senders() -> dict:
+    """Canales con credenciales configuradas, en orden de preferencia"""
+    senders = {}
+    if get_settings().whatsapp_configured:
+        senders["whatsapp"] = whatsapp_sender
+    if sms_service.is_multilingual_configured():
+        senders["sms"] = sms_sender
+    return senders
+
 # ==========================================
 # PASO 3: AÑADIR DESPUÉS DEL PASO 2
 # Endpoint multi-idioma
 # ==========================================
 
-@auth_router.post("/send-otp-multilingual")
-async def send_otp_multilingual(request: dict):
+@auth_router.post("/send-otp-multilingual", response_model=MultilingualResponse, responses=QUEUED, dependencies=ACCEPTING)
+async def send_otp_multilingual(request: MultilingualRequest, http_request: Request):
     """
     Sistema OTP multi-idioma - WhatsApp + SMS
     
@@ -508,19 +509,11 @@ async def send_otp_multilingual(request: dict):
     }
     """
     try:
-        # Obtener parámetros
-        channel = request.get("channel", "whatsapp").lower()
-        country_code = request.get("countryCode")
-        phone_number = request.get("phoneNumber")
-        language = request.get("language", "es").lower()
+        # Parámetros (canal e idioma ya en minúsculas)
+        channel = request.channel
+        language = request.language
         
         # Validaciones
-        if not all([country_code, phone_number, language]):
-            raise HTTPException(
-                status_code=400,
-                detail="countryCode, phoneNumber and language are required"
-            )
-        
         if channel not in ["whatsapp", "sms"]:
             raise HTTPException(
                 status_code=400,
@@ -534,77 +527,227 @@ async def send_otp_multilingual(request: dict):
                 detail=f"Invalid language. Supported: {supported}"
             )
         
-        full_phone_number = country_code + phone_number
+        full_phone_number = e164_or_400(request.countryCode, request.phoneNumber)
         lang_config = SUPPORTED_LANGUAGES[language]
         
-        print(f"🔥 [OTP Multi] Channel: {channel}, Language: {language} ({lang_config['name']}), Phone: {full_phone_number}")
+        async def handle():
+            log.info("otp_multi.request", channel=channel, language=language, phone=full_phone_number)
         
-        # === WHATSAPP MULTI-IDIOMA ===
-        if channel == "whatsapp":
-            if not (os.getenv("ACCESS_TOKEN") and os.getenv("PHONE_NUMBER_ID")):
-                raise HTTPException(status_code=503, detail="WhatsApp service not configured")
-            
-            # Generar código
-            code = otp_service.generate_and_store_code(full_phone_number)
-            
-            # Enviar con template específico del idioma
-            success = await send_whatsapp_otp_multilingual(full_phone_number, code, language)
-            
-            if not success:
-                raise HTTPException(status_code=500, detail=f"Failed to send WhatsApp message in {language}")
-            
-            return {
-                "success": True,
-                "message": "OTP sent successfully",
-                "channel": "whatsapp",
-                "language": language,
-                "language_name": lang_config["name"],
-                "template": lang_config["whatsapp_template"],
-                "recipient": full_phone_number,
-                "expires_in": "5 minutes"
-            }
-        
-        # === SMS MULTI-IDIOMA ===
-        elif channel == "sms":
-            # Verificar si SMS multi-idioma está configurado
-            if not sms_service.is_multilingual_configured():
+            # Canales configurados (el solicitado es el principal, el otro sirve de respaldo)
+            senders = configured_senders()
+        
+            if channel not in senders:
+                if channel == "whatsapp":
+                    raise HTTPException(status_code=503, detail="WhatsApp service not configured")
                 raise HTTPException(
                     status_code=503, 
                     detail="SMS multilingual service not configured. Missing TWILIO_PHONE_NUMBER."
                 )
-            
-            # Generar código OTP usando nuestro sistema
-            code = otp_service.generate_and_store_code(full_phone_number)
-            
-            # Enviar SMS con mensaje personalizado según idioma
-            result = await sms_service.send_sms_multilingual(full_phone_number, code, language, SUPPORTED_LANGUAGES)
-            
+        
+            # Límites de reenvío (antes de cualquier llamada al proveedor)
+            with span("throttle"):
+                resend_throttle.enforce(channel, full_phone_number, http_request)
+        
+            # Generar código (el mismo código sirve para cualquier canal)
+            with span("otp_generate"):
+                code = await otp_service.generate_and_store_code_async(full_phone_number)
+        
+            async def send():
+                return await delivery_policy.deliver(channel, full_phone_number, code, language, senders)
+        
+            if DELIVERY_MODE == "async":
+                return queue_delivery(send, channel, language, full_phone_number)
+        
+            # Si no sale por ningún canal, se devuelve el cooldown
+            with span("delivery"):
+                result = await refund_on_failure(send, channel, full_phone_number)()
+            delivered_channel = result["channel"]
+        
             if not result["success"]:
+                if delivered_channel == "whatsapp":
+                    raise HTTPException(status_code=500, detail=f"Failed to send WhatsApp message in {language}")
                 raise HTTPException(status_code=500, detail=f"Failed to send SMS: {result.get('error')}")
-            
-            return {
-                "success": True,
-                "message": "OTP sent successfully",
-                "channel": "sms",
-                "language": language,
-                "language_name": lang_config["name"],
-                "recipient": "***" + full_phone_number[-4:],
-                "sms_sid": result.get("sid"),
-                "expires_in": "5 minutes",
-                "method": "Twilio SMS Multi-language"
-            }
+        
+            # === WHATSAPP MULTI-IDIOMA ===
+            if delivered_channel == "whatsapp":
+                response = {
+                    "success": True,
+                    "message": "OTP sent successfully",
+                    "channel": "whatsapp",
+                    "language": language,
+                    "language_name": lang_config["name"],
+                    "template": lang_config["whatsapp_template"],
+                    "recipient": full_phone_number,
+                    "expires_in": "5 minutes"
+                }
+        
+            # === SMS MULTI-IDIOMA ===
+            else:
+                response = {
+                    "success": True,
+                    "message": "OTP sent successfully",
+                    "channel": "sms",
+                    "language": language,
+                    "language_name": lang_config["name"],
+                    "recipient": "***" + full_phone_number[-4:],
+                    "sms_sid": result.get("sid"),
+                    "expires_in": "5 minutes",
+                    "method": "Twilio SMS Multi-language"
+                }
+        
+            if result["failover"]:
+                response["requested_channel"] = channel
+                response["failover"] = True
+        
+            return FastJSONResponse(response)
+        
+        # Doble toque / reintento: una sola ejecución por número en curso (Idempotency-Key opcional)
+        return await request_dedup.run("send-otp-multilingual", full_phone_number, http_request, request, with_deadline(handle))
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"🔥 [OTP Multi ERROR] {str(e)}")
+        log.exception("auth.unexpected_error", endpoint="send-otp-multilingual", error=str(e))
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@auth_router.get("/supported-languages")
-def get_supported_languages():
+def check_bulk_api_key(http_request: Request):
+    """El envío por lote requiere X-API-Key igual a BULK_API_KEY (sin ella queda deshabilitado)"""
+    expected = os.getenv("BULK_API_KEY")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Bulk sending disabled (BULK_API_KEY not set)")
+    provided = http_request.headers.get("x-api-key", "")
+    if not hmac.compare_digest(provided.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+def bulk_record(index: int, record: dict, senders: dict) -> dict:
+    """Valida un registro del lote; devuelve el trabajo o un resultado de error"""
+    channel = str(record.get("channel") or "whatsapp").lower()
+    language = str(record.get("language") or "es").lower()
+    country_code = record.get("countryCode")
+    phone_number = record.get("phoneNumber")
+    
+    job = {"index": index, "channel": channel, "language": language}
+    if not country_code or not phone_number:
+        return dict(job, success=False, error="countryCode and phoneNumber are required")
+    if channel not in ["whatsapp", "sms"]:
+        return dict(job, success=False, error="Invalid channel. Options: whatsapp, sms")
+    if language not in SUPPORTED_LANGUAGES:
+        return dict(job, success=False, error="Invalid language")
+    if channel not in senders:
+        return dict(job, success=False, error=f"{channel} service not configured")
+    
+    try:
+        full_phone_number = normalize_phone(str(country_code), str(phone_number))
+    except InvalidPhoneNumber as e:
+        return dict(job, success=False, error=f"Invalid phone number: {e}")
+    return dict(job, phone=full_phone_number)
+
+@auth_router.post("/send-otp-bulk", dependencies=ACCEPTING)
+async def send_otp_bulk(http_request: Request):
     """
-    Lista de idiomas soportados para OTP
+    Envío OTP por lote (campañas de onboarding / re-verificación)
+    
+    Header: X-API-Key: <BULK_API_KEY>
+    Body: [{"countryCode": "+57", "phoneNumber": "3004051582", "language": "es", "channel": "whatsapp"}, ...]
+          o NDJSON (Content-Type: application/x-ndjson), un registro por línea
+    
+    Respuesta: NDJSON en streaming, una línea por registro en cuanto termina
+    (concurrencia máxima BULK_CONCURRENCY) y una línea final con el resumen.
+    """
+    check_bulk_api_key(http_request)
+    
+    # Registros leídos del body a medida que llegan (no se carga entero)
+    reader = RecordReader(http_request.stream(), http_request.headers.get("content-type", ""))
+    records = reader.__aiter__()
+    try:
+        first = await records.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bulk body: {e}")
+    
+    senders = configured_senders()
+    log.info("otp_bulk.request")
+    
+    async def jobs():
+        # El primer registro ya se leyó para poder responder 400 a un body inválido
+        if first is not None:
+            yield bulk_record(0, first, senders)
+        index = 1
+        async for record in records:
+            yield bulk_record(index, record, senders)
+            index += 1
+    
+    async def deliver(job: dict) -> dict:
+        if "success" in job:
+            # Registro inválido: se informa sin generar código
+            return job
+        recipient = "***" + job["phone"][-4:]
+        # Límite, código y envío justo antes del envío de este registro: si el
+        # lote se corta, los registros no enviados no gastan cooldown ni código
+        if resend_throttle.check_phone(job["channel"], job["phone"]) is not None:
+            return {"index": job["index"], "recipient": recipient, "channel": job["channel"], "language": job["language"],
+                    "success": False, "error": "Too many code requests for this number"}
+        code = await otp_service.generate_and_store_code_async(job["phone"])
+        send = refund_on_failure(
+            lambda: delivery_policy.deliver(job["channel"], job["phone"], code, job["language"], senders),
+            job["channel"], job["phone"],
+        )
+        # Cada registro con su propio plazo (REQUEST_DEADLINE_SECONDS)
+        with deadline():
+            result = await send()
+        line = {
+            "index": job["index"],
+            "recipient": recipient,
+            "channel": result["channel"],
+            "language": job["language"],
+            "success": bool(result.get("success")),
+        }
+        if result.get("sid"):
+            line["sid"] = result["sid"]
+        if result["failover"]:
+            line["failover"] = True
+        if not result.get("success"):
+            line["error"] = result.get("error") or "Delivery failed"
+        return line
+    
+    async def stream():
+        total = sent = 0
+        error = None
+        try:
+            async for line in fan_out(jobs(), deliver, BULK_CONCURRENCY):
+                total += 1
+                sent += line["success"]
+                yield dumps(line) + b"\n"
+        except ValueError as e:
+            # Body inválido a mitad del lote: los registros anteriores ya se procesaron
+            error = f"Invalid bulk body: {e}"
+        except ClientDisconnect:
+            log.warning("otp_bulk.client_disconnected", processed=total, sent=sent)
+            return
+        summary = {"total": total, "sent": sent, "failed": total - sent}
+        log.info("otp_bulk.finished", **summary, error=error)
+        if error:
+            yield dumps({"error": error}) + b"\n"
+        yield dumps({"summary": summary}) + b"\n"
+    
+    return RequestStreamingResponse(stream(), reader.done, media_type="application/x-ndjson")
+
+@auth_router.get("/delivery/{delivery_id}")
+def get_delivery_status(delivery_id: str):
     """
+    Estado de una entrega encolada (modo OTP_DELIVERY_MODE=async)
+    Estados: queued → sending → sent | failed
+    """
+    job = delivery_queue.get(delivery_id)
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Delivery not found")
+    
+    return job.to_dict()
+
+def supported_languages_payload() -> dict:
+    """Idiomas soportados para OTP (contenido de /auth/supported-languages)"""
     languages = []
     
     for code, config in SUPPORTED_LANGUAGES.items():
@@ -626,4 +769,14 @@ def get_supported_languages():
             "SMS messages use Twilio Verify standard format",
             "All languages support both WhatsApp and SMS channels"
         ]
-    }
\ No newline at end of file
+    }
+
+# Los idiomas no cambian en ejecución: se renderiza una vez (con ETag)
+SUPPORTED_LANGUAGES_RESPONSE = StaticJSON(supported_languages_payload())
+
+@auth_router.get("/supported-languages", response_model=SupportedLanguagesResponse)
+def get_supported_languages(http_request: Request):
+    """
+    Lista de idiomas soportados para OTP
+    """
+    return SUPPORTED_LANGUAGES_RESPONSE.response(http_request)
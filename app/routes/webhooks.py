@@ -0,0 +1,154 @@
+import base64
+import hashlib
+import hmac
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response
+from app.fast_json import FastJSONResponse, FastJSONRoute, loads
+from app.services.delivery_receipts import delivery_receipts
+from app.services.logger import get_logger
+from app.services.metrics import metrics
+from app.settings import get_settings
+
+# Webhooks de estado de entrega: validan la firma, encolan el evento y responden
+webhooks_router = APIRouter(
+    prefix="/webhooks",
+    tags=["webhooks"],
+    route_class=FastJSONRoute,
+    default_response_class=FastJSONResponse
+)
+
+log = get_logger("webhooks")
+
+webhook_rejected_total = metrics.counter(
+    "tijzi_webhook_rejected_total",
+    "Webhooks rechazados por firma inválida o ausente",
+    ("provider",),
+)
+
+
+def twilio_signature(auth_token: str, url: str, params: Dict[str, List[str]]) -> str:
+    """
+    X-Twilio-Signature: HMAC-SHA1 (base64) de la URL pública seguida de cada
+    parámetro del formulario como nombre+valor, ordenados por nombre
+    """
+    data = url
+    for name in sorted(params):
+        for value in sorted(set(params[name])):
+            data += name + value
+    digest = hmac.new(auth_token.encode(), data.encode(), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode()
+
+
+def public_url(request: Request) -> str:
+    """
+    URL con la que el proveedor llamó al webhook. Detrás del proxy de Render la
+    URL local es http://<interno>: se usa PUBLIC_BASE_URL o X-Forwarded-Proto.
+    """
+    base_url = get_settings().public_base_url
+    path = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    if base_url:
+        return base_url + path
+    scheme = request.headers.get("x-forwarded-proto", request.url.scheme).split(",")[0].strip()
+    host = request.headers.get("host", request.url.netloc)
+    return f"{scheme}://{host}{path}"
+
+
+def _reject(provider: str, reason: str):
+    webhook_rejected_total.inc(provider)
+    log.warning("webhook.rejected", provider=provider, reason=reason)
+    raise HTTPException(status_code=403, detail="Invalid signature")
+
+
+@webhooks_router.post("/twilio/status", status_code=204)
+async def twilio_status(http_request: Request):
+    """
+    Status callback de Twilio (StatusCallback de cada SMS enviado).
+    Body: application/x-www-form-urlencoded con MessageSid, MessageStatus, ErrorCode...
+    """
+    auth_token = get_settings().twilio_auth_token
+    if not auth_token:
+        _reject("twilio", "missing_auth_token")
+
+    body = (await http_request.body()).decode("utf-8", "replace")
+    params: Dict[str, List[str]] = {}
+    for name, value in parse_qsl(body, keep_blank_values=True):
+        params.setdefault(name, []).append(value)
+
+    expected = twilio_signature(auth_token, public_url(http_request), params)
+    provided = http_request.headers.get("x-twilio-signature", "")
+    if not hmac.compare_digest(expected.encode(), provided.encode()):
+        _reject("twilio", "bad_signature")
+
+    message_sid = params.get("MessageSid", [None])[0]
+    status = params.get("MessageStatus", [None])[0]
+    if message_sid and status:
+        error_code = params.get("ErrorCode", [None])[0] or None
+        delivery_receipts.record_status(message_sid, "sms", status, error_code=error_code)
+    return Response(status_code=204)
+
+
+@webhooks_router.get("/whatsapp")
+def whatsapp_subscribe(http_request: Request):
+    """
+    Verificación del webhook al suscribirlo en Meta: devuelve hub.challenge
+    si hub.verify_token coincide con WHATSAPP_WEBHOOK_VERIFY_TOKEN
+    """
+    expected = get_settings().whatsapp_webhook_verify_token
+    query = http_request.query_params
+    token = query.get("hub.verify_token", "")
+    if query.get("hub.mode") != "subscribe" or not expected or not hmac.compare_digest(token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Verification failed")
+    return PlainTextResponse(query.get("hub.challenge", ""))
+
+
+def _whatsapp_statuses(payload: dict) -> List[dict]:
+    # entry[].changes[].value.statuses[] (los mensajes entrantes se ignoran)
+    statuses = []
+    for entry in payload.get("entry") or []:
+        for change in entry.get("changes") or []:
+            statuses.extend((change.get("value") or {}).get("statuses") or [])
+    return statuses
+
+
+def _timestamp(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@webhooks_router.post("/whatsapp")
+async def whatsapp_status(http_request: Request):
+    """
+    Notificaciones de la WhatsApp Cloud API (estados sent / delivered / read / failed).
+    Firma: X-Hub-Signature-256 = sha256=<HMAC-SHA256 del body con WHATSAPP_APP_SECRET>
+    """
+    app_secret = get_settings().whatsapp_app_secret
+    if not app_secret:
+        _reject("whatsapp", "missing_app_secret")
+
+    body = await http_request.body()
+    expected = "sha256=" + hmac.new(app_secret.encode(), body, hashlib.sha256).hexdigest()
+    provided = http_request.headers.get("x-hub-signature-256", "")
+    if not hmac.compare_digest(expected.encode(), provided.encode()):
+        _reject("whatsapp", "bad_signature")
+
+    try:
+        payload = loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+
+    for status in _whatsapp_statuses(payload if isinstance(payload, dict) else {}):
+        message_id = status.get("id")
+        if not message_id or not status.get("status"):
+            continue
+        errors = status.get("errors") or [{}]
+        error_code = errors[0].get("code")
+        delivery_receipts.record_status(
+            message_id, "whatsapp", status["status"],
+            timestamp=_timestamp(status.get("timestamp")),
+            error_code=str(error_code) if error_code is not None else None
+        )
+    return {"received": True}
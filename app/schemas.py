@@ -0,0 +1,114 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, constr, validator
+
+# Texto obligatorio: sin espacios alrededor y no vacío ("" cuenta como ausente)
+RequiredStr = constr(strip_whitespace=True, min_length=1)
+
+
+# ==========================================
+# Peticiones
+# ==========================================
+
+class PhoneRequest(BaseModel):
+    """Número del usuario: countryCode + phoneNumber (se normalizan a E.164 en el endpoint)"""
+    countryCode: RequiredStr
+    phoneNumber: RequiredStr
+
+
+class SendCodeRequest(PhoneRequest):
+    """Body de /auth/send-code y /auth/send-sms"""
+
+
+class VerifyCodeRequest(PhoneRequest):
+    """Body de /auth/verify-code"""
+    otp: RequiredStr
+
+
+class VerifySMSRequest(PhoneRequest):
+    """Body de /auth/verify-sms"""
+    code: RequiredStr
+
+
+class MultilingualRequest(PhoneRequest):
+    """Body de /auth/send-otp-multilingual (canal e idioma se validan en el endpoint)"""
+    channel: RequiredStr = "whatsapp"
+    language: RequiredStr = "es"
+
+    @validator("channel", "language")
+    def lowercase(cls, value: str) -> str:
+        return value.lower()
+
+
+# ==========================================
+# Respuestas (documentación de /docs: los endpoints devuelven
+# FastJSONResponse ya serializada, sin validar contra estos modelos)
+# ==========================================
+
+class MessageResponse(BaseModel):
+    message: str
+
+
+class SessionResponse(BaseModel):
+    session_token: str
+    user_id: str
+
+
+class SMSSentResponse(BaseModel):
+    message: str
+    phone_number: str
+    method: str
+    status: Optional[str]
+    sid: Optional[str]
+
+
+class SMSVerifiedResponse(SessionResponse):
+    message: str
+    method: str
+    status: Optional[str]
+
+
+class MultilingualResponse(BaseModel):
+    success: bool
+    message: str
+    channel: str
+    language: str
+    language_name: str
+    recipient: str
+    expires_in: str
+    template: Optional[str]
+    sms_sid: Optional[str]
+    method: Optional[str]
+    requested_channel: Optional[str]
+    failover: Optional[bool]
+
+
+class QueuedResponse(BaseModel):
+    """Respuesta 202 con OTP_DELIVERY_MODE=async"""
+    success: bool
+    message: str
+    delivery_id: str
+    status_url: str
+    channel: str
+    language: Optional[str]
+    expires_in: str
+
+
+class LanguageInfo(BaseModel):
+    code: str
+    name: str
+    whatsapp_template: str
+    whatsapp_language_code: str
+    sms_sample: str
+
+
+class SupportedLanguagesResponse(BaseModel):
+    supported_languages: List[LanguageInfo]
+    total_languages: int
+    default_language: str
+    channels: List[str]
+    notes: List[str]
+
+
+class ErrorResponse(BaseModel):
+    detail: str
@@ -0,0 +1,224 @@
+import asyncio
+import codecs
+import json
+import os
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, Union
+from starlette.responses import StreamingResponse
+
+# Concurrencia de envíos por lote y tamaño máximo de un lote
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "20"))
+BULK_MAX_RECORDS = int(os.getenv("BULK_MAX_RECORDS", "10000"))
+
+_WHITESPACE = " \t\r\n"
+
+
+class RecordReader:
+    """
+    Registros de un lote leídos del body a medida que llega (sin cargarlo
+    entero): NDJSON (un objeto por línea, application/x-ndjson) o una lista
+    JSON. La forma {"records": [...]} no se puede leer por partes: se
+    acumula hasta el final, con el mismo límite de registros.
+
+    Lanza ValueError si el cuerpo no es válido o supera `max_records`.
+    `done` se activa cuando el body se terminó de leer (o falló).
+    """
+
+    def __init__(self, chunks: AsyncIterable[bytes], content_type: str, max_records: int = BULK_MAX_RECORDS):
+        self.chunks = chunks
+        self.ndjson = "ndjson" in content_type or "jsonlines" in content_type
+        self.max_records = max_records
+        self.count = 0
+        self.done = asyncio.Event()
+        self._decoder = json.JSONDecoder()
+
+    async def __aiter__(self) -> AsyncIterator[Dict]:
+        try:
+            records = self._ndjson() if self.ndjson else self._json()
+            async for record in records:
+                if not isinstance(record, dict):
+                    raise ValueError("Expected a list of records")
+                self.count += 1
+                if self.count > self.max_records:
+                    raise ValueError(f"Too many records (max {self.max_records})")
+                yield record
+            if self.count == 0:
+                raise ValueError("No records")
+        finally:
+            self.done.set()
+
+    async def _text(self) -> AsyncIterator[str]:
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        async for chunk in self.chunks:
+            if chunk:
+                yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True)
+
+    async def _ndjson(self) -> AsyncIterator[Any]:
+        buffer = ""
+        async for text in self._text():
+            buffer += text
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+        if buffer.strip():
+            yield json.loads(buffer)
+
+    async def _json(self) -> AsyncIterator[Any]:
+        texts = self._text()
+        buffer = ""
+        # Primer carácter significativo: "[" (lista, por partes) o "{" ({"records": [...]})
+        async for text in texts:
+            buffer += text
+            if buffer.lstrip(_WHITESPACE):
+                break
+        buffer = buffer.lstrip(_WHITESPACE)
+        if not buffer:
+            return
+        if buffer[0] != "[":
+            async for text in texts:
+                buffer += text
+            data = json.loads(buffer)
+            records = data.get("records") if isinstance(data, dict) else None
+            if not isinstance(records, list):
+                raise ValueError("Expected a list of records")
+            for record in records:
+                yield record
+            return
+
+        position = 1
+        expect_comma = False
+        finished = False
+        while True:
+            # Objetos completos que ya están en el buffer
+            while True:
+                while position < len(buffer) and buffer[position] in _WHITESPACE:
+                    position += 1
+                if position >= len(buffer):
+                    break
+                char = buffer[position]
+                if char == "]":
+                    position += 1
+                    if buffer[position:].strip(_WHITESPACE):
+                        raise ValueError("Unexpected data after the list")
+                    finished = True
+                    break
+                if expect_comma:
+                    if char != ",":
+                        raise ValueError(f"Expected ',' at position {position}")
+                    position += 1
+                    expect_comma = False
+                    continue
+                try:
+                    record, end = self._decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # Objeto incompleto: esperar más datos
+                    break
+                yield record
+                position = end
+                expect_comma = True
+            if finished:
+                async for text in texts:
+                    if text.strip(_WHITESPACE):
+                        raise ValueError("Unexpected data after the list")
+                return
+            buffer = buffer[position:]
+            position = 0
+            more = await _next(texts)
+            if more is None:
+                raise ValueError("Unterminated list of records")
+            buffer += more
+
+
+async def _next(texts: AsyncIterator[str]) -> Optional[str]:
+    try:
+        return await texts.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que puede leer el body de la petición mientras responde.
+
+    La de Starlette escucha `http.disconnect` desde el principio y se quedaría
+    con los mensajes del body. Aquí la escucha empieza cuando `body_done` se
+    activa; antes, una desconexión llega como ClientDisconnect al leer el body.
+    """
+
+    def __init__(self, content: AsyncIterable, body_done: asyncio.Event, **kwargs):
+        super().__init__(content, **kwargs)
+        self.body_done = body_done
+
+    async def listen_for_disconnect(self, receive) -> None:
+        await self.body_done.wait()
+        await super().listen_for_disconnect(receive)
+
+
+async def fan_out(
+    items: Union[Iterable[Any], AsyncIterable[Any]],
+    worker: Callable[[Any], Awaitable[Dict]],
+    concurrency: int = BULK_CONCURRENCY,
+) -> AsyncIterator[Dict]:
+    """
+    Ejecuta `worker(item)` con como mucho `concurrency` llamadas a la vez y
+    entrega cada resultado en cuanto termina (no en el orden de entrada).
+
+    `items` puede ser asíncrono (registros leídos del body a medida que
+    llegan): solo se leen por delante los que caben en una cola de
+    `concurrency` elementos. Un pool fijo de tareas los consume, así un lote
+    grande no crea una tarea por registro. Si el consumidor deja de leer
+    (cliente desconectado), la lectura y los envíos pendientes se cancelan.
+    """
+    workers = max(1, concurrency)
+    pending: "asyncio.Queue" = asyncio.Queue(maxsize=workers)
+    results: "asyncio.Queue" = asyncio.Queue()
+    finished = object()
+
+    async def close():
+        for _ in range(workers):
+            await pending.put(finished)
+
+    async def produce():
+        try:
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    await pending.put(item)
+            else:
+                for item in items:
+                    await pending.put(item)
+        except Exception:
+            # Los workers terminan lo ya leído; el error se relanza al final
+            await close()
+            raise
+        await close()
+
+    async def run():
+        while True:
+            item = await pending.get()
+            if item is finished:
+                results.put_nowait(finished)
+                return
+            try:
+                result = await worker(item)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            results.put_nowait(result)
+
+    producer = asyncio.ensure_future(produce())
+    tasks = [asyncio.ensure_future(run()) for _ in range(workers)]
+    try:
+        done = 0
+        while done < workers:
+            result = await results.get()
+            if result is finished:
+                done += 1
+                continue
+            yield result
+        # Errores de lectura de `items` (body inválido, desconexión)
+        await producer
+    finally:
+        producer.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(producer, *tasks, return_exceptions=True)
@@ -0,0 +1,171 @@
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Tuple
+from app.services.logger import get_logger
+
+log = get_logger("breaker")
+
+# Estados del breaker
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """El breaker del proveedor está abierto: la llamada falla sin salir a la red"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit is open (retry in {retry_in:.1f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Breaker por proveedor con estados closed → open → half_open.
+
+    Se abre cuando, sobre las últimas `window` llamadas (mínimo `min_calls`),
+    la tasa de errores supera `error_rate` o la de llamadas lentas
+    (> `slow_call_seconds`) supera `slow_rate`. Abierto, falla al instante
+    durante `open_seconds`; luego deja pasar `half_open_calls` llamadas de
+    prueba: si salen bien se cierra, si no vuelve a abrirse.
+
+    Cada llamada de prueba termina con `record()` (respuesta o error del
+    proveedor) o con `release()` (cancelada o sin llegar a salir). Si una
+    prueba no devuelve su hueco en `probe_timeout` segundos se da por perdida
+    y se admite otra: el breaker nunca queda bloqueado en half_open.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 10,
+        error_rate: float = 0.5,
+        slow_call_seconds: float = 5.0,
+        slow_rate: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+        probe_timeout: float = 60.0,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.probe_timeout = probe_timeout
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._probe_started_at = 0.0
+        self.opened_total = 0
+
+    @classmethod
+    def from_env(cls, name: str) -> "CircuitBreaker":
+        prefix = f"{name.upper()}_BREAKER"
+        return cls(
+            name,
+            window=int(os.getenv(f"{prefix}_WINDOW", os.getenv("BREAKER_WINDOW", "20"))),
+            min_calls=int(os.getenv(f"{prefix}_MIN_CALLS", os.getenv("BREAKER_MIN_CALLS", "10"))),
+            error_rate=float(os.getenv(f"{prefix}_ERROR_RATE", os.getenv("BREAKER_ERROR_RATE", "0.5"))),
+            slow_call_seconds=float(os.getenv(f"{prefix}_SLOW_CALL", os.getenv("BREAKER_SLOW_CALL", "5"))),
+            slow_rate=float(os.getenv(f"{prefix}_SLOW_RATE", os.getenv("BREAKER_SLOW_RATE", "0.8"))),
+            open_seconds=float(os.getenv(f"{prefix}_OPEN_SECONDS", os.getenv("BREAKER_OPEN_SECONDS", "30"))),
+            probe_timeout=float(os.getenv(f"{prefix}_PROBE_TIMEOUT", os.getenv("BREAKER_PROBE_TIMEOUT", "60"))),
+        )
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._half_open_in_flight = 0
+        return self._state
+
+    def before_call(self) -> bool:
+        """
+        Lanza CircuitOpenError si la llamada no debe salir. Devuelve True si la
+        llamada ocupa un hueco de prueba (half_open): quien llama debe terminarla
+        con `record()` o `release()`.
+        """
+        state = self.state
+        if state == OPEN:
+            raise CircuitOpenError(self.name, self.open_seconds - (time.monotonic() - self._opened_at))
+        if state != HALF_OPEN:
+            return False
+        now = time.monotonic()
+        if self._half_open_in_flight >= self.half_open_calls:
+            waited = now - self._probe_started_at
+            if waited < self.probe_timeout:
+                raise CircuitOpenError(self.name, self.probe_timeout - waited)
+            # La prueba anterior nunca devolvió su hueco
+            log.warning("breaker.probe_expired", provider=self.name, in_flight=self._half_open_in_flight)
+            self._half_open_in_flight = 0
+        self._half_open_in_flight += 1
+        self._probe_started_at = now
+        return True
+
+    def release(self):
+        """Devuelve el hueco de prueba de una llamada que terminó sin resultado del proveedor"""
+        if self._state == HALF_OPEN:
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    def record(self, success: bool, duration: float):
+        slow = duration > self.slow_call_seconds
+        if self._state == HALF_OPEN:
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+            if success and not slow:
+                self._close()
+            else:
+                self._open()
+            return
+
+        self._outcomes.append((success, slow))
+        if len(self._outcomes) < self.min_calls:
+            return
+        total = len(self._outcomes)
+        errors = sum(1 for ok, _ in self._outcomes if not ok)
+        slow_calls = sum(1 for _, is_slow in self._outcomes if is_slow)
+        if errors / total >= self.error_rate or slow_calls / total >= self.slow_rate:
+            self._open()
+
+    def _open(self):
+        if self._state != OPEN:
+            log.warning("breaker.opened", provider=self.name)
+            self.opened_total += 1
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def _close(self):
+        log.info("breaker.closed", provider=self.name)
+        self._state = CLOSED
+        self._outcomes.clear()
+
+    def to_dict(self) -> Dict:
+        state = self.state
+        total = len(self._outcomes)
+        errors = sum(1 for ok, _ in self._outcomes if not ok)
+        return {
+            "state": state,
+            "recent_calls": total,
+            "recent_error_rate": round(errors / total, 3) if total else 0.0,
+            "opened_total": self.opened_total,
+        }
+
+
+# Un breaker por proveedor
+breakers: Dict[str, CircuitBreaker] = {
+    "whatsapp": CircuitBreaker.from_env("whatsapp"),
+    "twilio": CircuitBreaker.from_env("twilio"),
+}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    breaker = breakers.get(provider)
+    if breaker is None:
+        breaker = breakers[provider] = CircuitBreaker.from_env(provider)
+    return breaker
@@ -0,0 +1,49 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Instante límite (time.monotonic) de la petición en curso; None = sin plazo
+deadline_var: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+# Presupuesto de un envío OTP completo: reintentos y failover incluidos
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE_SECONDS", "15"))
+
+
+class DeadlineExceeded(Exception):
+    """El plazo de la petición se agotó antes de completar la llamada al proveedor"""
+
+
+def remaining() -> Optional[float]:
+    """Segundos que quedan del plazo actual (None si no hay plazo)"""
+    deadline = deadline_var.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+@contextmanager
+def deadline(seconds: Optional[float] = None):
+    """
+    Fija el plazo para lo que se ejecute dentro (y las tareas que se creen
+    dentro). Nunca amplía un plazo ya fijado por quien llama.
+    """
+    seconds = REQUEST_DEADLINE if seconds is None else seconds
+    current = deadline_var.get()
+    target = time.monotonic() + seconds
+    token = deadline_var.set(target if current is None else min(current, target))
+    try:
+        yield
+    finally:
+        deadline_var.reset(token)
+
+
+def with_deadline(handler: Callable[[], Awaitable[T]], seconds: Optional[float] = None) -> Callable[[], Awaitable[T]]:
+    """`handler` con su propio plazo, contado desde que empieza a ejecutarse"""
+    async def run() -> T:
+        with deadline(seconds):
+            return await handler()
+    return run
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from app.services.logger import get_logger
+from app.services.metrics import metrics
+
+log = get_logger("dedup")
+
+dedup_total = metrics.counter(
+    "tijzi_dedup_total",
+    "Peticiones duplicadas resueltas sin repetir el trabajo (coalesced | replayed)",
+    ("operation", "kind"),
+)
+
+# Longitud máxima aceptada del header Idempotency-Key
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+class SingleFlight:
+    """
+    Una sola ejecución en curso por clave: las llamadas concurrentes con la
+    misma clave esperan el resultado (o la excepción) de la primera.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """Resultado de `fn()` y si fue compartido con una llamada anterior"""
+        future = self._flights.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+
+        future = asyncio.ensure_future(fn())
+        self._flights[key] = future
+
+        def done(finished: asyncio.Future):
+            if self._flights.get(key) is finished:
+                del self._flights[key]
+            # Evita el aviso "exception was never retrieved" si todos los clientes cancelaron
+            if not finished.cancelled():
+                finished.exception()
+
+        future.add_done_callback(done)
+        # shield: si el primer cliente se desconecta el envío sigue para los demás
+        return await asyncio.shield(future), False
+
+
+class _CachedResponse:
+    __slots__ = ("expires_at", "fingerprint", "status_code", "body", "headers")
+
+    def __init__(self, expires_at: float, fingerprint: str, response: Response):
+        self.expires_at = expires_at
+        self.fingerprint = fingerprint
+        self.status_code = response.status_code
+        self.body = response.body
+        self.headers = dict(response.headers)
+
+
+class IdempotencyCache:
+    """
+    Respuestas por (operación, Idempotency-Key) durante `ttl` segundos, con
+    memoria acotada a `max_entries` (se descartan las más antiguas).
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 100_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, _CachedResponse]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, now: Optional[float] = None) -> Optional[_CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= (time.time() if now is None else now):
+            del self._entries[key]
+            return None
+        return entry
+
+    def put(self, key: Hashable, fingerprint: str, response: Response, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        self._entries.pop(key, None)
+        self._entries[key] = _CachedResponse(now + self.ttl, fingerprint, response)
+        # TTL constante: el orden de inserción es el orden de expiración
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest.expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+
+def _copy(status_code: int, body: bytes, headers: Dict[str, str], replayed: bool = False) -> Response:
+    # Una Response nueva por petición (la original ya pertenece a otra conexión)
+    headers = dict(headers)
+    if replayed:
+        headers["Idempotent-Replayed"] = "true"
+    return Response(body, status_code=status_code, headers=headers)
+
+
+class RequestDeduplicator:
+    """
+    Evita trabajo duplicado en los endpoints de envío y verificación:
+
+    - single-flight: peticiones concurrentes para el mismo número (doble toque,
+      reintento del cliente) comparten una sola ejecución y reciben su respuesta;
+    - Idempotency-Key: las respuestas 2xx se guardan IDEMPOTENCY_TTL_SECONDS y
+      un reintento con la misma clave y el mismo body recibe la respuesta
+      original sin llamar al proveedor (422 si la clave llega con otro body).
+
+    Variables: IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_ENTRIES.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.flights = SingleFlight()
+        self.responses = IdempotencyCache(
+            float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600")) if ttl is None else ttl,
+            int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "100000")) if max_entries is None else max_entries,
+        )
+
+    @staticmethod
+    def idempotency_key(request: Request) -> Optional[str]:
+        key = request.headers.get("idempotency-key")
+        if key is None:
+            return None
+        key = key.strip()
+        if not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Invalid Idempotency-Key header")
+        return key
+
+    async def run(self, operation: str, flight_key: Hashable, request: Request, body, handler: Callable[[], Awaitable[Response]]) -> Response:
+        """
+        Ejecuta `handler` una sola vez por (operation, flight_key) en curso, y
+        guarda/reutiliza la respuesta si la petición trae Idempotency-Key.
+        `body` es el modelo de la petición (huella para detectar reutilizaciones).
+        """
+        idempotency_key = self.idempotency_key(request)
+        fingerprint = None
+        if idempotency_key is not None:
+            fingerprint = hashlib.sha256(body.json(sort_keys=True).encode()).hexdigest()
+            cached = self.responses.get((operation, idempotency_key))
+            if cached is not None:
+                if cached.fingerprint != fingerprint:
+                    raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
+                dedup_total.inc(operation, "replayed")
+                log.info("dedup.replayed", operation=operation)
+                return _copy(cached.status_code, cached.body, cached.headers, replayed=True)
+
+        response, shared = await self.flights.do((operation, flight_key), handler)
+        if shared:
+            dedup_total.inc(operation, "coalesced")
+            log.info("dedup.coalesced", operation=operation)
+
+        if idempotency_key is not None and 200 <= response.status_code < 300:
+            self.responses.put((operation, idempotency_key), fingerprint, response)
+        return _copy(response.status_code, response.body, response.headers) if shared else response
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self.flights), "idempotency_entries": len(self.responses)}
+
+
+# Instancia global (un proceso = una caché; con varios workers cada uno tiene la suya)
+request_dedup = RequestDeduplicator()
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from app.services.latency import LatencyTracker
+from app.services.logger import get_logger
+
+log = get_logger("delivery")
+
+# Un sender recibe (teléfono, código, idioma) y devuelve {"success": bool, "sid": ..., "error": ...}
+Sender = Callable[[str, str, str], Awaitable[Dict]]
+
+
+class DeliveryPolicy:
+    """
+    Política de entrega del OTP entre WhatsApp y SMS.
+
+    - OTP_FAILOVER=off|error|deadline
+        error: si el canal principal falla se envía por el otro canal.
+        deadline: además, si el principal no responde en OTP_FAILOVER_DEADLINE
+        segundos se lanza el otro canal y gana el primero que entregue.
+    - OTP_HEDGE=true: envío de cobertura por el otro canal cuando el principal
+      supera el percentil OTP_HEDGE_PERCENTILE de su latencia observada
+      (acotado entre OTP_HEDGE_MIN_DELAY y OTP_HEDGE_MAX_DELAY).
+
+    Ambos canales envían el mismo código ya almacenado.
+    """
+
+    def __init__(self):
+        self.failover = os.getenv("OTP_FAILOVER", "off").lower()
+        self.deadline = float(os.getenv("OTP_FAILOVER_DEADLINE", "8"))
+        self.hedge = os.getenv("OTP_HEDGE", "false").lower() in ("1", "true", "yes", "on")
+        self.hedge_percentile = float(os.getenv("OTP_HEDGE_PERCENTILE", "0.95"))
+        self.hedge_min_delay = float(os.getenv("OTP_HEDGE_MIN_DELAY", "1.0"))
+        self.hedge_max_delay = float(os.getenv("OTP_HEDGE_MAX_DELAY", "10.0"))
+        self.latencies = LatencyTracker()
+
+    def _hedge_delay(self, channel: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        delay = self.latencies.percentile(channel, self.hedge_percentile, default=self.hedge_max_delay)
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, delay))
+
+    def _second_chance_delay(self, channel: str) -> Optional[float]:
+        delays = [self._hedge_delay(channel)]
+        if self.failover == "deadline":
+            delays.append(self.deadline)
+        delays = [delay for delay in delays if delay is not None]
+        return min(delays) if delays else None
+
+    async def _timed(self, channel: str, sender: Sender, phone_number: str, code: str, language: str) -> Dict:
+        started = time.perf_counter()
+        try:
+            result = await sender(phone_number, code, language)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        self.latencies.observe(channel, time.perf_counter() - started)
+        result["channel"] = channel
+        return result
+
+    async def deliver(self, primary: str, phone_number: str, code: str, language: str, senders: Dict[str, Sender]) -> Dict:
+        """
+        Envía por `primary` aplicando failover/hedging hacia el otro canal de `senders`.
+        Devuelve el resultado del canal que entregó (o del último que falló) con
+        "channel", "channels_attempted" y "failover".
+        """
+        alternates = [channel for channel in senders if channel != primary]
+        alternate = alternates[0] if alternates else None
+
+        tasks: List[asyncio.Task] = [
+            asyncio.ensure_future(self._timed(primary, senders[primary], phone_number, code, language))
+        ]
+        attempted = [primary]
+
+        def launch_alternate():
+            log.warning("delivery.failover", primary=primary, alternate=alternate)
+            tasks.append(asyncio.ensure_future(
+                self._timed(alternate, senders[alternate], phone_number, code, language)
+            ))
+            attempted.append(alternate)
+
+        delay = self._second_chance_delay(primary) if alternate else None
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                # El principal va lento: se lanza el otro canal sin cancelar el primero
+                launch_alternate()
+
+        result: Dict = {}
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result.get("success"):
+                    self._detach(pending)
+                    return self._finish(result, primary, attempted)
+            if not pending and alternate and alternate not in attempted and self.failover != "off":
+                launch_alternate()
+                pending = {tasks[-1]}
+
+        return self._finish(result, primary, attempted)
+
+    @staticmethod
+    def _detach(pending):
+        # El envío perdedor termina por su cuenta (no se puede "desenviar" un mensaje)
+        for task in pending:
+            task.add_done_callback(lambda t: t.exception())
+
+    @staticmethod
+    def _finish(result: Dict, primary: str, attempted: List[str]) -> Dict:
+        result["channels_attempted"] = list(attempted)
+        result["failover"] = result.get("channel") != primary
+        return result
+
+
+# Instancia global por proceso
+delivery_policy = DeliveryPolicy()
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+from app.services.logger import get_logger, request_id_var
+
+log = get_logger("delivery")
+
+# Estados de una entrega
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+
+class DeliveryQueueFull(Exception):
+    """La cola de entregas alcanzó su capacidad máxima"""
+
+
+class DeliveryJob:
+    """Trabajo de envío pendiente o terminado"""
+    __slots__ = ("id", "channel", "language", "recipient", "status", "created_at",
+                 "updated_at", "error", "sid", "send", "request_id")
+
+    def __init__(self, send: Callable[[], Awaitable[Dict]], channel: str, language: Optional[str], recipient: str):
+        self.id = secrets.token_urlsafe(12)
+        self.channel = channel
+        self.language = language
+        self.recipient = recipient
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.error: Optional[str] = None
+        self.sid: Optional[str] = None
+        self.send = send
+        # El envío se registra en los logs con el id de la petición que lo originó
+        self.request_id = request_id_var.get()
+
+    def to_dict(self) -> Dict:
+        return {
+            "delivery_id": self.id,
+            "status": self.status,
+            "channel": self.channel,
+            "language": self.language,
+            "recipient": self.recipient,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "sid": self.sid,
+            "error": self.error,
+        }
+
+
+class DeliveryQueue:
+    """
+    Cola asyncio en proceso con un pool fijo de workers de envío.
+
+    Los endpoints solo generan y guardan el código; el envío al proveedor lo hace
+    un worker. La concurrencia hacia los proveedores queda acotada por el número
+    de workers, y el estado de cada entrega se consulta por su id.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_queue: Optional[int] = None, max_jobs: Optional[int] = None):
+        self.workers = workers or int(os.getenv("DELIVERY_WORKERS", "8"))
+        self.max_queue = max_queue or int(os.getenv("DELIVERY_QUEUE_SIZE", "1000"))
+        self.max_jobs = max_jobs or int(os.getenv("DELIVERY_MAX_TRACKED", "10000"))
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: "OrderedDict[str, DeliveryJob]" = OrderedDict()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        """Arranca el pool de workers (una vez por proceso)"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [
+            asyncio.ensure_future(self._worker(i)) for i in range(self.workers)
+        ]
+
+    async def stop(self, timeout: float = 10.0):
+        """Espera a que se vacíe la cola (hasta `timeout`) y detiene los workers"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, send: Callable[[], Awaitable[Dict]], channel: str, language: Optional[str], recipient: str) -> DeliveryJob:
+        """
+        Encola un envío. `send` es una corrutina sin argumentos que devuelve
+        {"success": bool, "sid": ..., "error": ...}
+        """
+        if self._queue is None:
+            raise RuntimeError("Delivery queue is not running")
+        job = DeliveryJob(send, channel, language, recipient)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise DeliveryQueueFull("Delivery queue is full")
+        self._track(job)
+        return job
+
+    def get(self, delivery_id: str) -> Optional[DeliveryJob]:
+        return self._jobs.get(delivery_id)
+
+    def _track(self, job: DeliveryJob):
+        self._jobs[job.id] = job
+        # Memoria acotada: se olvidan los trabajos más antiguos
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            request_id_var.set(job.request_id)
+            try:
+                job.status = SENDING
+                job.updated_at = time.time()
+                result = await job.send()
+                job.sid = result.get("sid")
+                if result.get("success"):
+                    job.status = SENT
+                else:
+                    job.status = FAILED
+                    job.error = result.get("error") or "Delivery failed"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+                log.error("delivery.exception", delivery_id=job.id, channel=job.channel, error=str(e))
+            finally:
+                job.updated_at = time.time()
+                job.send = None
+                self._queue.task_done()
+
+
+# Instancia global (los workers arrancan con la aplicación)
+delivery_queue = DeliveryQueue()
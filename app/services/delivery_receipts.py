@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.services.logger import get_logger
+from app.services.metrics import metrics
+from app.services.phone import match_country
+
+log = get_logger("receipts")
+
+delivery_status_total = metrics.counter(
+    "tijzi_delivery_status_total",
+    "Estados de entrega recibidos por webhook (sent | delivered | read | failed | undelivered ...)",
+    ("channel", "status"),
+)
+delivery_latency = metrics.histogram(
+    "tijzi_delivery_latency_seconds",
+    "Tiempo desde el envío al proveedor hasta el estado delivered",
+    ("channel", "language", "country"),
+    buckets=(1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+delivery_receipts_dropped = metrics.counter(
+    "tijzi_delivery_receipts_dropped_total",
+    "Eventos descartados porque el buffer de escritura estaba lleno",
+)
+
+# Orden de los estados: un evento que llega tarde no retrocede el estado guardado
+STATUS_RANK = {
+    "accepted": 0, "queued": 0, "sending": 1, "sent": 1,
+    "delivered": 2, "read": 3, "undelivered": 4, "failed": 4,
+}
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS message_receipts (
+        message_id TEXT PRIMARY KEY,
+        channel TEXT,
+        language TEXT,
+        country TEXT,
+        sent_at REAL,
+        status TEXT,
+        status_rank INTEGER NOT NULL DEFAULT -1,
+        status_at REAL,
+        delivered_at REAL,
+        error_code TEXT
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_message_receipts_sent_at ON message_receipts (sent_at)",
+)
+# El envío y sus estados pueden llegar en cualquier orden (webhook antes que el registro local)
+_SQL_SEND = """
+    INSERT INTO message_receipts (message_id, channel, language, country, sent_at) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (message_id) DO UPDATE SET
+        channel = excluded.channel, language = excluded.language,
+        country = excluded.country, sent_at = excluded.sent_at
+"""
+_SQL_STATUS = """
+    INSERT INTO message_receipts (message_id, channel, status, status_rank, status_at, delivered_at, error_code)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (message_id) DO UPDATE SET
+        status = CASE WHEN excluded.status_rank >= status_rank THEN excluded.status ELSE status END,
+        status_at = CASE WHEN excluded.status_rank >= status_rank THEN excluded.status_at ELSE status_at END,
+        error_code = COALESCE(excluded.error_code, error_code),
+        delivered_at = CASE
+            WHEN excluded.delivered_at IS NULL THEN delivered_at
+            WHEN delivered_at IS NULL THEN excluded.delivered_at
+            ELSE MIN(delivered_at, excluded.delivered_at)
+        END,
+        status_rank = MAX(status_rank, excluded.status_rank)
+"""
+
+
+def country_of(phone_number: str) -> str:
+    """Prefijo de país de un número E.164 ("+573004051582" → "57")"""
+    match = match_country(phone_number.lstrip("+"))
+    return match[0] if match else "unknown"
+
+
+class DeliveryReceipts:
+    """
+    Envíos y estados de entrega (webhooks de Twilio y WhatsApp) por id de mensaje.
+
+    Los endpoints solo añaden el evento a un buffer en memoria; un hilo
+    escritor lo vuelca a SQLite en lotes (una transacción cada
+    `flush_interval` segundos o al llegar a `batch_size` eventos). Con path
+    vacío no se persiste nada y solo se actualizan las métricas.
+
+    La latencia envío → delivered se observa en memoria para los envíos
+    recientes de este proceso (`max_tracked`); en SQLite queda para todos.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = "delivery_receipts.sqlite3",
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_buffer: int = 100_000,
+        max_tracked: int = 100_000,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.max_tracked = max_tracked
+        self.written_total = 0
+        self._buffer: List[Tuple[str, tuple]] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        # message_id → (canal, idioma, país, enviado en)
+        self._sent: "OrderedDict[str, Tuple[str, str, str, float]]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "DeliveryReceipts":
+        return cls(
+            path=os.getenv("DELIVERY_RECEIPTS_PATH", "delivery_receipts.sqlite3"),
+            batch_size=int(os.getenv("DELIVERY_RECEIPTS_BATCH_SIZE", "500")),
+            flush_interval=float(os.getenv("DELIVERY_RECEIPTS_FLUSH_MS", "1000")) / 1000,
+            max_buffer=int(os.getenv("DELIVERY_RECEIPTS_MAX_BUFFER", "100000")),
+        )
+
+    # ---- Eventos (event loop: sin disco) ----
+
+    def record_send(self, message_id: Optional[str], channel: str, language: Optional[str], phone_number: str, sent_at: Optional[float] = None):
+        """Mensaje aceptado por el proveedor (sid de Twilio / wamid de WhatsApp)"""
+        if not message_id:
+            return
+        sent_at = time.time() if sent_at is None else sent_at
+        language = language or "default"
+        country = country_of(phone_number)
+        self._sent[message_id] = (channel, language, country, sent_at)
+        if len(self._sent) > self.max_tracked:
+            self._sent.popitem(last=False)
+        self._append(_SQL_SEND, (message_id, channel, language, country, sent_at))
+
+    def record_status(self, message_id: str, channel: str, status: str, timestamp: Optional[float] = None, error_code: Optional[str] = None):
+        """Estado recibido por webhook"""
+        timestamp = time.time() if timestamp is None else timestamp
+        status = status.lower()
+        delivery_status_total.inc(channel, status)
+        delivered_at = timestamp if status in ("delivered", "read") else None
+
+        if delivered_at is not None:
+            sent = self._sent.pop(message_id, None)
+            if sent is not None:
+                sent_channel, language, country, sent_at = sent
+                delivery_latency.observe(max(0.0, delivered_at - sent_at), sent_channel, language, country)
+
+        self._append(_SQL_STATUS, (
+            message_id, channel, status, STATUS_RANK.get(status, 0), timestamp, delivered_at, error_code
+        ))
+
+    def _append(self, sql: str, params: tuple):
+        if not self.path:
+            return
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                delivery_receipts_dropped.inc()
+                return
+            self._buffer.append((sql, params))
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    # ---- Hilo escritor ----
+
+    def start(self):
+        if not self.path or self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="delivery-receipts-writer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Vuelca lo pendiente y detiene el hilo escritor"""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        return conn
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            log.error("receipts.open_failed", path=self.path, error=str(e))
+            return
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            stopping = self._stopping
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if batch:
+                self._write(conn, batch)
+            if stopping:
+                break
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: List[Tuple[str, tuple]]):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for sql, params in batch:
+                conn.execute(sql, params)
+            conn.execute("COMMIT")
+            self.written_total += len(batch)
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            log.error("receipts.write_failed", events=len(batch), error=str(e))
+
+    def stats(self) -> Dict[str, int]:
+        return {"buffered": len(self._buffer), "tracked": len(self._sent), "written_total": self.written_total}
+
+
+# Instancia global (el hilo escritor se arranca en el startup de la app)
+delivery_receipts = DeliveryReceipts.from_env()
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+from app.services.http_clients import http_clients, WHATSAPP_BASE_URL, TWILIO_API_URL
+from app.services.circuit_breaker import get_breaker, OPEN, HALF_OPEN
+from app.services.outbound import provider_timeouts
+from app.settings import get_settings
+
+
+class HealthMonitor:
+    """
+    Sondeo en segundo plano de WhatsApp (Graph) y Twilio.
+
+    El resultado queda en memoria: `/health/deep` responde con el último sondeo
+    y el estado actual de los circuit breakers, sin salir a la red.
+    """
+
+    def __init__(self, interval: Optional[float] = None, timeout: Optional[float] = None):
+        self.interval = interval or float(os.getenv("HEALTH_PROBE_INTERVAL", "30"))
+        self.timeout = timeout or float(os.getenv("HEALTH_PROBE_TIMEOUT", "5"))
+        self._task: Optional[asyncio.Task] = None
+        self._probes: Dict[str, Dict] = {
+            "whatsapp": {"status": "unknown", "checked_at": None, "latency_ms": None, "error": None},
+            "twilio": {"status": "unknown", "checked_at": None, "latency_ms": None, "error": None},
+        }
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.interval)
+
+    async def probe_all(self):
+        await asyncio.gather(self._probe_whatsapp(), self._probe_twilio())
+
+    async def _probe_whatsapp(self):
+        settings = get_settings()
+        if not settings.whatsapp_configured:
+            self._set("whatsapp", "unconfigured")
+            return
+        await self._probe("whatsapp", http_clients.whatsapp, f"{WHATSAPP_BASE_URL}/{settings.phone_number_id}", {"fields": "id"})
+
+    async def _probe_twilio(self):
+        settings = get_settings()
+        if not (settings.twilio_account_sid and settings.twilio_auth_token):
+            self._set("twilio", "unconfigured")
+            return
+        await self._probe("twilio", http_clients.twilio, f"{TWILIO_API_URL}/2010-04-01/Accounts/{settings.twilio_account_sid}.json")
+
+    async def _probe(self, name: str, client, url: str, params: Optional[Dict] = None):
+        started = time.perf_counter()
+        try:
+            response = await client.get(url, params=params, timeout=self.timeout)
+            latency = time.perf_counter() - started
+            if response.is_success:
+                self._set(name, "up", latency)
+            else:
+                self._set(name, "down", latency, f"HTTP {response.status_code}")
+        except Exception as e:
+            self._set(name, "down", time.perf_counter() - started, str(e) or type(e).__name__)
+
+    def _set(self, name: str, status: str, latency: Optional[float] = None, error: Optional[str] = None):
+        self._probes[name] = {
+            "status": status,
+            "checked_at": time.time(),
+            "latency_ms": round(latency * 1000, 1) if latency is not None else None,
+            "error": error,
+        }
+
+    def snapshot(self) -> Dict:
+        """Estado cacheado de los proveedores (O(1), sin I/O)"""
+        providers = {}
+        for name, probe in self._probes.items():
+            breaker = get_breaker(name)
+            status = probe["status"]
+            if breaker.state == OPEN:
+                status = "down"
+            elif breaker.state == HALF_OPEN and status == "up":
+                status = "degraded"
+            providers[name] = dict(probe, status=status, breaker=breaker.to_dict())
+
+        statuses = [p["status"] for p in providers.values() if p["status"] != "unconfigured"]
+        if statuses and all(s == "up" for s in statuses):
+            overall = "healthy"
+        elif any(s == "up" for s in statuses):
+            overall = "degraded"
+        elif statuses and all(s == "unknown" for s in statuses):
+            overall = "starting"
+        else:
+            overall = "unhealthy"
+
+        return {
+            "status": overall,
+            "service": "tijzi-backend",
+            "version": "1.0.0",
+            "providers": providers,
+            # Timeout adaptativo actual por proveedor y operación
+            "timeouts": provider_timeouts.snapshot(),
+        }
+
+
+# Instancia global (el sondeo arranca con la aplicación)
+health_monitor = HealthMonitor()
@@ -0,0 +1,208 @@
+import os
+import asyncio
+import base64
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+# Hosts de cada proveedor
+WHATSAPP_BASE_URL = "https://graph.facebook.com/v22.0"
+TWILIO_API_URL = "https://api.twilio.com"
+TWILIO_VERIFY_URL = "https://verify.twilio.com"
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _http2_available() -> bool:
+    """HTTP/2 requiere el paquete opcional `h2`"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_limits() -> httpx.Limits:
+    """Límites del pool configurables por variables de entorno"""
+    return httpx.Limits(
+        max_connections=_env_int("HTTP_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=_env_int("HTTP_MAX_KEEPALIVE", 20),
+        keepalive_expiry=_env_float("HTTP_KEEPALIVE_EXPIRY", 60.0),
+    )
+
+
+def build_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        _env_float("HTTP_TIMEOUT", 30.0),
+        connect=_env_float("HTTP_CONNECT_TIMEOUT", 10.0),
+    )
+
+
+def twilio_auth_headers(account_sid: Optional[str], auth_token: Optional[str]) -> Dict[str, str]:
+    """Cabeceras Basic auth de Twilio (se calculan una sola vez)"""
+    if not account_sid or not auth_token:
+        return {}
+    credentials = f"{account_sid}:{auth_token}"
+    encoded_credentials = base64.b64encode(credentials.encode()).decode()
+    return {"Authorization": f"Basic {encoded_credentials}"}
+
+
+def whatsapp_auth_headers(access_token: Optional[str]) -> Dict[str, str]:
+    """Cabeceras Bearer de WhatsApp Cloud API (se calculan una sola vez)"""
+    if not access_token:
+        return {}
+    return {"Authorization": f"Bearer {access_token}"}
+
+
+def _settings():
+    # Import diferido: app.settings importa las URLs de este módulo
+    from app.settings import get_settings
+    return get_settings()
+
+
+class HTTPClients:
+    """
+    Un cliente httpx de larga duración por proveedor.
+    Mantiene conexiones keep-alive abiertas para evitar un handshake TCP/TLS por cada OTP.
+    """
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._whatsapp: Optional[httpx.AsyncClient] = None
+        self._twilio: Optional[httpx.AsyncClient] = None
+        # Transporte alternativo (proveedores simulados en benchmarks)
+        self.transport = transport
+        # Abrir conexiones a los proveedores en el startup (ver warm_up)
+        self.warmup_enabled = _env_bool("HTTP_WARMUP")
+
+    def _build_client(self, headers: Dict[str, str]) -> httpx.AsyncClient:
+        if self.transport is not None:
+            return httpx.AsyncClient(headers=headers, timeout=build_timeout(), transport=self.transport)
+        http2 = _env_bool("HTTP2_ENABLED") and _http2_available()
+        return httpx.AsyncClient(
+            headers=headers,
+            limits=build_limits(),
+            timeout=build_timeout(),
+            http2=http2,
+        )
+
+    @property
+    def whatsapp(self) -> httpx.AsyncClient:
+        if self._whatsapp is None or self._whatsapp.is_closed:
+            self._whatsapp = self._build_client(whatsapp_auth_headers(_settings().access_token))
+        return self._whatsapp
+
+    @property
+    def twilio(self) -> httpx.AsyncClient:
+        if self._twilio is None or self._twilio.is_closed:
+            settings = _settings()
+            self._twilio = self._build_client(
+                twilio_auth_headers(settings.twilio_account_sid, settings.twilio_auth_token)
+            )
+        return self._twilio
+
+    async def startup(self):
+        """Crea los clientes al arrancar la aplicación"""
+        self.whatsapp
+        self.twilio
+
+    async def warm_up(self, connections: Optional[int] = None, timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        Resuelve el DNS y abre `connections` conexiones TLS keep-alive por host
+        de proveedor (graph.facebook.com, api.twilio.com, verify.twilio.com)
+        antes de aceptar tráfico: tras un arranque en frío el primer OTP no
+        paga DNS + TCP + TLS. Cada conexión se abre con un HEAD a la raíz del
+        host y queda en el pool. Los fallos no impiden arrancar.
+
+        Variables: HTTP_WARMUP_CONNECTIONS (2), HTTP_WARMUP_TIMEOUT (5 s).
+        """
+        connections = connections or _env_int("HTTP_WARMUP_CONNECTIONS", 2)
+        timeout = timeout or _env_float("HTTP_WARMUP_TIMEOUT", 5.0)
+        targets = (
+            (self.whatsapp, WHATSAPP_BASE_URL),
+            (self.twilio, TWILIO_API_URL),
+            (self.twilio, TWILIO_VERIFY_URL),
+        )
+        results = await asyncio.gather(*(
+            self._warm_host(client, url, connections, timeout) for client, url in targets
+        ))
+        return {urlsplit(url).hostname: result for (_, url), result in zip(targets, results)}
+
+    async def _warm_host(self, client: httpx.AsyncClient, url: str, connections: int, timeout: float) -> Dict:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}/"
+        result: Dict = {"dns_ms": None, "connect_ms": None, "connections": 0, "error": None}
+        started = time.perf_counter()
+        try:
+            if self.transport is None:
+                # Deja la respuesta en la caché del resolver del sistema
+                await asyncio.wait_for(
+                    asyncio.get_event_loop().getaddrinfo(parts.hostname, parts.port or 443),
+                    timeout,
+                )
+                result["dns_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            started = time.perf_counter()
+            # Peticiones simultáneas: el pool abre una conexión para cada una
+            responses = await asyncio.gather(
+                *(client.head(origin, timeout=timeout) for _ in range(connections)),
+                return_exceptions=True,
+            )
+            result["connect_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            errors = [r for r in responses if isinstance(r, BaseException)]
+            result["connections"] = connections - len(errors)
+            if errors:
+                result["error"] = str(errors[0]) or type(errors[0]).__name__
+        except (OSError, asyncio.TimeoutError) as e:
+            result["error"] = str(e) or type(e).__name__
+        return result
+
+    def reconfigure(self, settings=None):
+        """
+        Callback de recarga de configuración: las credenciales van en las
+        cabeceras de los clientes, así que se recrean con la nueva Settings
+        """
+        if self._whatsapp is None and self._twilio is None:
+            return
+        asyncio.ensure_future(self.reset())
+
+    async def reset(self):
+        """
+        Descarta los clientes actuales (p. ej. tras recargar credenciales); se
+        recrean en el próximo uso. Los anteriores se cierran cuando ya no pueden
+        tener peticiones en curso.
+        """
+        old_clients = [client for client in (self._whatsapp, self._twilio) if client is not None]
+        self._whatsapp = None
+        self._twilio = None
+        await asyncio.sleep(_env_float("HTTP_TIMEOUT", 30.0))
+        for client in old_clients:
+            if not client.is_closed:
+                await client.aclose()
+
+    async def shutdown(self):
+        """Cierra los clientes y libera las conexiones del pool"""
+        for client in (self._whatsapp, self._twilio):
+            if client is not None and not client.is_closed:
+                await client.aclose()
+        self._whatsapp = None
+        self._twilio = None
+
+
+# Instancia global compartida por WhatsApp y SMS
+http_clients = HTTPClients()
@@ -0,0 +1,40 @@
+# Idiomas soportados: template de WhatsApp y mensaje SMS por idioma
+# (mensajes SMS optimizados para auto-detección del código en iOS/Android)
+
+SUPPORTED_LANGUAGES = {
+    "es": {
+        "name": "Español",
+        "whatsapp_template": "otp_tijzi_es",
+        "whatsapp_language_code": "es",
+        # ✅ FORMATO OPTIMIZADO - código al inicio + palabra clave
+        "sms_message": "{code} es tu código de verificación de Tijzi. Válido por 5 minutos."
+    },
+    "en": {
+        "name": "English", 
+        "whatsapp_template": "otp_tijzi_en",
+        "whatsapp_language_code": "en",
+        # ✅ FORMATO OPTIMIZADO - formato que iOS/Android reconocen
+        "sms_message": "{code} is your Tijzi verification code. Valid for 5 minutes."
+    },
+    "pt": {
+        "name": "Português",
+        "whatsapp_template": "otp_tijzi_pt", 
+        "whatsapp_language_code": "pt_BR",
+        # ✅ FORMATO OPTIMIZADO
+        "sms_message": "{code} é seu código de verificação Tijzi. Válido por 5 minutos."
+    },
+    "it": {
+        "name": "Italiano",
+        "whatsapp_template": "otp_tijzi_it",
+        "whatsapp_language_code": "it",
+        # ✅ FORMATO OPTIMIZADO
+        "sms_message": "{code} è il tuo codice di verifica Tijzi. Valido per 5 minuti."
+    },
+    "fr": {
+        "name": "Français",
+        "whatsapp_template": "otp_tijzi_fr",
+        "whatsapp_language_code": "fr",
+        # ✅ FORMATO OPTIMIZADO
+        "sms_message": "{code} est votre code de vérification Tijzi. Valide 5 minutes."
+    }
+}
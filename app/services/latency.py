@@ -0,0 +1,36 @@
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class LatencyTracker:
+    """
+    Latencias recientes por clave (canal, proveedor...) en un buffer circular,
+    para estimar percentiles sin guardar histórico ilimitado.
+    """
+
+    def __init__(self, size: int = 256, min_samples: int = 20):
+        self.size = size
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def observe(self, key: str, seconds: float):
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.size)
+        samples.append(seconds)
+
+    def percentile(self, key: str, q: float, default: Optional[float] = None) -> Optional[float]:
+        """Percentil `q` (0-1) de las muestras recientes, o `default` si hay pocas"""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return default
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+    def keys(self):
+        return list(self._samples)
+
+    def count(self, key: str) -> int:
+        samples = self._samples.get(key)
+        return len(samples) if samples else 0
@@ -0,0 +1,35 @@
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    Servicio global que se construye en el primer uso y no al importar el
+    módulo. El startup de la app llama a `get()` para construirlo antes de
+    aceptar tráfico; los módulos lo usan como si fuera la instancia
+    (`otp_service.verify_code(...)` delega en ella).
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> T:
+        instance = self._instance
+        if instance is None:
+            # Puede pedirse a la vez desde el event loop y desde un hilo (to_thread)
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
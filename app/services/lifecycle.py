@@ -0,0 +1,144 @@
+import asyncio
+import os
+import signal
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from fastapi import HTTPException
+from app.services.logger import get_logger
+from app.services.metrics import metrics
+
+log = get_logger("lifecycle")
+
+# Estados del proceso
+STARTING = "starting"
+READY = "ready"
+DRAINING = "draining"
+STOPPED = "stopped"
+
+provider_sends_in_flight = metrics.gauge(
+    "tijzi_provider_sends_in_flight",
+    "Peticiones a WhatsApp / Twilio en curso (las que el apagado espera)",
+)
+
+
+class Lifecycle:
+    """
+    Estado del proceso para el balanceador y el apagado ordenado:
+    starting → ready → draining → stopped.
+
+    - /health (liveness) solo indica que el proceso responde;
+    - /health/ready (readiness) responde 200 únicamente en "ready": durante el
+      arranque (warm-up incluido) y el apagado el balanceador deja de enviar tráfico.
+
+    Cada envío a un proveedor se registra con `sending()`. Con SIGTERM,
+    `drain_on_signal()` pasa a "draining" mientras uvicorn sigue aceptando
+    conexiones: durante SHUTDOWN_GRACE_SECONDS readiness responde 503 (el
+    balanceador deja de enrutar) y los envíos nuevos reciben 503 +
+    Retry-After. Después arranca el apagado normal de uvicorn, y
+    `wait_idle()` espera a los envíos que siguen en curso (incluidos los que
+    se terminan para otros clientes tras una desconexión) antes de cerrar
+    los clientes HTTP, hasta SHUTDOWN_DRAIN_SECONDS.
+    """
+
+    def __init__(self, drain_timeout: Optional[float] = None, retry_after: Optional[int] = None, grace_period: Optional[float] = None):
+        self.drain_timeout = drain_timeout if drain_timeout is not None else float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "20"))
+        self.grace_period = grace_period if grace_period is not None else float(os.getenv("SHUTDOWN_GRACE_SECONDS", "5"))
+        self.retry_after = retry_after if retry_after is not None else int(os.getenv("SHUTDOWN_RETRY_AFTER", "5"))
+        self.state = STARTING
+        self.in_flight = 0
+        self.started_at = time.time()
+        self._idle: Optional[asyncio.Event] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    @property
+    def accepting(self) -> bool:
+        """Se aceptan envíos nuevos (también antes del startup, p. ej. sin lifespan)"""
+        return self.state not in (DRAINING, STOPPED)
+
+    def mark_ready(self):
+        if self.state != STARTING:
+            # SIGTERM durante el arranque: sigue en "draining"
+            return
+        self.state = READY
+        log.info("lifecycle.ready", startup_ms=round((time.time() - self.started_at) * 1000, 1))
+
+    def begin_drain(self):
+        """Readiness pasa a 503 y los endpoints de envío dejan de aceptar peticiones"""
+        if self.state in (DRAINING, STOPPED):
+            return
+        self.state = DRAINING
+        self._idle = asyncio.Event()
+        if self.in_flight == 0:
+            self._idle.set()
+        log.info("lifecycle.draining", in_flight=self.in_flight)
+
+    def drain_on_signal(self):
+        """
+        Manejador de SIGTERM: drena durante `grace_period` con el servidor aún
+        escuchando y luego entrega el apagado a uvicorn con SIGINT (su
+        manejador, que sigue instalado). Un segundo SIGTERM no espera más.
+        """
+        if not self.accepting:
+            os.kill(os.getpid(), signal.SIGINT)
+            return
+        self.begin_drain()
+        log.info("lifecycle.grace_period", seconds=self.grace_period)
+        asyncio.get_event_loop().call_later(self.grace_period, os.kill, os.getpid(), signal.SIGINT)
+
+    def mark_stopped(self):
+        self.state = STOPPED
+
+    @asynccontextmanager
+    async def sending(self):
+        """Envío en curso a un proveedor (el apagado espera a que termine)"""
+        self.in_flight += 1
+        if self._idle is not None:
+            self._idle.clear()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0 and self._idle is not None:
+                self._idle.set()
+
+    async def wait_idle(self, timeout: Optional[float] = None) -> int:
+        """Espera a que terminen los envíos en curso; devuelve cuántos quedaron sin terminar"""
+        if self.in_flight == 0:
+            return 0
+        if self._idle is None:
+            self._idle = asyncio.Event()
+        timeout = self.drain_timeout if timeout is None else timeout
+        try:
+            await asyncio.wait_for(self._idle.wait(), max(0.0, timeout))
+        except asyncio.TimeoutError:
+            pass
+        return self.in_flight
+
+    def snapshot(self) -> Dict:
+        return {
+            "status": self.state,
+            "in_flight_sends": self.in_flight,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+        }
+
+
+def require_accepting():
+    """
+    Dependencia FastAPI de los endpoints de envío: 503 con Retry-After mientras
+    el proceso se apaga (el cliente reintenta y llega a otra instancia)
+    """
+    if not lifecycle.accepting:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is shutting down, retry shortly",
+            headers={"Retry-After": str(lifecycle.retry_after)},
+        )
+
+
+# Instancia global (un estado por proceso)
+lifecycle = Lifecycle()
+provider_sends_in_flight.set_function(lambda: {(): lifecycle.in_flight})
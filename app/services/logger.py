@@ -0,0 +1,172 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# Id de correlación de la petición en curso (lo fija el middleware de app.main)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Campos que nunca se escriben en claro
+_SECRET_FIELDS = {"code", "otp", "otp_code", "token", "session_token", "access_token", "auth_token"}
+_PHONE_FIELDS = {"phone", "phone_number", "to", "recipient", "from_phone", "user_id"}
+# Teléfonos y códigos dentro de textos libres (respuestas de proveedores, errores)
+_DIGITS_RE = re.compile(r"(?<![\w])\+?\d{6,15}(?![\w])")
+_MAX_TEXT = 500
+
+
+def mask_phone(value: str) -> str:
+    """+573004051582 → ***1582"""
+    return "***" + value[-4:] if value and len(value) > 4 else "***"
+
+
+def _redact_text(text: str) -> str:
+    def replace(match):
+        digits = match.group(0)
+        # 6 dígitos: código OTP; más largo: teléfono
+        return "******" if len(digits.lstrip("+")) <= 6 else mask_phone(digits)
+    if len(text) > _MAX_TEXT:
+        text = text[:_MAX_TEXT] + "…"
+    return _DIGITS_RE.sub(replace, text)
+
+
+def redact(fields: Dict) -> Dict:
+    clean = {}
+    for key, value in fields.items():
+        if value is None or isinstance(value, (bool, int, float)):
+            clean[key] = value
+        elif key in _SECRET_FIELDS:
+            clean[key] = "******"
+        elif key in _PHONE_FIELDS:
+            clean[key] = mask_phone(str(value))
+        elif isinstance(value, dict):
+            clean[key] = redact(value)
+        else:
+            clean[key] = _redact_text(str(value))
+    return clean
+
+
+class JSONFormatter(logging.Formatter):
+    """Una línea JSON por evento (se ejecuta en el hilo del listener)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": getattr(record, "event", record.getMessage()),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        entry.update(redact(getattr(record, "fields", {})))
+        if record.exc_info:
+            entry["exception"] = _redact_text(self.formatException(record.exc_info))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que no formatea en el hilo que loguea: todo el trabajo lo hace el listener"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class EventLogger:
+    """
+    Logger de eventos estructurados: `log.info("whatsapp.sent", phone=..., status=200)`.
+
+    El nivel y el muestreo se comprueban antes de crear el registro, así un
+    evento descartado cuesta casi nada en el camino caliente.
+    """
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(f"tijzi.{name}")
+
+    def _log(self, level: int, event: str, exc_info=None, **fields):
+        if not self._logger.isEnabledFor(level):
+            return
+        rate = _sample_rates.get(event)
+        if rate is not None and level < logging.WARNING and random.random() >= rate:
+            return
+        self._logger.log(
+            level, event, exc_info=exc_info,
+            extra={"event": event, "fields": fields, "request_id": request_id_var.get()}
+        )
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, **fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, **fields)
+
+    def error(self, event: str, **fields):
+        self._log(logging.ERROR, event, **fields)
+
+    def exception(self, event: str, **fields):
+        self._log(logging.ERROR, event, exc_info=True, **fields)
+
+
+def _parse_sample_rates(value: str) -> Dict[str, float]:
+    """LOG_SAMPLE_RATES="whatsapp.response=0.1,sms.response=0.05" """
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            event, rate = item.split("=", 1)
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+_sample_rates: Dict[str, float] = _parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def get_logger(name: str) -> EventLogger:
+    return EventLogger(name)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def setup_logging():
+    """
+    Configura el pipeline: los eventos van a una cola y un hilo en segundo plano
+    los serializa como JSON y los escribe en stdout.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JSONFormatter())
+    log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+
+    root = logging.getLogger("tijzi")
+    root.handlers = [_DeferredQueueHandler(log_queue)]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.propagate = False
+
+
+def shutdown_logging():
+    """Vacía la cola y detiene el hilo del listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        logging.getLogger("tijzi").handlers = []
+
+
+# Se configura al importar para que cualquier módulo pueda loguear desde el arranque
+setup_logging()
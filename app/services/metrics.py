@@ -0,0 +1,211 @@
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Buckets de latencia (segundos), de respuestas locales a llamadas lentas de proveedor
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def set_function(self, function: Callable[[], Dict[LabelValues, float]]):
+        """
+        Calcula los valores al exportar en lugar de mantenerlos en el camino
+        caliente. `function()` devuelve {(etiquetas...): valor}; () sin etiquetas.
+        """
+        self._function = function
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        values = dict(self._values)
+        if self._function is not None:
+            try:
+                values.update(self._function())
+            except Exception:
+                pass
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values.items()
+        ]
+
+
+class Counter(_Metric):
+    """Contador monótono por combinación de etiquetas: `counter.inc("whatsapp", "sent")`"""
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+
+class Gauge(_Metric):
+    """Valor instantáneo"""
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """
+    Histograma de buckets fijos. `observe` es una búsqueda binaria y tres
+    sumas; los acumulados que pide el formato Prometheus se calculan al exportar.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _HistogramSeries(len(self.buckets) + 1)
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def render(self) -> List[str]:
+        lines = []
+        bounds = self.buckets + (float("inf"),)
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, series.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series.sum)}")
+            lines.append(f"{self.name}_count{label_text} {series.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas del proceso con exportación en formato texto de Prometheus.
+
+    Las métricas se actualizan solo desde el event loop (un hilo), así que no
+    necesitan locks: cada actualización es una operación de dict bajo el GIL.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Registro global por proceso
+metrics = MetricsRegistry()
+
+# Métricas de la aplicación
+http_request_duration = metrics.histogram(
+    "tijzi_http_request_duration_seconds",
+    "Latencia de las peticiones HTTP por ruta",
+    ("method", "route", "status"),
+)
+provider_request_duration = metrics.histogram(
+    "tijzi_provider_request_duration_seconds",
+    "Latencia de las llamadas a proveedores por operación y estado HTTP",
+    ("provider", "operation", "status"),
+)
+provider_retries_total = metrics.counter(
+    "tijzi_provider_retries_total",
+    "Reintentos de llamadas a proveedores por motivo (connect_error | 429 | 5xx)",
+    ("provider", "operation", "reason"),
+)
+otp_send_total = metrics.counter(
+    "tijzi_otp_send_total",
+    "Envíos de OTP por canal, idioma y resultado",
+    ("channel", "language", "outcome"),
+)
+otp_verify_total = metrics.counter(
+    "tijzi_otp_verify_total",
+    "Verificaciones de OTP por método (local, twilio_verify) y resultado",
+    ("method", "outcome"),
+)
+otp_store_entries = metrics.gauge(
+    "tijzi_otp_store_entries",
+    "Códigos OTP vigentes en el almacén",
+)
+otp_store_load_factor = metrics.gauge(
+    "tijzi_otp_store_load_factor",
+    "Ocupación de la tabla de capacidad fija (solo OTP_STORAGE=shm)",
+)
+otp_store_expired = metrics.counter(
+    "tijzi_otp_store_expired_total",
+    "Códigos OTP expirados sin usarse desde el arranque",
+)
+otp_store_evicted = metrics.counter(
+    "tijzi_otp_store_evicted_total",
+    "Códigos OTP expulsados por el límite de entradas del almacén",
+)
+otp_journal_events = metrics.counter(
+    "tijzi_otp_journal_events_total",
+    "Eventos del journal OTP escritos en disco o descartados por buffer lleno",
+    ("outcome",),
+)
+otp_journal_commits = metrics.counter(
+    "tijzi_otp_journal_commits_total",
+    "Grupos escritos con un solo fsync (group commit)",
+)
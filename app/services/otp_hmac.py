@@ -0,0 +1,141 @@
+import hashlib
+import hmac
+import os
+import struct
+import time
+from typing import Dict, Optional
+from app.services.otp_storage import OTPStorage
+from app.services.otp_store import OTPStore
+
+# Intentos de compare-and-set al marcar un paso como usado (solo fallan con
+# verificaciones simultáneas del mismo número)
+_CAS_ATTEMPTS = 3
+
+
+class HMACOTP:
+    """
+    Códigos OTP derivados: code = HMAC-SHA256(secreto, teléfono, paso de tiempo)
+    truncado a 6 dígitos (truncado dinámico de RFC 4226).
+
+    El código no se guarda en ningún sitio ni depende de estado: cualquier
+    worker o nodo con el mismo secreto lo recalcula. Se aceptan el paso
+    actual, los `drift` anteriores y el siguiente, así que el código vale
+    hasta `step * (drift + 2)` segundos. Los relojes deben estar
+    sincronizados (NTP).
+
+    Contra la reutilización, `storage` (el backend de OTP_STORAGE) guarda por
+    teléfono el último paso verificado: solo se aceptan códigos de pasos
+    posteriores, y el registro se avanza con un compare-and-set. Con
+    "memory" cada proceso lleva el suyo (un código verificado en un worker
+    aún vale una vez en otro); con "sqlite" o "shm", todo el host. Un
+    reenvío tras verificar en el mismo paso usa el código del paso
+    siguiente, que ya se acepta.
+    """
+
+    def __init__(
+        self,
+        secret: bytes,
+        storage: Optional[OTPStorage] = None,
+        step: int = 60,
+        drift: int = 4,
+        digits: int = 6,
+        max_entries: int = 100_000,
+    ):
+        if not secret:
+            raise ValueError("OTP_HMAC_SECRET is required when OTP_MODE=hmac")
+        self.secret = secret
+        self.step = step
+        self.drift = drift
+        self.digits = digits
+        self._modulo = 10 ** digits
+        # Estado HMAC con la clave ya procesada: cada código parte de una copia
+        self._mac = hmac.new(secret, digestmod=hashlib.sha256)
+        # teléfono → último paso verificado; vive `ttl` desde la verificación
+        self.storage = storage if storage is not None else OTPStore(ttl=self.ttl, max_entries=max_entries)
+
+    @classmethod
+    def from_env(cls, storage: Optional[OTPStorage] = None) -> "HMACOTP":
+        return cls(
+            secret=os.getenv("OTP_HMAC_SECRET", "").encode(),
+            storage=storage,
+            step=int(os.getenv("OTP_HMAC_STEP", "60")),
+            drift=int(os.getenv("OTP_HMAC_DRIFT", "4")),
+            max_entries=int(os.getenv("OTP_MAX_ENTRIES", "100000")),
+        )
+
+    @staticmethod
+    def ttl_for(step: int, drift: int) -> float:
+        return float(step * (drift + 2))
+
+    @property
+    def ttl(self) -> float:
+        """Validez máxima de un código"""
+        return self.ttl_for(self.step, self.drift)
+
+    def _code(self, phone_number: str, counter: int) -> str:
+        mac = self._mac.copy()
+        mac.update(phone_number.encode() + b":" + struct.pack(">Q", counter))
+        digest = mac.digest()
+        offset = digest[-1] & 0x0F
+        value = struct.unpack(">I", digest[offset:offset + 4])[0] & 0x7FFFFFFF
+        return str(value % self._modulo).zfill(self.digits)
+
+    def _counter(self, used: Optional[str], now: float) -> int:
+        # El paso actual ya verificado: el siguiente (dentro de la ventana)
+        current = int(now // self.step)
+        return current if used is None or int(used) < current else current + 1
+
+    def _match(self, phone_number: str, code: str, now: float) -> Optional[int]:
+        """Paso cuyo código coincide (el más reciente) o None"""
+        current = int(now // self.step)
+        matched = None
+        for counter in range(current + 1, current - self.drift - 1, -1):
+            # Sin salida anticipada: el tiempo no depende del paso que coincide
+            if hmac.compare_digest(self._code(phone_number, counter), code) and matched is None:
+                matched = counter
+        return matched
+
+    def generate(self, phone_number: str, now: Optional[float] = None) -> str:
+        """Código del paso actual (el del siguiente si el actual ya se verificó)"""
+        now = time.time() if now is None else now
+        return self._code(phone_number, self._counter(self.storage.read(phone_number, now), now))
+
+    def verify(self, phone_number: str, code: str, now: Optional[float] = None) -> bool:
+        """Verifica el código (solo CPU) y marca su paso como usado"""
+        now = time.time() if now is None else now
+        counter = self._match(phone_number, code, now)
+        if counter is None:
+            return False
+        for _ in range(_CAS_ATTEMPTS):
+            used = self.storage.read(phone_number, now)
+            if used is not None and int(used) >= counter:
+                return False
+            # Dos verificaciones simultáneas del mismo código: solo una gana
+            if self.storage.replace(phone_number, used, str(counter), now):
+                return True
+        return False
+
+    async def agenerate(self, phone_number: str, now: Optional[float] = None) -> str:
+        """Igual que generate sin bloquear el event loop (backend sqlite)"""
+        now = time.time() if now is None else now
+        return self._code(phone_number, self._counter(await self.storage.aread(phone_number, now), now))
+
+    async def averify(self, phone_number: str, code: str, now: Optional[float] = None) -> bool:
+        """Igual que verify sin bloquear el event loop (backend sqlite)"""
+        now = time.time() if now is None else now
+        counter = self._match(phone_number, code, now)
+        if counter is None:
+            return False
+        for _ in range(_CAS_ATTEMPTS):
+            used = await self.storage.aread(phone_number, now)
+            if used is not None and int(used) >= counter:
+                return False
+            if await self.storage.areplace(phone_number, used, str(counter), now):
+                return True
+        return False
+
+    def stats(self) -> Dict[str, int]:
+        return self.storage.stats()
+
+    def close(self):
+        self.storage.close()
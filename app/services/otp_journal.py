@@ -0,0 +1,277 @@
+import hashlib
+import hmac
+import mmap
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+from app.fast_json import dumps, loads
+from app.services.logger import get_logger, mask_phone, request_id_var
+
+log = get_logger("journal")
+
+_PREFIX = "otp-events-"
+_SUFFIX = ".jsonl"
+
+
+def _journal_key() -> Optional[bytes]:
+    key = os.getenv("OTP_JOURNAL_KEY", "")
+    return key.encode() if key else None
+
+
+def phone_ref(phone: str, key: Optional[bytes]) -> str:
+    """
+    Teléfono tal como queda en el journal: HMAC-SHA256 con `key` (128 bits en
+    hex), el mismo para un número en todos los segmentos y workers; sin clave,
+    solo los 4 últimos dígitos (***1582). Nunca el E.164 en claro.
+    """
+    if key:
+        return hmac.new(key, phone.encode(), hashlib.sha256).hexdigest()[:32]
+    return mask_phone(phone)
+
+
+class OTPJournal:
+    """
+    Registro de auditoría append-only de la actividad OTP, una línea JSON por
+    evento: {"ts", "event", "phone", "request_id", ...campos}. Nunca guarda
+    códigos ni teléfonos en claro: "phone" es `phone_ref` (hash con clave
+    OTP_JOURNAL_KEY o número enmascarado).
+
+    `append` solo serializa y añade la línea a un buffer en memoria; un hilo
+    escritor agrupa lo acumulado durante `commit_interval` segundos en un único
+    write + fsync (group commit). El segmento activo se rota al superar
+    `segment_bytes` o `segment_seconds`. Los segmentos llevan el instante de
+    apertura y el pid en el nombre: varios workers pueden compartir directorio.
+
+    Si el buffer supera `max_buffer_bytes` (disco más lento que el tráfico) los
+    eventos se descartan y se cuentan en `dropped_total`: nunca se bloquea el
+    event loop.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = "otp-journal",
+        segment_bytes: int = 64 * 1024 * 1024,
+        segment_seconds: float = 3600.0,
+        commit_interval: float = 0.005,
+        fsync: bool = True,
+        max_buffer_bytes: int = 64 * 1024 * 1024,
+        key: Optional[bytes] = None,
+    ):
+        self.directory = directory
+        self.key = key
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.commit_interval = commit_interval
+        self.fsync = fsync
+        self.max_buffer_bytes = max_buffer_bytes
+        self.written_total = 0
+        self.commits_total = 0
+        self.dropped_total = 0
+        self._buffer: List[bytes] = []
+        self._buffered_bytes = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._fd: Optional[int] = None
+        self._segment_path: Optional[str] = None
+        self._segment_size = 0
+        self._segment_opened = 0.0
+
+    @classmethod
+    def from_env(cls) -> "OTPJournal":
+        return cls(
+            directory=os.getenv("OTP_JOURNAL_DIR", "otp-journal"),
+            segment_bytes=int(os.getenv("OTP_JOURNAL_SEGMENT_MB", "64")) * 1024 * 1024,
+            segment_seconds=float(os.getenv("OTP_JOURNAL_SEGMENT_SECONDS", "3600")),
+            commit_interval=float(os.getenv("OTP_JOURNAL_COMMIT_MS", "5")) / 1000,
+            fsync=os.getenv("OTP_JOURNAL_FSYNC", "true").lower() in ("1", "true", "yes", "on"),
+            key=_journal_key(),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    # ---- Escritura (event loop) ----
+
+    def append(self, event: str, phone: Optional[str] = None, **fields):
+        """Añade un evento al journal (sin E/S: la escritura la hace el hilo escritor)"""
+        if not self.directory:
+            return
+        record = {"ts": round(time.time(), 6), "event": event}
+        if phone:
+            record["phone"] = phone_ref(phone, self.key)
+        request_id = request_id_var.get()
+        if request_id:
+            record["request_id"] = request_id
+        record.update(fields)
+        line = dumps(record) + b"\n"
+
+        with self._lock:
+            if self._buffered_bytes + len(line) > self.max_buffer_bytes:
+                self.dropped_total += 1
+                return
+            first = not self._buffer
+            self._buffer.append(line)
+            self._buffered_bytes += len(line)
+        # Solo el primer evento de cada grupo despierta al escritor
+        if first:
+            self._wakeup.set()
+
+    # ---- Hilo escritor ----
+
+    def start(self):
+        if not self.directory or self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="otp-journal-writer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Escribe lo pendiente, sincroniza y cierra el segmento activo"""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            # Sin eventos se despierta igualmente para rotar por tiempo
+            self._wakeup.wait(min(self.segment_seconds, 1.0))
+            self._wakeup.clear()
+            stopping = self._stopping
+            if self.commit_interval > 0 and not stopping:
+                # Ventana de group commit: los eventos que lleguen mientras tanto van en el mismo fsync
+                time.sleep(self.commit_interval)
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                self._buffered_bytes = 0
+            try:
+                if batch:
+                    self._commit(b"".join(batch), len(batch))
+                if self._fd is not None and (
+                    self._segment_size >= self.segment_bytes
+                    or time.time() - self._segment_opened >= self.segment_seconds
+                ):
+                    self._close_segment()
+            except OSError as e:
+                log.error("journal.write_failed", events=len(batch), error=str(e))
+                self._close_segment()
+            if stopping:
+                break
+        self._close_segment()
+
+    def _open_segment(self):
+        opened = time.time()
+        millis = int(opened * 1000)
+        while True:
+            path = os.path.join(self.directory, f"{_PREFIX}{millis:013d}-{os.getpid()}{_SUFFIX}")
+            if not os.path.exists(path):
+                break
+            millis += 1
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o640)
+        self._segment_path = path
+        self._segment_size = 0
+        self._segment_opened = opened
+
+    def _close_segment(self):
+        if self._fd is None:
+            return
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+        self._fd = None
+        self._segment_path = None
+
+    def _commit(self, data: bytes, events: int):
+        if self._fd is None:
+            self._open_segment()
+        view = memoryview(data)
+        while view:
+            written = os.write(self._fd, view)
+            view = view[written:]
+        if self.fsync:
+            # fdatasync donde exista: no hace falta sincronizar metadatos en cada grupo
+            getattr(os, "fdatasync", os.fsync)(self._fd)
+        self._segment_size += len(data)
+        self.written_total += events
+        self.commits_total += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "written_total": self.written_total,
+            "commits_total": self.commits_total,
+            "dropped_total": self.dropped_total,
+            "buffered_bytes": self._buffered_bytes,
+        }
+
+
+class JournalReader:
+    """
+    Lectura de los segmentos del journal con mmap (sin copiar el archivo a
+    memoria). Con `event` se descartan las líneas por búsqueda de bytes antes
+    de decodificar el JSON. Una última línea incompleta (caída a mitad de
+    escritura) se ignora.
+
+    El filtro `phone` recibe el E.164 y lo convierte con la misma clave que
+    el escritor (por defecto OTP_JOURNAL_KEY). Sin clave compara los 4
+    últimos dígitos: puede devolver eventos de otros números.
+    """
+
+    def __init__(self, directory: str, key: Optional[bytes] = None):
+        self.directory = directory
+        self.key = key if key is not None else _journal_key()
+
+    def segments(self) -> List[str]:
+        """Segmentos en orden de apertura"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(_PREFIX) and name.endswith(_SUFFIX)
+        )
+        return [os.path.join(self.directory, name) for name in names]
+
+    def scan(self, event: Optional[str] = None, since: Optional[float] = None, phone: Optional[str] = None) -> Iterator[Dict]:
+        needles = []
+        if event is not None:
+            needles.append(b'"event":' + dumps(event))
+        if phone is not None:
+            needles.append(b'"phone":' + dumps(phone_ref(phone, self.key)))
+
+        for path in self.segments():
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    position = 0
+                    while True:
+                        end = mm.find(b"\n", position)
+                        if end < 0:
+                            break
+                        line = mm[position:end]
+                        position = end + 1
+                        if any(needle not in line for needle in needles):
+                            continue
+                        record = loads(line)
+                        if since is not None and record["ts"] < since:
+                            continue
+                        yield record
+
+    def replay(self, handler: Callable[[Dict], None], **filters) -> int:
+        """Llama a `handler` con cada evento (mismos filtros que `scan`); devuelve cuántos"""
+        count = 0
+        for record in self.scan(**filters):
+            handler(record)
+            count += 1
+        return count
+
+
+# Instancia global (el hilo escritor se arranca en el startup de la app)
+otp_journal = OTPJournal.from_env()
@@ -1,33 +1,131 @@
+import os
 import random
 import time
 from typing import Dict, Optional
+from app.services.otp_storage import OTPStorage
+from app.services.otp_store import OTPStore
+from app.services.otp_hmac import HMACOTP
+from app.services.otp_journal import OTPJournal, otp_journal
+from app.services.session_tokens import session_tokens
+
+
+def build_storage(ttl: float) -> OTPStorage:
+    """
+    Crea el backend configurado en OTP_STORAGE:
+    - "memory" (por defecto): dict en el proceso, un solo worker
+    - "sqlite": archivo SQLite compartido por todos los workers del host
+    - "shm": tabla hash en memoria compartida entre los workers del host
+    """
+    backend = os.getenv("OTP_STORAGE", "memory").lower()
+
+    if backend == "sqlite":
+        from app.services.otp_sqlite import SQLiteOTPStorage
+        return SQLiteOTPStorage(
+            path=os.getenv("OTP_SQLITE_PATH", "otp.sqlite3"),
+            ttl=ttl,
+            batch_size=int(os.getenv("OTP_SQLITE_BATCH_SIZE", "256")),
+            batch_window=float(os.getenv("OTP_SQLITE_BATCH_WINDOW_MS", "2")) / 1000,
+        )
+
+    if backend == "shm":
+        from app.services.otp_shm import SharedMemoryOTPStorage
+        return SharedMemoryOTPStorage(
+            name=os.getenv("OTP_SHM_NAME", "tijzi-otp"),
+            ttl=ttl,
+            capacity=int(os.getenv("OTP_SHM_CAPACITY", "131072")),
+            stripes=int(os.getenv("OTP_SHM_STRIPES", "64")),
+        )
+
+    if backend != "memory":
+        raise ValueError(f"Unknown OTP_STORAGE backend: {backend}")
+    return OTPStore(ttl=ttl, max_entries=int(os.getenv("OTP_MAX_ENTRIES", "100000")))
+
 
 class OTPService:
-    def __init__(self):
-        self._storage: Dict[str, Dict] = {}
+    """
+    Generación y verificación de códigos OTP. Dos modos (OTP_MODE):
+    - "stored" (por defecto): código aleatorio guardado en el backend de OTP_STORAGE
+    - "hmac": código derivado de HMAC(secreto, teléfono, paso de tiempo); el
+      código no se guarda, el backend solo lleva el último paso verificado de
+      cada teléfono para que un código usado no se reutilice
+
+    Cada código generado y cada verificación quedan en el journal de auditoría
+    ("generated" con expires_at, "verified", "verify_failed"); un "generated"
+    sin "verified" antes de expires_at es un código expirado.
+    """
+
+    def __init__(self, storage: Optional[OTPStorage] = None, ttl: Optional[float] = None, mode: Optional[str] = None, journal: Optional[OTPJournal] = None):
+        self.mode = (mode or os.getenv("OTP_MODE", "stored")).lower()
+        self.journal = journal if journal is not None else otp_journal
+        self._hmac: Optional[HMACOTP] = None
+        self._storage: Optional[OTPStorage] = None
+
+        if self.mode == "hmac":
+            # El backend de OTP_STORAGE guarda solo el último paso verificado de
+            # cada teléfono (sqlite o shm para que un código usado no valga en otro worker)
+            step = int(os.getenv("OTP_HMAC_STEP", "60"))
+            drift = int(os.getenv("OTP_HMAC_DRIFT", "4"))
+            self.ttl = HMACOTP.ttl_for(step, drift)
+            self._hmac = HMACOTP.from_env(storage if storage is not None else build_storage(self.ttl))
+        elif self.mode == "stored":
+            # Almacén con expiración (5 minutos por defecto), intercambiable por backend
+            self.ttl = ttl if ttl is not None else float(os.getenv("OTP_TTL_SECONDS", "300"))
+            self._storage = storage if storage is not None else build_storage(self.ttl)
+        else:
+            raise ValueError(f"Unknown OTP_MODE: {self.mode}")
+
+    def _journal_generated(self, phone_number: str):
+        self.journal.append("generated", phone_number, mode=self.mode, expires_at=round(time.time() + self.ttl, 3))
+
+    def _journal_verified(self, phone_number: str, valid: bool) -> bool:
+        self.journal.append("verified" if valid else "verify_failed", phone_number, method="otp", mode=self.mode)
+        return valid
 
     def generate_and_store_code(self, phone_number: str) -> str:
         """Genera y almacena un código OTP de 6 dígitos"""
-        code = str(random.randint(100000, 999999))
-        self._storage[phone_number] = {
-            "code": code, 
-            "timestamp": time.time()
-        }
+        if self._hmac is not None:
+            code = self._hmac.generate(phone_number)
+        else:
+            code = str(random.randint(100000, 999999))
+            self._storage.put(phone_number, code)
+        self._journal_generated(phone_number)
         return code
 
     def verify_code(self, phone_number: str, code: str) -> bool:
-        """Verifica si el código OTP es válido (5 minutos de expiración)"""
-        entry = self._storage.get(phone_number)
-        if entry and entry["code"] == code:
-            # Verificar que no haya expirado (5 minutos = 300 segundos)
-            if time.time() - entry["timestamp"] < 300:
-                return True
-        return False
-
-    def generate_token(self, phone_number: str) -> str:
-        """Genera un token simple para el usuario"""
-        return f"tijzi-token-{phone_number}-{int(time.time())}"
-
-    def get_stored_codes(self) -> Dict:
-        """Debug: Ver códigos almacenados"""
-        return self._storage
\ No newline at end of file
+        """Verifica el código OTP (5 minutos de expiración) y lo consume: solo sirve una vez"""
+        if self._hmac is not None:
+            return self._journal_verified(phone_number, self._hmac.verify(phone_number, code))
+        return self._journal_verified(phone_number, self._storage.consume(phone_number, code))
+
+    async def generate_and_store_code_async(self, phone_number: str) -> str:
+        """Igual que generate_and_store_code sin bloquear el event loop"""
+        if self._hmac is not None:
+            code = await self._hmac.agenerate(phone_number)
+        else:
+            code = str(random.randint(100000, 999999))
+            await self._storage.aput(phone_number, code)
+        self._journal_generated(phone_number)
+        return code
+
+    async def verify_code_async(self, phone_number: str, code: str) -> bool:
+        """Igual que verify_code sin bloquear el event loop"""
+        if self._hmac is not None:
+            return self._journal_verified(phone_number, await self._hmac.averify(phone_number, code))
+        return self._journal_verified(phone_number, await self._storage.aconsume(phone_number, code))
+
+    def generate_token(self, phone_number: str, **claims) -> str:
+        """Genera un token de sesión firmado (HS256, con expiración) para el usuario"""
+        return session_tokens.issue(phone_number, **claims)
+
+    def storage_stats(self) -> Dict[str, int]:
+        """Entradas vigentes y expiradas del almacén (en modo hmac, los pasos verificados por teléfono)"""
+        if self._hmac is not None:
+            return self._hmac.stats()
+        return self._storage.stats()
+
+    def close(self):
+        """Cierra el backend de almacenamiento"""
+        if self._storage is not None:
+            self._storage.close()
+        if self._hmac is not None:
+            self._hmac.close()
@@ -0,0 +1,373 @@
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, Optional, Tuple
+from app.services.otp_storage import OTPStorage
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: no hay locks entre procesos
+    fcntl = None
+
+# Cabecera: magic, versión, stripes, slots por stripe
+_HEADER = struct.Struct("<QIII")
+_MAGIC = 0x544A5A494F545031  # "TJZIOTP1"
+_VERSION = 1
+# Contadores por stripe: entradas, expiradas, expulsadas
+_COUNTERS = struct.Struct("<qqq")
+# Slot: clave (teléfono como entero, 0 = vacío), expiración en ms, código, dígitos del código
+_SLOT = struct.Struct("<QqIB3x")
+
+_MASK64 = (1 << 64) - 1
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+def phone_key(phone: str) -> int:
+    """
+    "+573004051582" → 1573004051582: un "1" delante conserva los ceros
+    iniciales y evita el 0 (slot vacío). Claves que no son E.164 usan un hash
+    de 63 bits con el bit alto marcado.
+    """
+    digits = phone[1:] if phone.startswith("+") else phone
+    # isdigit() también acepta dígitos Unicode: "+57٣..." no puede dar la clave de "+573..."
+    if digits.isascii() and digits.isdigit() and len(digits) <= 17:
+        return int("1" + digits)
+    digest = hashlib.blake2b(phone.encode(), digest_size=8).digest()
+    return (1 << 63) | (int.from_bytes(digest, "little") >> 1)
+
+
+def key_phone(key: int) -> str:
+    """Inversa de phone_key (las claves hash no se pueden invertir)"""
+    if key >> 63:
+        return f"#{key:016x}"
+    return "+" + str(key)[1:]
+
+
+def _encode_code(code: str) -> Optional[Tuple[int, int]]:
+    if not (code.isascii() and code.isdigit()) or len(code) > 9:
+        return None
+    return int(code), len(code)
+
+
+class SharedMemoryOTPStorage(OTPStorage):
+    """
+    Backend OTP compartido por todos los workers de un host sin servicio
+    externo: tabla hash de capacidad fija en `multiprocessing.shared_memory`.
+
+    - Direccionamiento abierto con sondeo lineal. La tabla se divide en
+      `stripes` tramos independientes con su propio lock (fcntl sobre un byte
+      del archivo de lock entre procesos + threading.Lock dentro del proceso).
+      Una clave siempre sondea dentro de su tramo.
+    - Cada slot ocupa 24 bytes: teléfono como entero, expiración en ms y
+      código como entero con su número de dígitos.
+    - Los borrados (consumo, expiración) desplazan hacia atrás las entradas
+      siguientes (backward-shift), así no quedan lápidas. `put` reutiliza en
+      su sitio el primer slot expirado que encuentra al sondear.
+    - Si un tramo se llena se expulsa su entrada más próxima a expirar.
+
+    El primer worker crea el segmento y los demás se adjuntan. El segmento
+    sobrevive a los reinicios de workers; `unlink()` lo elimina.
+    """
+
+    def __init__(
+        self,
+        name: str = "tijzi-otp",
+        ttl: float = 300.0,
+        capacity: int = 131_072,
+        stripes: int = 64,
+        lock_path: Optional[str] = None,
+    ):
+        if fcntl is None:
+            raise RuntimeError("Shared-memory OTP storage requires POSIX file locks (fcntl)")
+        self.name = name
+        self.ttl = ttl
+        self.stripes = stripes
+        self.slots_per_stripe = max(1, capacity // stripes)
+        self.capacity = self.slots_per_stripe * stripes
+        self._counters_offset = _HEADER.size
+        self._slots_offset = self._counters_offset + _COUNTERS.size * stripes
+        size = self._slots_offset + _SLOT.size * self.capacity
+
+        self._thread_locks = [threading.Lock() for _ in range(stripes)]
+        self._lock_fd = os.open(
+            lock_path or os.path.join(tempfile.gettempdir(), f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o600
+        )
+        # Byte 0 del archivo de lock: creación/adjunto del segmento
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, 0, os.SEEK_SET)
+        try:
+            self._shm = self._open(size)
+        finally:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, 0, os.SEEK_SET)
+        self._buf = self._shm.buf
+
+    def _open(self, size: int) -> shared_memory.SharedMemory:
+        try:
+            shm = shared_memory.SharedMemory(self.name, create=True, size=size)
+            created = True
+        except FileExistsError:
+            shm = shared_memory.SharedMemory(self.name)
+            created = False
+        # El segmento no pertenece a este proceso: que el resource_tracker no lo borre al salir
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+
+        if created:
+            # La memoria nueva llega a cero: todos los slots vacíos
+            _HEADER.pack_into(shm.buf, 0, _MAGIC, _VERSION, self.stripes, self.slots_per_stripe)
+            return shm
+
+        magic, version, stripes, slots_per_stripe = _HEADER.unpack_from(shm.buf, 0)
+        if (magic, version, stripes, slots_per_stripe) != (_MAGIC, _VERSION, self.stripes, self.slots_per_stripe):
+            shm.close()
+            raise ValueError(
+                f"Shared memory '{self.name}' has a different layout "
+                f"(stripes={stripes}, slots_per_stripe={slots_per_stripe}); unlink it or change OTP_SHM_NAME"
+            )
+        return shm
+
+    # ---- Locks y direcciones ----
+
+    def _locate(self, key: int) -> Tuple[int, int]:
+        """(stripe, posición inicial dentro del stripe)"""
+        h = (key * _HASH_MULTIPLIER) & _MASK64
+        h ^= h >> 29
+        return h % self.stripes, (h // self.stripes) % self.slots_per_stripe
+
+    @contextmanager
+    def _locked(self, stripe: int) -> Iterator[None]:
+        with self._thread_locks[stripe]:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, stripe + 1, os.SEEK_SET)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe + 1, os.SEEK_SET)
+
+    def _offset(self, stripe: int, index: int) -> int:
+        return self._slots_offset + (stripe * self.slots_per_stripe + index) * _SLOT.size
+
+    def _read(self, stripe: int, index: int) -> Tuple[int, int, int, int]:
+        return _SLOT.unpack_from(self._buf, self._offset(stripe, index))
+
+    def _write(self, stripe: int, index: int, key: int, expires_ms: int, code: int, digits: int):
+        _SLOT.pack_into(self._buf, self._offset(stripe, index), key, expires_ms, code, digits)
+
+    def _count(self, stripe: int, entries: int = 0, expired: int = 0, evicted: int = 0):
+        offset = self._counters_offset + stripe * _COUNTERS.size
+        current = _COUNTERS.unpack_from(self._buf, offset)
+        _COUNTERS.pack_into(self._buf, offset, current[0] + entries, current[1] + expired, current[2] + evicted)
+
+    def _delete(self, stripe: int, index: int):
+        """Vacía el slot desplazando hacia atrás las entradas del mismo grupo de sondeo"""
+        size = self.slots_per_stripe
+        hole = index
+        probe = index
+        while True:
+            probe = (probe + 1) % size
+            slot = self._read(stripe, probe)
+            if slot[0] == 0 or probe == index:
+                break
+            home = self._locate(slot[0])[1]
+            # La entrada se queda si su posición inicial está en (hole, probe]
+            if (hole < probe and hole < home <= probe) or (hole > probe and (home > hole or home <= probe)):
+                continue
+            self._write(stripe, hole, *slot)
+            hole = probe
+        self._write(stripe, hole, 0, 0, 0, 0)
+
+    def _find(self, stripe: int, home: int, phone: int) -> Optional[int]:
+        """Slot del número dentro de su tramo (con el lock tomado), None si no está"""
+        size = self.slots_per_stripe
+        for step in range(size):
+            index = (home + step) % size
+            slot_key = self._read(stripe, index)[0]
+            if slot_key == phone:
+                return index
+            if slot_key == 0:
+                return None
+        return None
+
+    def _store(self, stripe: int, home: int, phone: int, encoded: Tuple[int, int], now: float):
+        """Guarda el código del número en su tramo (con el lock tomado)"""
+        now_ms = int(now * 1000)
+        expires_ms = int((now + self.ttl) * 1000)
+        size = self.slots_per_stripe
+        reusable = None
+        target = None
+        for step in range(size):
+            index = (home + step) % size
+            slot_key, slot_expires, _, _ = self._read(stripe, index)
+            if slot_key == phone:
+                target = index
+                break
+            if slot_key == 0:
+                if reusable is None:
+                    target = index
+                    self._count(stripe, entries=1)
+                break
+            if reusable is None and slot_expires <= now_ms:
+                reusable = index
+
+        if target is None:
+            if reusable is not None:
+                # Slot expirado de otro número: se reutiliza en su sitio
+                target = reusable
+                self._count(stripe, expired=1)
+            else:
+                # Tramo lleno: se expulsa la entrada más próxima a expirar
+                target = min(range(size), key=lambda i: self._read(stripe, i)[1])
+                self._count(stripe, evicted=1)
+        self._write(stripe, target, phone, expires_ms, *encoded)
+
+    def _current(self, stripe: int, home: int, phone: int, now_ms: int) -> Optional[str]:
+        index = self._find(stripe, home, phone)
+        if index is None:
+            return None
+        _, slot_expires, slot_code, slot_digits = self._read(stripe, index)
+        if slot_expires <= now_ms:
+            return None
+        return str(slot_code).zfill(slot_digits)
+
+    # ---- API de OTPStorage ----
+
+    def put(self, key: str, code: str, now: Optional[float] = None):
+        """Guarda (o reemplaza) el código de un número"""
+        encoded = _encode_code(code)
+        if encoded is None:
+            raise ValueError("Shared-memory OTP storage only stores numeric codes of up to 9 digits")
+        phone = phone_key(key)
+        stripe, home = self._locate(phone)
+        with self._locked(stripe):
+            self._store(stripe, home, phone, encoded, time.time() if now is None else now)
+
+    def read(self, key: str, now: Optional[float] = None) -> Optional[str]:
+        now_ms = int((time.time() if now is None else now) * 1000)
+        phone = phone_key(key)
+        stripe, home = self._locate(phone)
+        with self._locked(stripe):
+            return self._current(stripe, home, phone, now_ms)
+
+    def replace(self, key: str, expected: Optional[str], value: str, now: Optional[float] = None) -> bool:
+        encoded = _encode_code(value)
+        if encoded is None:
+            raise ValueError("Shared-memory OTP storage only stores numeric codes of up to 9 digits")
+        now = time.time() if now is None else now
+        phone = phone_key(key)
+        stripe, home = self._locate(phone)
+        # Lectura y escritura bajo el mismo lock de tramo (entre procesos)
+        with self._locked(stripe):
+            if self._current(stripe, home, phone, int(now * 1000)) != expected:
+                return False
+            self._store(stripe, home, phone, encoded, now)
+            return True
+
+    def consume(self, key: str, code: str, now: Optional[float] = None) -> bool:
+        """Verifica el código y lo elimina si es correcto (uso único)"""
+        encoded = _encode_code(code)
+        now_ms = int((time.time() if now is None else now) * 1000)
+        phone = phone_key(key)
+        stripe, home = self._locate(phone)
+        size = self.slots_per_stripe
+
+        with self._locked(stripe):
+            for step in range(size):
+                index = (home + step) % size
+                slot_key, slot_expires, slot_code, slot_digits = self._read(stripe, index)
+                if slot_key == 0:
+                    return False
+                if slot_key != phone:
+                    continue
+                if slot_expires <= now_ms:
+                    self._delete(stripe, index)
+                    self._count(stripe, entries=-1, expired=1)
+                    return False
+                if encoded is None or encoded != (slot_code, slot_digits):
+                    return False
+                self._delete(stripe, index)
+                self._count(stripe, entries=-1)
+                return True
+        return False
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Elimina todas las entradas expiradas (tramo a tramo), devuelve cuántas se quitaron"""
+        now_ms = int((time.time() if now is None else now) * 1000)
+        removed = 0
+        for stripe in range(self.stripes):
+            with self._locked(stripe):
+                stripe_removed = 0
+                for index in range(self.slots_per_stripe):
+                    # El desplazamiento puede traer otra entrada expirada al mismo slot
+                    while True:
+                        slot_key, slot_expires, _, _ = self._read(stripe, index)
+                        if slot_key == 0 or slot_expires > now_ms:
+                            break
+                        self._delete(stripe, index)
+                        stripe_removed += 1
+                if stripe_removed:
+                    self._count(stripe, entries=-stripe_removed, expired=stripe_removed)
+                removed += stripe_removed
+        return removed
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Vista de solo lectura en el formato histórico {"code", "timestamp"}"""
+        now_ms = int(time.time() * 1000)
+        codes = {}
+        for stripe in range(self.stripes):
+            with self._locked(stripe):
+                for index in range(self.slots_per_stripe):
+                    slot_key, slot_expires, slot_code, slot_digits = self._read(stripe, index)
+                    if slot_key and slot_expires > now_ms:
+                        codes[key_phone(slot_key)] = {
+                            "code": str(slot_code).zfill(slot_digits),
+                            "timestamp": slot_expires / 1000 - self.ttl,
+                        }
+        return codes
+
+    def _totals(self) -> Tuple[int, int, int]:
+        entries = expired = evicted = 0
+        for stripe in range(self.stripes):
+            stripe_entries, stripe_expired, stripe_evicted = _COUNTERS.unpack_from(
+                self._buf, self._counters_offset + stripe * _COUNTERS.size
+            )
+            entries += stripe_entries
+            expired += stripe_expired
+            evicted += stripe_evicted
+        return entries, expired, evicted
+
+    def __len__(self) -> int:
+        # Slots ocupados (incluye expirados aún no reclamados)
+        return self._totals()[0]
+
+    @property
+    def load_factor(self) -> float:
+        return len(self) / self.capacity
+
+    def stats(self) -> Dict[str, int]:
+        entries, expired, evicted = self._totals()
+        return {
+            "entries": entries,
+            "expired_total": expired,
+            "evicted_total": evicted,
+            "capacity": self.capacity,
+            "load_factor": round(entries / self.capacity, 4),
+        }
+
+    def close(self):
+        """Se desconecta del segmento (los demás workers lo siguen usando)"""
+        if self._buf is not None:
+            self._buf = None
+            self._shm.close()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def unlink(self):
+        """Elimina el segmento del sistema (solo cuando ningún worker lo usa)"""
+        shared_memory.SharedMemory(self.name).unlink()
@@ -0,0 +1,231 @@
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+from app.services.otp_storage import OTPStorage
+
+# Sentencias fijas: sqlite3 las prepara una vez y las reutiliza desde su caché por conexión
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS otp_codes (
+        phone TEXT PRIMARY KEY,
+        code TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_otp_codes_expires_at ON otp_codes (expires_at)",
+)
+_SQL_PUT = "INSERT OR REPLACE INTO otp_codes (phone, code, created_at, expires_at) VALUES (?, ?, ?, ?)"
+_SQL_CONSUME = "DELETE FROM otp_codes WHERE phone = ? AND code = ? AND expires_at > ?"
+_SQL_READ = "SELECT code FROM otp_codes WHERE phone = ? AND expires_at > ?"
+_SQL_REPLACE = "UPDATE otp_codes SET code = ?, created_at = ?, expires_at = ? WHERE phone = ? AND code = ? AND expires_at > ?"
+_SQL_DELETE_EXPIRED = "DELETE FROM otp_codes WHERE phone = ? AND expires_at <= ?"
+_SQL_INSERT = "INSERT OR IGNORE INTO otp_codes (phone, code, created_at, expires_at) VALUES (?, ?, ?, ?)"
+_SQL_PURGE = "DELETE FROM otp_codes WHERE expires_at <= ?"
+_SQL_SNAPSHOT = "SELECT phone, code, created_at FROM otp_codes WHERE expires_at > ?"
+_SQL_COUNT = "SELECT COUNT(*) FROM otp_codes WHERE expires_at > ?"
+
+_STOP = object()
+
+
+class SQLiteOTPStorage(OTPStorage):
+    """
+    Backend OTP en SQLite (modo WAL) compartido por todos los workers de un host.
+
+    Un único hilo escritor es dueño de la conexión. Las operaciones se encolan y
+    se ejecutan en lotes dentro de una sola transacción (group commit): un commit
+    por lote en lugar de uno por código. Los métodos async esperan el resultado
+    con `asyncio.wrap_future`, así el event loop nunca toca el disco.
+    """
+
+    def __init__(
+        self,
+        path: str = "otp.sqlite3",
+        ttl: float = 300.0,
+        batch_size: int = 256,
+        batch_window: float = 0.002,
+        purge_interval: float = 30.0,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.purge_interval = purge_interval
+        # Códigos eliminados por expiración (lo actualiza el hilo escritor)
+        self.expired_total = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="otp-sqlite-writer", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    # ---- API síncrona ----
+
+    def put(self, key: str, code: str, now: Optional[float] = None):
+        return self._submit(self._op_put, key, code, now).result()
+
+    def consume(self, key: str, code: str, now: Optional[float] = None) -> bool:
+        return self._submit(self._op_consume, key, code, now).result()
+
+    def read(self, key: str, now: Optional[float] = None) -> Optional[str]:
+        return self._submit(self._op_read, key, now).result()
+
+    def replace(self, key: str, expected: Optional[str], value: str, now: Optional[float] = None) -> bool:
+        return self._submit(self._op_replace, key, expected, value, now).result()
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        return self._submit(self._op_purge, now).result()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return self._submit(self._op_snapshot).result()
+
+    def __len__(self) -> int:
+        return self._submit(self._op_count).result()
+
+    # ---- API async (no bloquea el event loop) ----
+
+    async def aput(self, key: str, code: str, now: Optional[float] = None):
+        return await asyncio.wrap_future(self._submit(self._op_put, key, code, now))
+
+    async def aconsume(self, key: str, code: str, now: Optional[float] = None) -> bool:
+        return await asyncio.wrap_future(self._submit(self._op_consume, key, code, now))
+
+    async def apurge_expired(self, now: Optional[float] = None) -> int:
+        return await asyncio.wrap_future(self._submit(self._op_purge, now))
+
+    async def aread(self, key: str, now: Optional[float] = None) -> Optional[str]:
+        return await asyncio.wrap_future(self._submit(self._op_read, key, now))
+
+    async def areplace(self, key: str, expected: Optional[str], value: str, now: Optional[float] = None) -> bool:
+        return await asyncio.wrap_future(self._submit(self._op_replace, key, expected, value, now))
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    # ---- Hilo escritor ----
+
+    def _submit(self, op: Callable, *args) -> Future:
+        future: Future = Future()
+        if not self._thread.is_alive():
+            future.set_exception(RuntimeError("SQLite OTP storage is closed"))
+            return future
+        self._queue.put((op, args, future))
+        return future
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=64)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        return conn
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        last_purge = time.time()
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if time.time() - last_purge >= self.purge_interval:
+                batch.append((self._op_purge, (None,), None))
+                last_purge = time.time()
+            if batch:
+                self._execute_batch(conn, batch)
+        conn.close()
+
+    def _next_batch(self) -> Tuple[List, bool]:
+        try:
+            item = self._queue.get(timeout=self.purge_interval)
+        except queue.Empty:
+            return [], False
+        if item is _STOP:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _execute_batch(self, conn: sqlite3.Connection, batch: List):
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op, args, _ in batch:
+                try:
+                    results.append((True, op(conn, *args)))
+                except Exception as e:
+                    results.append((False, e))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            results = [(False, e)] * len(batch)
+
+        for (_, _, future), (ok, value) in zip(batch, results):
+            if future is None:
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    # ---- Operaciones (se ejecutan en el hilo escritor) ----
+
+    def _op_put(self, conn: sqlite3.Connection, key: str, code: str, now: Optional[float]):
+        now = time.time() if now is None else now
+        conn.execute(_SQL_PUT, (key, code, now, now + self.ttl))
+
+    def _op_consume(self, conn: sqlite3.Connection, key: str, code: str, now: Optional[float]) -> bool:
+        now = time.time() if now is None else now
+        return conn.execute(_SQL_CONSUME, (key, code, now)).rowcount == 1
+
+    def _op_read(self, conn: sqlite3.Connection, key: str, now: Optional[float]) -> Optional[str]:
+        now = time.time() if now is None else now
+        row = conn.execute(_SQL_READ, (key, now)).fetchone()
+        return row[0] if row else None
+
+    def _op_replace(self, conn: sqlite3.Connection, key: str, expected: Optional[str], value: str, now: Optional[float]) -> bool:
+        # Dentro de la transacción del lote (BEGIN IMMEDIATE): atómico frente a otros workers
+        now = time.time() if now is None else now
+        if expected is not None:
+            return conn.execute(_SQL_REPLACE, (value, now, now + self.ttl, key, expected, now)).rowcount == 1
+        conn.execute(_SQL_DELETE_EXPIRED, (key, now))
+        return conn.execute(_SQL_INSERT, (key, value, now, now + self.ttl)).rowcount == 1
+
+    def _op_purge(self, conn: sqlite3.Connection, now: Optional[float]) -> int:
+        now = time.time() if now is None else now
+        removed = conn.execute(_SQL_PURGE, (now,)).rowcount
+        self.expired_total += removed
+        return removed
+
+    def _op_snapshot(self, conn: sqlite3.Connection) -> Dict[str, Dict]:
+        rows = conn.execute(_SQL_SNAPSHOT, (time.time(),)).fetchall()
+        return {phone: {"code": code, "timestamp": created_at} for phone, code, created_at in rows}
+
+    def _op_count(self, conn: sqlite3.Connection) -> int:
+        return conn.execute(_SQL_COUNT, (time.time(),)).fetchone()[0]
@@ -0,0 +1,72 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+
+class OTPStorage(ABC):
+    """
+    Interfaz de almacenamiento de códigos OTP usada por OTPService.
+
+    Las implementaciones deben ofrecer `put`, `consume`, `purge_expired`,
+    `snapshot`, `__len__`, `read` y `replace` (abstractos: un backend incompleto falla al
+    instanciarse, no en el primer uso). Las variantes async (`aput`, `aconsume`, ...) por
+    defecto llaman a las síncronas; los backends con I/O las sobrescriben para
+    no bloquear el event loop.
+    """
+
+    ttl: float = 300.0
+
+    @abstractmethod
+    def put(self, key: str, code: str, now: Optional[float] = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def consume(self, key: str, code: str, now: Optional[float] = None) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def snapshot(self) -> Dict[str, Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def read(self, key: str, now: Optional[float] = None) -> Optional[str]:
+        """Valor vigente de la clave sin consumirlo (None si no existe o expiró)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def replace(self, key: str, expected: Optional[str], value: str, now: Optional[float] = None) -> bool:
+        """
+        Compare-and-set atómico (también entre workers en los backends
+        compartidos): guarda `value` con un TTL nuevo solo si el valor vigente
+        es `expected` (None = la clave no existe o expiró)
+        """
+        raise NotImplementedError
+
+    async def aput(self, key: str, code: str, now: Optional[float] = None):
+        return self.put(key, code, now)
+
+    async def aconsume(self, key: str, code: str, now: Optional[float] = None) -> bool:
+        return self.consume(key, code, now)
+
+    async def apurge_expired(self, now: Optional[float] = None) -> int:
+        return self.purge_expired(now)
+
+    async def aread(self, key: str, now: Optional[float] = None) -> Optional[str]:
+        return self.read(key, now)
+
+    async def areplace(self, key: str, expected: Optional[str], value: str, now: Optional[float] = None) -> bool:
+        return self.replace(key, expected, value, now)
+
+    def stats(self) -> Dict[str, int]:
+        """Tamaño y contadores del backend (para /metrics)"""
+        return {"entries": len(self), "expired_total": getattr(self, "expired_total", 0)}
+
+    def close(self):
+        """Libera recursos (conexiones, hilos). No-op por defecto"""
@@ -0,0 +1,135 @@
+import heapq
+import itertools
+import time
+from typing import Dict, List, Optional, Tuple
+from app.services.otp_storage import OTPStorage
+
+
+class OTPEntry:
+    """Entrada compacta del almacén (sin __dict__ por instancia)"""
+    __slots__ = ("code", "timestamp", "expires_at")
+
+    def __init__(self, code: str, timestamp: float, expires_at: float):
+        self.code = code
+        self.timestamp = timestamp
+        self.expires_at = expires_at
+
+
+class OTPStore(OTPStorage):
+    """
+    Almacén en memoria de códigos OTP con expiración y memoria acotada.
+
+    - Inserción y búsqueda O(1) sobre un dict.
+    - Expiración amortizada O(1): min-heap por fecha de expiración con barrido
+      perezoso (las entradas reemplazadas o consumidas se descartan al salir del heap).
+    - Límite duro de entradas: al llenarse se expulsa la entrada más próxima a expirar.
+    - Los códigos son de un solo uso: `consume` elimina la entrada al verificarla.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 100_000, sweep_batch: int = 64):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.sweep_batch = sweep_batch
+        self._entries: Dict[str, OTPEntry] = {}
+        self._heap: List[Tuple[float, int, str, OTPEntry]] = []
+        self._counter = itertools.count()
+        self.expired_total = 0
+        self.evicted_total = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, key: str, code: str, now: Optional[float] = None) -> OTPEntry:
+        """Guarda (o reemplaza) el código de un número"""
+        now = time.time() if now is None else now
+        self._sweep(now, self.sweep_batch)
+
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            self._sweep(now, len(self._heap))
+            while len(self._entries) >= self.max_entries:
+                self._evict_one()
+
+        entry = OTPEntry(code, now, now + self.ttl)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, (entry.expires_at, next(self._counter), key, entry))
+        self._compact()
+        return entry
+
+    def get(self, key: str, now: Optional[float] = None) -> Optional[OTPEntry]:
+        """Devuelve la entrada vigente de un número o None"""
+        now = time.time() if now is None else now
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            del self._entries[key]
+            self.expired_total += 1
+            return None
+        return entry
+
+    def consume(self, key: str, code: str, now: Optional[float] = None) -> bool:
+        """Verifica el código y lo elimina si es correcto (uso único)"""
+        entry = self.get(key, now)
+        if entry is None or entry.code != code:
+            return False
+        del self._entries[key]
+        return True
+
+    def read(self, key: str, now: Optional[float] = None) -> Optional[str]:
+        entry = self.get(key, now)
+        return entry.code if entry is not None else None
+
+    def replace(self, key: str, expected: Optional[str], value: str, now: Optional[float] = None) -> bool:
+        if self.read(key, now) != expected:
+            return False
+        self.put(key, value, now)
+        return True
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Elimina todas las entradas expiradas, devuelve cuántas se quitaron"""
+        now = time.time() if now is None else now
+        return self._sweep(now, len(self._heap))
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Vista de solo lectura en el formato histórico {"code", "timestamp"}"""
+        return {
+            key: {"code": entry.code, "timestamp": entry.timestamp}
+            for key, entry in self._entries.items()
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "expired_total": self.expired_total,
+            "evicted_total": self.evicted_total,
+        }
+
+    def _sweep(self, now: float, limit: int) -> int:
+        removed = 0
+        heap = self._heap
+        while heap and limit > 0 and heap[0][0] <= now:
+            _, _, key, entry = heapq.heappop(heap)
+            limit -= 1
+            # Solo cuenta si la entrada sigue siendo la vigente para ese número
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+                self.expired_total += 1
+                removed += 1
+        return removed
+
+    def _evict_one(self):
+        while self._heap:
+            _, _, key, entry = heapq.heappop(self._heap)
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+                self.evicted_total += 1
+                return
+
+    def _compact(self):
+        # Reconstruye el heap cuando acumula demasiadas referencias obsoletas
+        if len(self._heap) > 2 * len(self._entries) + 1024:
+            self._heap = [
+                (entry.expires_at, next(self._counter), key, entry)
+                for key, entry in self._entries.items()
+            ]
+            heapq.heapify(self._heap)
@@ -0,0 +1,245 @@
+import asyncio
+import os
+import random
+import time
+from typing import Dict
+import httpx
+from app.services.rate_limiter import rate_limiter, parse_retry_after
+from app.services.circuit_breaker import get_breaker
+from app.services.deadline import DeadlineExceeded, remaining
+from app.services.latency import LatencyTracker
+from app.services.lifecycle import lifecycle
+from app.services.logger import get_logger
+from app.services.metrics import provider_request_duration, provider_retries_total
+from app.services.timing import provider_trace, span
+
+log = get_logger("outbound")
+
+# Reintentos tras un 429 (esperando Retry-After) y espera máxima aceptada
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3"))
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))
+
+# Reintentos de fallos transitorios (error de conexión, 5xx) con backoff exponencial y jitter
+PROVIDER_MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "2"))
+PROVIDER_BACKOFF_BASE = float(os.getenv("PROVIDER_BACKOFF_BASE", "0.2"))
+PROVIDER_BACKOFF_MAX = float(os.getenv("PROVIDER_BACKOFF_MAX", "2"))
+
+
+class AdaptiveTimeouts:
+    """
+    Timeout de cada intento por (proveedor, operación) a partir de su latencia
+    observada: percentil `percentile` × `multiplier`, entre `minimum` y
+    `maximum`. Sin muestras suficientes se usa `maximum`. Cuentan las
+    respuestas del proveedor y los intentos que agotaron su timeout (como
+    muestra del valor del timeout); los errores de red no fijan la latencia.
+
+    Cada timeout seguido duplica además el valor (hasta `maximum`): si el
+    proveedor se vuelve más lento que el timeout aprendido, los intentos no
+    se quedan fallando para siempre sin producir muestras nuevas. La primera
+    respuesta vuelve al valor aprendido.
+    """
+
+    def __init__(self, percentile: float = 0.99, multiplier: float = 3.0, minimum: float = 2.0, maximum: float = 30.0):
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latencies = LatencyTracker()
+        # (proveedor:operación) → timeouts seguidos sin ninguna respuesta
+        self._timeouts: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveTimeouts":
+        return cls(
+            percentile=float(os.getenv("PROVIDER_TIMEOUT_PERCENTILE", "0.99")),
+            multiplier=float(os.getenv("PROVIDER_TIMEOUT_MULTIPLIER", "3")),
+            minimum=float(os.getenv("PROVIDER_TIMEOUT_MIN", "2")),
+            maximum=float(os.getenv("PROVIDER_TIMEOUT_MAX", os.getenv("HTTP_TIMEOUT", "30"))),
+        )
+
+    def observe(self, provider: str, operation: str, seconds: float):
+        key = f"{provider}:{operation}"
+        self.latencies.observe(key, seconds)
+        self._timeouts.pop(key, None)
+
+    def timed_out(self, provider: str, operation: str, timeout: float):
+        """Intento sin respuesta tras `timeout` segundos: la latencia real es al menos esa"""
+        key = f"{provider}:{operation}"
+        self.latencies.observe(key, timeout)
+        self._timeouts[key] = self._timeouts.get(key, 0) + 1
+
+    def timeout(self, provider: str, operation: str) -> float:
+        key = f"{provider}:{operation}"
+        latency = self.latencies.percentile(key, self.percentile)
+        if latency is None:
+            return self.maximum
+        timeout = max(self.minimum, latency * self.multiplier) * 2 ** min(self._timeouts.get(key, 0), 16)
+        return min(self.maximum, timeout)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {
+            key: {"samples": self.latencies.count(key), "timeout": self.timeout(*key.split(":", 1))}
+            for key in self.latencies.keys()
+        }
+
+
+# Instancia global: aprende de todas las llamadas del proceso
+provider_timeouts = AdaptiveTimeouts.from_env()
+
+
+def backoff(attempt: int) -> float:
+    """Espera antes del reintento `attempt` (1, 2...): full jitter sobre base × 2^(attempt-1)"""
+    return random.uniform(0, min(PROVIDER_BACKOFF_MAX, PROVIDER_BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+def _attempt_timeout(provider: str, operation: str) -> float:
+    """Timeout del próximo intento: el adaptativo, recortado a lo que queda del plazo"""
+    timeout = provider_timeouts.timeout(provider, operation)
+    left = remaining()
+    if left is not None:
+        if left <= 0:
+            raise DeadlineExceeded(f"{provider} {operation}: request deadline exceeded")
+        timeout = min(timeout, left)
+    return timeout
+
+
+def _can_wait(delay: float) -> bool:
+    # Solo se reintenta si tras la espera queda plazo para un intento razonable
+    left = remaining()
+    return left is None or left - delay >= provider_timeouts.minimum
+
+
+async def provider_post(
+    client: httpx.AsyncClient,
+    provider: str,
+    account: str,
+    sender: str,
+    url: str,
+    operation: str = "post",
+    **kwargs
+) -> httpx.Response:
+    """
+    POST a un proveedor respetando sus límites de envío y su circuit breaker.
+
+    Si el breaker del proveedor está abierto se lanza CircuitOpenError sin
+    salir a la red. Cada petición espera turno en el limitador (cuenta +
+    remitente). Si el proveedor responde 429, el limitador se frena según
+    Retry-After y la petición vuelve a la cola en lugar de fallar.
+
+    Los fallos transitorios se reintentan dentro de la misma petición: error
+    de conexión (la petición no llegó al proveedor) y 5xx, hasta
+    PROVIDER_MAX_RETRIES veces con backoff exponencial y jitter. Un timeout
+    de lectura no se reintenta: el mensaje pudo enviarse y se duplicaría.
+
+    Cada intento usa el timeout adaptativo del proveedor (AdaptiveTimeouts)
+    recortado al plazo de la petición (app.services.deadline); con el plazo
+    agotado se lanza DeadlineExceeded en lugar de seguir esperando.
+
+    Cada intento pasa por el breaker: con el plazo ya agotado no llega a
+    pedirle turno; con respuesta o error del proveedor se registra su
+    resultado y, si termina antes (plazo agotado en la espera, cancelación),
+    se devuelve su hueco de prueba.
+
+    La latencia y el estado de cada intento quedan en /metrics bajo
+    (`provider`, `operation`). Mientras dura (esperas incluidas) el envío
+    cuenta como en curso para el apagado ordenado.
+    """
+    async with lifecycle.sending():
+        return await _provider_post(client, provider, account, sender, url, operation, **kwargs)
+
+
+async def _provider_post(client: httpx.AsyncClient, provider: str, account: str, sender: str, url: str, operation: str, **kwargs) -> httpx.Response:
+    breaker = get_breaker(provider)
+    throttled = 0
+    retries = 0
+    while True:
+        # Plazo agotado: se falla antes de pedir turno al breaker (no ocupa el hueco de prueba)
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded(f"{provider} {operation}: request deadline exceeded")
+        probe = breaker.before_call()
+        try:
+            with span(f"{provider}.rate_limit"):
+                if left is None:
+                    await rate_limiter.acquire(provider, account, sender)
+                else:
+                    try:
+                        await asyncio.wait_for(rate_limiter.acquire(provider, account, sender), max(0.0, left))
+                    except asyncio.TimeoutError:
+                        raise DeadlineExceeded(f"{provider} {operation}: request deadline exceeded waiting for rate limiter")
+
+            timeout = _attempt_timeout(provider, operation)
+            # Server-Timing: conexión, TLS, envío y espera de la respuesta por separado
+            trace = provider_trace(provider)
+            if trace is not None:
+                kwargs["extensions"] = {"trace": trace}
+            started = time.perf_counter()
+            try:
+                # Los timeouts de httpx son por operación (conectar, cada lectura...);
+                # wait_for acota además el intento completo
+                with span(f"{provider}.request"):
+                    response = await asyncio.wait_for(
+                        client.post(url, timeout=httpx.Timeout(timeout, connect=min(timeout, client.timeout.connect or timeout)), **kwargs),
+                        timeout,
+                    )
+            except Exception as e:
+                duration = time.perf_counter() - started
+                breaker.record(False, duration)
+                probe = False
+                provider_request_duration.observe(duration, provider, operation, "error")
+                if isinstance(e, (httpx.TimeoutException, asyncio.TimeoutError)):
+                    left = remaining()
+                    if left is not None and left <= 0.001:
+                        raise DeadlineExceeded(f"{provider} {operation}: request deadline exceeded") from e
+                    # Agotó su propio timeout (no el plazo): sube el timeout aprendido
+                    provider_timeouts.timed_out(provider, operation, timeout)
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise httpx.ReadTimeout(f"{provider} {operation}: no response after {timeout:.1f}s") from e
+                # Solo errores de conexión: la petición no llegó a enviarse
+                if not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)) or retries >= PROVIDER_MAX_RETRIES:
+                    raise
+                retries += 1
+                delay = backoff(retries)
+                if not _can_wait(delay):
+                    raise
+                provider_retries_total.inc(provider, operation, "connect_error")
+                log.warning("provider.retry", provider=provider, operation=operation, reason=type(e).__name__, attempt=retries, delay=round(delay, 3))
+                with span(f"{provider}.backoff"):
+                    await asyncio.sleep(delay)
+                continue
+            duration = time.perf_counter() - started
+            # 4xx es un error de la petición, no del proveedor
+            breaker.record(response.status_code < 500, duration)
+            probe = False
+            provider_request_duration.observe(duration, provider, operation, str(response.status_code))
+            provider_timeouts.observe(provider, operation, duration)
+
+            if response.status_code >= 500:
+                retries += 1
+                delay = backoff(retries)
+                if retries > PROVIDER_MAX_RETRIES or not _can_wait(delay):
+                    return response
+                provider_retries_total.inc(provider, operation, str(response.status_code))
+                log.warning("provider.retry", provider=provider, operation=operation, reason=response.status_code, attempt=retries, delay=round(delay, 3))
+                with span(f"{provider}.backoff"):
+                    await asyncio.sleep(delay)
+                continue
+
+            if response.status_code != 429:
+                rate_limiter.succeeded(provider, account, sender)
+                return response
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            rate_limiter.throttled(provider, account, sender, retry_after)
+            log.warning("ratelimit.throttled", provider=provider, sender=sender, retry_after=retry_after, attempt=throttled + 1)
+
+            throttled += 1
+            wait = retry_after or 0
+            if throttled > RATE_LIMIT_MAX_RETRIES or wait > RATE_LIMIT_MAX_WAIT or not _can_wait(wait):
+                return response
+            provider_retries_total.inc(provider, operation, "429")
+        finally:
+            # Prueba half_open sin resultado del proveedor (plazo agotado,
+            # cancelación...): su hueco se devuelve o el breaker quedaría bloqueado
+            if probe:
+                breaker.release()
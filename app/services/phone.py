@@ -0,0 +1,155 @@
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+# Prefijo internacional → (mínimo, máximo) de dígitos del número nacional (sin prefijo de país)
+COUNTRY_NUMBER_LENGTHS: Dict[str, Tuple[int, int]] = {
+    # Norteamérica (NANP) y Rusia/Kazajistán
+    "1": (10, 10), "7": (10, 10),
+    # Europa
+    "30": (10, 10), "31": (9, 9), "32": (8, 9), "33": (9, 9), "34": (9, 9), "36": (8, 9),
+    "39": (6, 11), "40": (9, 9), "41": (9, 9), "43": (4, 13), "44": (9, 10), "45": (8, 8),
+    "46": (7, 10), "47": (8, 8), "48": (9, 9), "49": (6, 13),
+    "351": (9, 9), "352": (4, 11), "353": (7, 9), "354": (7, 9), "356": (8, 8), "357": (8, 8),
+    "358": (5, 12), "359": (8, 9), "370": (8, 8), "371": (8, 8), "372": (7, 8), "373": (8, 8),
+    "374": (8, 8), "375": (9, 10), "376": (6, 9), "377": (8, 9), "380": (9, 9), "381": (8, 9),
+    "382": (8, 8), "383": (8, 9), "385": (8, 9), "386": (8, 8), "387": (8, 9), "389": (8, 8),
+    "420": (9, 9), "421": (9, 9), "423": (7, 9),
+    # América Latina y Caribe
+    "51": (8, 9), "52": (10, 10), "53": (8, 8), "54": (10, 11), "55": (10, 11), "56": (9, 9),
+    "57": (10, 10), "58": (10, 10),
+    "501": (7, 7), "502": (8, 8), "503": (8, 8), "504": (8, 8), "505": (8, 8), "506": (8, 8),
+    "507": (7, 8), "509": (8, 8), "591": (8, 8), "592": (7, 7), "593": (8, 9), "595": (9, 9),
+    "597": (6, 7), "598": (8, 8),
+    # Asia y Oceanía
+    "60": (9, 10), "61": (9, 9), "62": (9, 12), "63": (10, 10), "64": (8, 10), "65": (8, 8),
+    "66": (8, 9), "81": (9, 10), "82": (8, 10), "84": (9, 10), "86": (10, 11), "90": (10, 10),
+    "91": (10, 10), "92": (10, 10), "93": (9, 9), "94": (9, 9), "95": (8, 10), "98": (10, 10),
+    "852": (8, 8), "853": (8, 8), "855": (8, 9), "856": (8, 10), "880": (10, 10), "886": (9, 9),
+    "960": (7, 7), "961": (7, 8), "962": (8, 9), "963": (9, 9), "964": (10, 10), "965": (8, 8),
+    "966": (9, 9), "967": (9, 9), "968": (8, 8), "970": (9, 9), "971": (8, 9), "972": (8, 9),
+    "973": (8, 8), "974": (8, 8), "976": (8, 8), "977": (10, 10), "992": (9, 9), "993": (8, 8),
+    "994": (9, 9), "995": (9, 9), "996": (9, 9), "998": (9, 9),
+    # África
+    "20": (9, 10), "27": (9, 9),
+    "212": (9, 9), "213": (9, 9), "216": (8, 8), "218": (9, 9), "220": (7, 7), "221": (9, 9),
+    "223": (8, 8), "225": (10, 10), "226": (8, 8), "227": (8, 8), "228": (8, 8), "229": (8, 10),
+    "233": (9, 9), "234": (8, 10), "237": (9, 9), "240": (9, 9), "241": (7, 8), "242": (9, 9),
+    "243": (9, 9), "244": (9, 9), "250": (9, 9), "251": (9, 9), "252": (7, 9), "254": (9, 10),
+    "255": (9, 9), "256": (9, 9), "257": (8, 8), "258": (8, 9), "260": (9, 9), "261": (9, 9),
+    "263": (9, 10), "264": (8, 9), "265": (7, 9), "266": (8, 8), "267": (7, 8), "268": (8, 8),
+}
+
+# Países donde el 0 inicial forma parte del número (no es prefijo troncal)
+KEEP_LEADING_ZERO = {"39", "225", "242"}
+
+# Espacios, guiones, puntos y paréntesis que los usuarios escriben al formatear
+_SEPARATORS_RE = re.compile(r"[\s\-.()/]")
+# Solo dígitos ASCII: \d también acepta dígitos Unicode (árabes, devanagari...)
+_DIGITS_RE = re.compile(r"^[0-9]+\Z")
+
+# Total de dígitos permitido por E.164 (prefijo de país incluido)
+E164_MAX_DIGITS = 15
+
+
+class InvalidPhoneNumber(ValueError):
+    """Número imposible: se rechaza antes de llamar a ningún proveedor"""
+
+
+def _build_trie(lengths: Dict[str, Tuple[int, int]]) -> Dict:
+    """Trie de dígitos; el nodo final de cada prefijo guarda (prefijo, longitudes)"""
+    root: Dict = {}
+    for prefix, bounds in lengths.items():
+        node = root
+        for digit in prefix:
+            node = node.setdefault(digit, {})
+        node[""] = (prefix, bounds)
+    return root
+
+
+_TRIE = _build_trie(COUNTRY_NUMBER_LENGTHS)
+
+
+def match_country(digits: str) -> Optional[Tuple[str, Tuple[int, int]]]:
+    """
+    Prefijo de país al inicio de `digits` (los prefijos E.164 no se solapan,
+    así que el primer nodo final del recorrido es el único posible)
+    """
+    node = _TRIE
+    for digit in digits[:3]:
+        node = node.get(digit)
+        if node is None:
+            return None
+        if "" in node:
+            return node[""]
+    return None
+
+
+def _allow_unknown_countries() -> bool:
+    return os.getenv("PHONE_ALLOW_UNKNOWN_COUNTRIES", "false").lower() in ("1", "true", "yes", "on")
+
+
+def _clean(value: str) -> str:
+    return _SEPARATORS_RE.sub("", str(value))
+
+
+@lru_cache(maxsize=int(os.getenv("PHONE_CACHE_SIZE", "65536")))
+def normalize_phone(country_code: str, phone_number: str) -> str:
+    """
+    Normaliza a E.164 ("+573004051582"): quita espacios y separadores, el
+    prefijo internacional ("+" o "00") y los ceros troncales del número
+    nacional, y valida prefijo de país y longitud. Lanza InvalidPhoneNumber.
+
+    Es además la clave canónica del almacén OTP: "+57 300 405 1582" y
+    "+573004051582" dan la misma entrada.
+    """
+    country = _clean(country_code)
+    national = _clean(phone_number)
+
+    # El número ya trae su prefijo internacional: se ignora countryCode
+    if national.startswith("+"):
+        return parse_phone(national)
+
+    if country.startswith("+"):
+        country = country[1:]
+    elif country.startswith("00"):
+        country = country[2:]
+    if not country or not _DIGITS_RE.match(country):
+        raise InvalidPhoneNumber("Invalid country code")
+    if not national or not _DIGITS_RE.match(national):
+        raise InvalidPhoneNumber("Phone number must contain only digits")
+
+    match = match_country(country)
+    if match is None or match[0] != country:
+        if not _allow_unknown_countries() or len(country) > 3:
+            raise InvalidPhoneNumber("Unknown country code")
+        bounds = (4, E164_MAX_DIGITS - len(country))
+    else:
+        bounds = match[1]
+
+    if country not in KEEP_LEADING_ZERO:
+        national = national.lstrip("0")
+
+    min_length, max_length = bounds
+    if not min_length <= len(national) <= max_length or len(country) + len(national) > E164_MAX_DIGITS:
+        raise InvalidPhoneNumber("Invalid phone number length for country")
+
+    return f"+{country}{national}"
+
+
+@lru_cache(maxsize=int(os.getenv("PHONE_CACHE_SIZE", "65536")))
+def parse_phone(number: str) -> str:
+    """Normaliza un número completo ("+57 300 405 1582", "0057...") a E.164"""
+    digits = _clean(number)
+    if digits.startswith("+"):
+        digits = digits[1:]
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    if not digits or not _DIGITS_RE.match(digits):
+        raise InvalidPhoneNumber("Phone number must contain only digits")
+    match = match_country(digits)
+    if match is None:
+        raise InvalidPhoneNumber("Unknown country code")
+    country = match[0]
+    return normalize_phone(country, digits[len(country):])
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Interpreta Retry-After (segundos o fecha HTTP) y devuelve segundos de espera"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket async con espera justa (FIFO) y tasa adaptativa.
+
+    - `acquire` espera su turno en orden de llegada en lugar de fallar.
+    - `throttled` (429) pausa el bucket durante Retry-After y reduce la tasa a la mitad.
+    - `succeeded` recupera la tasa poco a poco hasta la configurada (AIMD).
+    """
+
+    def __init__(self, rate: float, burst: float, min_rate: Optional[float] = None):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate if min_rate is not None else max(rate / 16, 0.1)
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # asyncio.Lock queda ligado a un event loop: se recrea si el loop cambia
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    async def acquire(self):
+        # El lock de asyncio despierta a los que esperan en orden FIFO
+        async with self._get_lock():
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def throttled(self, retry_after: Optional[float] = None):
+        now = time.monotonic()
+        self._refill(now)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+        if retry_after is None:
+            retry_after = 1 / self.rate
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def succeeded(self):
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.05)
+
+
+class ProviderRateLimiter:
+    """
+    Límites de envío por proveedor: un bucket por cuenta y otro por remitente.
+
+    Configuración por variables de entorno (mensajes/segundo y ráfaga):
+    WHATSAPP_RATE_LIMIT, WHATSAPP_SENDER_RATE_LIMIT, TWILIO_RATE_LIMIT,
+    TWILIO_SENDER_RATE_LIMIT y sus equivalentes *_BURST.
+    """
+
+    DEFAULTS = {
+        "whatsapp": (80.0, 80.0),
+        "twilio": (100.0, 10.0),
+    }
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[str, str, str], TokenBucket] = {}
+
+    def _limits(self, provider: str, scope: str) -> Tuple[float, float]:
+        account_default, sender_default = self.DEFAULTS.get(provider, (50.0, 50.0))
+        prefix = provider.upper()
+        if scope == "account":
+            rate = float(os.getenv(f"{prefix}_RATE_LIMIT", account_default))
+            burst = float(os.getenv(f"{prefix}_RATE_LIMIT_BURST", rate))
+        else:
+            rate = float(os.getenv(f"{prefix}_SENDER_RATE_LIMIT", sender_default))
+            burst = float(os.getenv(f"{prefix}_SENDER_RATE_LIMIT_BURST", rate))
+        return rate, burst
+
+    def _bucket(self, provider: str, scope: str, key: str) -> TokenBucket:
+        bucket_key = (provider, scope, key)
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            rate, burst = self._limits(provider, scope)
+            bucket = TokenBucket(rate, burst)
+            self._buckets[bucket_key] = bucket
+        return bucket
+
+    async def acquire(self, provider: str, account: str, sender: str):
+        """Espera turno en el bucket de la cuenta y luego en el del remitente"""
+        await self._bucket(provider, "account", account).acquire()
+        await self._bucket(provider, "sender", sender).acquire()
+
+    def throttled(self, provider: str, account: str, sender: str, retry_after: Optional[float]):
+        """El proveedor respondió 429: frena cuenta y remitente"""
+        self._bucket(provider, "account", account).throttled(retry_after)
+        self._bucket(provider, "sender", sender).throttled(retry_after)
+
+    def succeeded(self, provider: str, account: str, sender: str):
+        self._bucket(provider, "account", account).succeeded()
+        self._bucket(provider, "sender", sender).succeeded()
+
+    def get_debug_info(self) -> Dict:
+        return {
+            f"{provider}:{scope}:{key}": {
+                "rate": round(bucket.rate, 3),
+                "base_rate": bucket.base_rate,
+                "tokens": round(bucket.tokens, 3),
+                "blocked_for": max(0.0, round(bucket.blocked_until - time.monotonic(), 3)),
+            }
+            for (provider, scope, key), bucket in self._buckets.items()
+        }
+
+
+# Instancia global compartida por WhatsApp y SMS
+rate_limiter = ProviderRateLimiter()
@@ -0,0 +1,389 @@
+import base64
+import hashlib
+import heapq
+import hmac
+import json
+import math
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+from fastapi import Header, HTTPException
+from app.services.lazy import Lazy
+from app.services.logger import get_logger
+from app.services.otp_storage import OTPStorage
+
+log = get_logger("session")
+
+# Cabecera JWT fija (HS256): se codifica una sola vez
+_HEADER_SEGMENT = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b"=").decode()
+ISSUER = "tijzi"
+
+# Contador de revocaciones en el backend compartido: cambia con cada logout,
+# así la sincronización solo lista el backend cuando hay algo nuevo
+_VERSION_KEY = "revocations:version"
+
+
+class InvalidToken(Exception):
+    """Token mal formado, con firma inválida, expirado o revocado"""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom de tamaño fijo: `in` nunca da falsos negativos y da falsos
+    positivos con probabilidad ~`error_rate` al llegar a `capacity` elementos.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+def build_revocation_storage(ttl: float) -> Optional[OTPStorage]:
+    """
+    Backend compartido de revocaciones (SESSION_REVOCATION_STORAGE), con los
+    mismos backends que el almacén OTP:
+    - "memory" (por defecto): sin backend compartido, solo el proceso que revoca
+    - "sqlite": archivo SQLite compartido por los workers del host
+    - "shm": tabla hash en memoria compartida entre los workers del host
+    Cada jti vive `ttl` (la validez máxima de un token) desde que se revoca.
+    """
+    backend = os.getenv("SESSION_REVOCATION_STORAGE", "memory").lower()
+
+    if backend == "sqlite":
+        from app.services.otp_sqlite import SQLiteOTPStorage
+        return SQLiteOTPStorage(path=os.getenv("SESSION_REVOCATION_SQLITE_PATH", "revocations.sqlite3"), ttl=ttl)
+
+    if backend == "shm":
+        from app.services.otp_shm import SharedMemoryOTPStorage
+        return SharedMemoryOTPStorage(
+            name=os.getenv("SESSION_REVOCATION_SHM_NAME", "tijzi-revocations"),
+            ttl=ttl,
+            capacity=int(os.getenv("SESSION_REVOCATION_CAPACITY", "100000")),
+        )
+
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_REVOCATION_STORAGE backend: {backend}")
+    return None
+
+
+class RevocationList:
+    """
+    Tokens revocados (por jti) hasta su expiración.
+
+    El filtro de Bloom responde el caso común ("no revocado") sin tocar el
+    dict; solo sus positivos se confirman contra el conjunto exacto. Los jti
+    expirados salen de un heap por fecha de expiración (coste proporcional a
+    los que expiran, sin recorrer el conjunto). El filtro se reconstruye solo
+    cuando acumula el doble de inserciones que su capacidad: amortizado O(1)
+    por revocación.
+
+    Memoria acotada: como máximo `capacity` jti vigentes. Si se llena, se
+    expulsan los más próximos a expirar.
+
+    Con `storage` (SESSION_REVOCATION_STORAGE=sqlite|shm) la revocación se
+    escribe también en el backend compartido, y un hilo trae cada
+    `sync_interval` segundos las de los otros workers del host al filtro y
+    al conjunto locales. `is_revoked` nunca sale del proceso: un logout en
+    otro worker tarda como mucho `sync_interval` en aplicarse aquí.
+
+    Los endpoints síncronos verifican desde el threadpool: el heap, el
+    conjunto y el filtro solo se modifican con `_lock`.
+    """
+
+    def __init__(self, capacity: int = 100_000, storage: Optional[OTPStorage] = None, sync_interval: float = 1.0):
+        self.capacity = capacity
+        self.storage = storage
+        self.sync_interval = sync_interval
+        self.evicted_total = 0
+        self._revoked: Dict[str, float] = {}
+        self._expiries: List[Tuple[float, str]] = []
+        self._bloom = BloomFilter(capacity)
+        self._bloom_items = 0
+        self._lock = threading.Lock()
+        self._synced_version: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def revoke(self, jti: str, expires_at: float, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        if self.storage is not None:
+            self.storage.put(jti, "1", now)
+            self._bump_version(now)
+        with self._lock:
+            self._purge(now)
+            self._insert(jti, expires_at)
+
+    def is_revoked(self, jti: str) -> bool:
+        # Solo lecturas de un dict y un bytearray: sin lock ni I/O
+        return jti in self._bloom and jti in self._revoked
+
+    def purge(self, now: Optional[float] = None) -> int:
+        """Quita los jti expirados; devuelve cuántos"""
+        now = time.time() if now is None else now
+        expiries = self._expiries
+        if not expiries or expiries[0][0] > now:
+            # Caso común en cada verificación: nada que expirar, sin tomar el lock
+            return 0
+        with self._lock:
+            return self._purge(now)
+
+    def _purge(self, now: float) -> int:
+        removed = 0
+        expiries = self._expiries
+        while expiries and expiries[0][0] <= now:
+            expires_at, jti = heapq.heappop(expiries)
+            # Solo si la entrada sigue vigente con esa expiración (no repetida ni expulsada)
+            if self._revoked.get(jti) == expires_at:
+                del self._revoked[jti]
+                removed += 1
+        return removed
+
+    def _insert(self, jti: str, expires_at: float):
+        if jti not in self._revoked and len(self._revoked) >= self.capacity:
+            self._evict_one()
+        self._revoked[jti] = expires_at
+        heapq.heappush(self._expiries, (expires_at, jti))
+        self._bloom.add(jti)
+        self._bloom_items += 1
+        if self._bloom_items > 2 * self.capacity:
+            self._rebuild_bloom()
+
+    def _evict_one(self):
+        while self._expiries:
+            expires_at, jti = heapq.heappop(self._expiries)
+            if self._revoked.get(jti) == expires_at:
+                del self._revoked[jti]
+                self.evicted_total += 1
+                if self.evicted_total == 1 or self.evicted_total % 1000 == 0:
+                    log.warning("session.revocations_evicted", total=self.evicted_total, shared=self.storage is not None)
+                return
+
+    def _rebuild_bloom(self):
+        bloom = BloomFilter(self.capacity)
+        for jti in self._revoked:
+            bloom.add(jti)
+        # Se sustituye entero: las lecturas sin lock ven el filtro viejo o el nuevo
+        self._bloom = bloom
+        self._bloom_items = len(self._revoked)
+        # El heap también acumula entradas repetidas o expulsadas
+        self._expiries = [(expires_at, jti) for jti, expires_at in self._revoked.items()]
+        heapq.heapify(self._expiries)
+
+    # ---- Backend compartido ----
+
+    def _bump_version(self, now: float):
+        for _ in range(3):
+            version = self.storage.read(_VERSION_KEY, now)
+            # Valor corto (el backend shm guarda hasta 9 dígitos)
+            if self.storage.replace(_VERSION_KEY, version, str((int(version or 0) + 1) % 10 ** 9), now):
+                return
+
+    def sync(self, now: Optional[float] = None) -> int:
+        """Trae las revocaciones del backend compartido; devuelve cuántas eran nuevas"""
+        if self.storage is None:
+            return 0
+        now = time.time() if now is None else now
+        version = self.storage.read(_VERSION_KEY, now)
+        if version is None or version == self._synced_version:
+            return 0
+        entries = self.storage.snapshot()
+        added = 0
+        with self._lock:
+            for key, entry in entries.items():
+                # shm devuelve las claves numéricas con "+" delante y las demás como hash ("#...")
+                jti = key[1:] if key.startswith("+") else key
+                if key.startswith("#") or key == _VERSION_KEY or jti in self._revoked:
+                    continue
+                self._insert(jti, entry["timestamp"] + self.storage.ttl)
+                added += 1
+        self._synced_version = version
+        return added
+
+    def start(self):
+        """Hilo de sincronización con el backend compartido (si lo hay)"""
+        if self.storage is None or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-revocations-sync", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                log.error("session.revocations_sync_failed", error=str(e))
+
+    def close(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self.storage is not None and getattr(self.storage, "built", True):
+            self.storage.close()
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+class SessionTokens:
+    """
+    Tokens de sesión firmados (JWT HS256) con expiración y claims.
+
+    `verify` no hace I/O: comprueba firma, expiración y revocación. Los tokens
+    ya validados quedan en un LRU, así la verificación repetida del mismo token
+    se reduce a una búsqueda en dict y dos comparaciones. El LRU se modifica
+    con `_lock` (verify se llama desde el event loop y desde el threadpool).
+
+    El jti son 17 dígitos aleatorios: el backend shm guarda las claves
+    numéricas tal cual, así la sincronización de revocaciones puede listarlas.
+
+    Variables: SESSION_TOKEN_SECRET (compartido entre workers), SESSION_TOKEN_TTL,
+    SESSION_TOKEN_CACHE_SIZE, SESSION_REVOCATION_CAPACITY, SESSION_REVOCATION_STORAGE,
+    SESSION_REVOCATION_SYNC_SECONDS.
+    """
+
+    def __init__(self, secret: Optional[str] = None, ttl: Optional[float] = None, cache_size: Optional[int] = None):
+        secret = secret or os.getenv("SESSION_TOKEN_SECRET")
+        if not secret:
+            # Sin secreto compartido cada proceso firma con el suyo: los tokens
+            # no se validan en otros workers ni sobreviven a un reinicio
+            log.warning("session.ephemeral_secret")
+            secret = secrets.token_urlsafe(32)
+        self._key = secret.encode()
+        self.ttl = ttl or float(os.getenv("SESSION_TOKEN_TTL", "86400"))
+        self.cache_size = cache_size or int(os.getenv("SESSION_TOKEN_CACHE_SIZE", "10000"))
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        # El backend compartido se abre en el primer uso, no al importar
+        shared = None
+        if os.getenv("SESSION_REVOCATION_STORAGE", "memory").lower() != "memory":
+            shared = Lazy(partial(build_revocation_storage, self.ttl))
+        self.revocations = RevocationList(
+            int(os.getenv("SESSION_REVOCATION_CAPACITY", "100000")),
+            shared,
+            float(os.getenv("SESSION_REVOCATION_SYNC_SECONDS", "1")),
+        )
+
+    def _sign(self, signing_input: bytes) -> str:
+        return _b64encode(hmac.new(self._key, signing_input, hashlib.sha256).digest())
+
+    def issue(self, subject: str, **claims) -> str:
+        """Emite un token para `subject` (el teléfono verificado) con claims adicionales"""
+        now = int(time.time())
+        payload = {
+            "iss": ISSUER,
+            "sub": subject,
+            "iat": now,
+            "exp": now + int(self.ttl),
+            "jti": f"{secrets.randbelow(10 ** 17):017d}",
+        }
+        payload.update(claims)
+        payload_segment = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+        signing_input = f"{_HEADER_SEGMENT}.{payload_segment}"
+        return f"{signing_input}.{self._sign(signing_input.encode())}"
+
+    def verify(self, token: str, now: Optional[float] = None) -> Dict:
+        """Devuelve los claims del token o lanza InvalidToken"""
+        now = time.time() if now is None else now
+        self.revocations.purge(now)
+
+        with self._lock:
+            claims = self._cache.get(token)
+            if claims is not None:
+                self._cache.move_to_end(token)
+        if claims is None:
+            # Firma fuera del lock: es la parte cara
+            claims = self._decode(token)
+            with self._lock:
+                self._cache[token] = claims
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        if claims["exp"] <= now:
+            with self._lock:
+                self._cache.pop(token, None)
+            raise InvalidToken("Token expired")
+        if self.revocations.is_revoked(claims["jti"]):
+            raise InvalidToken("Token revoked")
+        return claims
+
+    def _decode(self, token: str) -> Dict:
+        try:
+            header_segment, payload_segment, signature = token.split(".")
+        except ValueError:
+            raise InvalidToken("Malformed token")
+        if header_segment != _HEADER_SEGMENT:
+            raise InvalidToken("Unsupported token header")
+        expected = self._sign(f"{header_segment}.{payload_segment}".encode())
+        if not hmac.compare_digest(expected.encode(), signature.encode()):
+            raise InvalidToken("Invalid signature")
+        try:
+            claims = json.loads(_b64decode(payload_segment))
+        except ValueError:
+            raise InvalidToken("Malformed token")
+        if not isinstance(claims, dict) or not isinstance(claims.get("exp"), int) or "jti" not in claims:
+            raise InvalidToken("Malformed token")
+        return claims
+
+    def revoke(self, claims: Dict):
+        """Revoca un token ya verificado hasta su expiración"""
+        self.revocations.revoke(claims["jti"], claims["exp"])
+
+    def start(self):
+        """Arranca la sincronización de revocaciones entre workers (backend compartido)"""
+        self.revocations.start()
+
+    def close(self):
+        """Detiene la sincronización y cierra el backend compartido (si se llegó a abrir)"""
+        self.revocations.close()
+
+
+# Instancia global por proceso
+session_tokens = SessionTokens()
+
+
+def require_session(authorization: Optional[str] = Header(None)) -> Dict:
+    """
+    Dependencia FastAPI: exige `Authorization: Bearer <token>` válido y
+    devuelve sus claims.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(
+            status_code=401,
+            detail="Missing bearer token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    token = authorization[7:].strip()
+    try:
+        claims = session_tokens.verify(token)
+    except InvalidToken as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+    # Copia: los claims cacheados no deben modificarse fuera del servicio
+    return dict(claims)
@@ -1,17 +1,28 @@
-import os
-import httpx
-import base64
+from typing import Optional
+from app.services.http_clients import http_clients
+from app.services.outbound import provider_post
+from app.services.logger import get_logger
+from app.services.timing import span
+from app.settings import Settings, get_settings
+
+log = get_logger("sms")
 
 class SMSService:
-    def __init__(self):
-        self.account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-        self.auth_token = os.getenv("TWILIO_AUTH_TOKEN") 
-        self.verify_service_sid = os.getenv("TWILIO_VERIFY_SERVICE_SID")
-        self.from_phone = os.getenv("TWILIO_PHONE_NUMBER")  # Nueva variable para SMS básico
+    def __init__(self, settings: Optional[Settings] = None):
+        self.configure(settings or get_settings())
+        
+    def configure(self, settings: Settings):
+        """Toma credenciales y URLs de la configuración (al arrancar y en cada recarga)"""
+        self.account_sid = settings.twilio_account_sid
+        self.auth_token = settings.twilio_auth_token
+        self.verify_service_sid = settings.twilio_verify_service_sid
+        self.from_phone = settings.twilio_phone_number  # Nueva variable para SMS básico
         
         # URLs para ambos servicios
-        self.verify_base_url = f"https://verify.twilio.com/v2/Services/{self.verify_service_sid}"
-        self.sms_base_url = f"https://api.twilio.com/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        self.verify_base_url = settings.twilio_verify_url
+        self.sms_base_url = settings.twilio_messages_url
+        # Webhook de estado de entrega (None: sin callbacks)
+        self.status_callback_url = settings.twilio_status_callback_url
         
     async def send_verification_code(self, phone_number: str) -> dict:
         """
@@ -19,62 +30,45 @@ class SMSService:
         MANTIENE COMPATIBILIDAD CON CÓDIGO EXISTENTE
         """
         try:
-            print(f"🔥 [SMS Verify] Checking credentials...")
-            
             if not self.account_sid or not self.auth_token or not self.verify_service_sid:
-                print("🔥 [SMS ERROR] Missing Twilio Verify credentials")
+                log.error("sms.missing_credentials", kind="verify")
                 return {"success": False, "error": "Missing credentials"}
             
-            print(f"🔥 [SMS] Service SID: {self.verify_service_sid}")
-            print(f"🔥 [SMS] To: {phone_number}")
-            
-            # URL para enviar verificación
-            url = f"{self.verify_base_url}/Verifications"
-            
-            # Payload para Twilio Verify
-            payload = {
-                "To": phone_number,
-                "Channel": "sms"
-            }
-            
-            # Autenticación básica
-            credentials = f"{self.account_sid}:{self.auth_token}"
-            encoded_credentials = base64.b64encode(credentials.encode()).decode()
-            
-            headers = {
-                "Authorization": f"Basic {encoded_credentials}",
-                "Content-Type": "application/x-www-form-urlencoded"
-            }
+            log.debug("sms.verify_request", service_sid=self.verify_service_sid, phone=phone_number)
             
-            print(f"🔥 [SMS] Sending verification request to Twilio...")
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url,
-                    data=payload,
-                    headers=headers,
-                    timeout=30.0
-                )
+            with span("payload"):
+                # URL para enviar verificación
+                url = f"{self.verify_base_url}/Verifications"
                 
-                print(f"🔥 [SMS] Status: {response.status_code}")
-                print(f"🔥 [SMS] Response: {response.text}")
+                # Payload para Twilio Verify
+                payload = {
+                    "To": phone_number,
+                    "Channel": "sms"
+                }
+            
+            response = await provider_post(
+                http_clients.twilio, "twilio", self.account_sid, self.verify_service_sid, url,
+                operation="verify", data=payload
+            )
+            
+            log.debug("sms.response", status=response.status_code, body=response.text)
+            
+            if response.status_code == 201:
+                result = response.json()
+                log.info("sms.verification_sent", phone=phone_number, sid=result.get("sid"))
+                return {
+                    "success": True,
+                    "sid": result.get("sid"),
+                    "status": result.get("status"),
+                    "to": result.get("to")
+                }
+            else:
+                error_detail = response.text
+                log.error("sms.failed", status=response.status_code, body=error_detail)
+                return {"success": False, "error": f"Twilio error: {error_detail}"}
                 
-                if response.status_code == 201:
-                    result = response.json()
-                    print(f"🔥 [SMS SUCCESS] Verification sent to {phone_number}")
-                    return {
-                        "success": True,
-                        "sid": result.get("sid"),
-                        "status": result.get("status"),
-                        "to": result.get("to")
-                    }
-                else:
-                    error_detail = response.text
-                    print(f"🔥 [SMS ERROR] Failed with status {response.status_code}: {error_detail}")
-                    return {"success": False, "error": f"Twilio error: {error_detail}"}
-                    
         except Exception as e:
-            print(f"🔥 [SMS EXCEPTION] {str(e)}")
+            log.error("sms.exception", error=str(e))
             return {"success": False, "error": str(e)}
     
     async def send_sms_multilingual(self, phone_number: str, otp_code: str, language: str, supported_languages: dict) -> dict:
@@ -82,77 +76,59 @@ class SMSService:
         NUEVO: Envía SMS con mensaje personalizado según idioma usando Twilio SMS básico
         """
         try:
-            print(f"🔥 [SMS Multi] Checking credentials...")
-            
             if not self.account_sid or not self.auth_token or not self.from_phone:
-                print("🔥 [SMS ERROR] Missing Twilio SMS credentials")
+                log.error("sms.missing_credentials", kind="sms")
                 return {"success": False, "error": "Missing SMS credentials (need TWILIO_PHONE_NUMBER)"}
             
             # Verificar idioma soportado
             if language not in supported_languages:
-                print(f"🔥 [SMS ERROR] Unsupported language: {language}")
+                log.error("sms.unsupported_language", language=language)
                 return {"success": False, "error": f"Unsupported language: {language}"}
             
             lang_config = supported_languages[language]
             
-            print(f"🔥 [SMS] Language: {language} ({lang_config['name']})")
-            print(f"🔥 [SMS] From: {self.from_phone}")
-            print(f"🔥 [SMS] To: {phone_number}")
-            
-            # Crear mensaje personalizado en el idioma correcto
-            message_template = lang_config["sms_message"]
-            personalized_message = message_template.replace("{code}", otp_code)
-            
-            print(f"🔥 [SMS] Message: {personalized_message}")
-            
-            # Payload para Twilio SMS básico
-            payload = {
-                "To": phone_number,
-                "From": self.from_phone,
-                "Body": personalized_message
-            }
-            
-            # Autenticación básica
-            credentials = f"{self.account_sid}:{self.auth_token}"
-            encoded_credentials = base64.b64encode(credentials.encode()).decode()
-            
-            headers = {
-                "Authorization": f"Basic {encoded_credentials}",
-                "Content-Type": "application/x-www-form-urlencoded"
-            }
-            
-            print(f"🔥 [SMS] Sending message...")
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.sms_base_url,
-                    data=payload,
-                    headers=headers,
-                    timeout=30.0
-                )
+            log.debug("sms.message_request", language=language, from_phone=self.from_phone, phone=phone_number)
+            
+            with span("payload"):
+                # Crear mensaje personalizado en el idioma correcto
+                message_template = lang_config["sms_message"]
+                personalized_message = message_template.replace("{code}", otp_code)
                 
-                print(f"🔥 [SMS] Status: {response.status_code}")
-                print(f"🔥 [SMS] Response: {response.text}")
+                # Payload para Twilio SMS básico
+                payload = {
+                    "To": phone_number,
+                    "From": self.from_phone,
+                    "Body": personalized_message
+                }
+                if self.status_callback_url:
+                    payload["StatusCallback"] = self.status_callback_url
+            
+            response = await provider_post(
+                http_clients.twilio, "twilio", self.account_sid, self.from_phone, self.sms_base_url,
+                operation="sms", data=payload
+            )
+            
+            log.debug("sms.response", status=response.status_code, body=response.text)
+            
+            if response.status_code == 201:  # Twilio SMS retorna 201
+                result = response.json()
+                log.info("sms.sent", phone=phone_number, language=language, sid=result.get("sid"))
+                return {
+                    "success": True,
+                    "sid": result.get("sid"),
+                    "status": result.get("status"),
+                    "to": result.get("to"),
+                    "language": language,
+                    "language_name": lang_config["name"],
+                    "message": personalized_message
+                }
+            else:
+                error_detail = response.text
+                log.error("sms.failed", status=response.status_code, body=error_detail)
+                return {"success": False, "error": f"Twilio error: {error_detail}"}
                 
-                if response.status_code == 201:  # Twilio SMS retorna 201
-                    result = response.json()
-                    print(f"🔥 [SMS SUCCESS] Message sent in {language} to {phone_number}")
-                    return {
-                        "success": True,
-                        "sid": result.get("sid"),
-                        "status": result.get("status"),
-                        "to": result.get("to"),
-                        "language": language,
-                        "language_name": lang_config["name"],
-                        "message": personalized_message
-                    }
-                else:
-                    error_detail = response.text
-                    print(f"🔥 [SMS ERROR] Failed with status {response.status_code}: {error_detail}")
-                    return {"success": False, "error": f"Twilio error: {error_detail}"}
-                    
         except Exception as e:
-            print(f"🔥 [SMS EXCEPTION] {str(e)}")
+            log.error("sms.exception", error=str(e))
             return {"success": False, "error": str(e)}
     
     async def verify_code(self, phone_number: str, code: str) -> dict:
@@ -164,63 +140,51 @@ class SMSService:
             if not self.verify_service_sid:
                 return {"success": False, "error": "Service SID not configured"}
             
-            print(f"🔥 [SMS Verify] Checking code {code} for {phone_number}")
-            
-            # URL para verificar código
-            url = f"{self.verify_base_url}/VerificationCheck"
-            
-            # Payload para verificación
-            payload = {
-                "To": phone_number,
-                "Code": code
-            }
-            
-            # Autenticación básica
-            credentials = f"{self.account_sid}:{self.auth_token}"
-            encoded_credentials = base64.b64encode(credentials.encode()).decode()
-            
-            headers = {
-                "Authorization": f"Basic {encoded_credentials}",
-                "Content-Type": "application/x-www-form-urlencoded"
-            }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url,
-                    data=payload,
-                    headers=headers,
-                    timeout=30.0
-                )
+            log.debug("sms.verify_check", phone=phone_number)
+            
+            with span("payload"):
+                # URL para verificar código
+                url = f"{self.verify_base_url}/VerificationCheck"
                 
-                print(f"🔥 [SMS Verify] Status: {response.status_code}")
-                print(f"🔥 [SMS Verify] Response: {response.text}")
+                # Payload para verificación
+                payload = {
+                    "To": phone_number,
+                    "Code": code
+                }
+            
+            response = await provider_post(
+                http_clients.twilio, "twilio", self.account_sid, self.verify_service_sid, url,
+                operation="verify_check", data=payload
+            )
+            
+            log.debug("sms.response", status=response.status_code, body=response.text)
+            
+            if response.status_code == 200:
+                result = response.json()
+                status = result.get("status")
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    status = result.get("status")
-                    
-                    if status == "approved":
-                        print(f"🔥 [SMS SUCCESS] Code verified for {phone_number}")
-                        return {
-                            "success": True,
-                            "valid": True,
-                            "status": status
-                        }
-                    else:
-                        print(f"🔥 [SMS ERROR] Code verification failed: {status}")
-                        return {
-                            "success": True,
-                            "valid": False,
-                            "status": status,
-                            "error": "Invalid or expired code"
-                        }
+                if status == "approved":
+                    log.info("sms.code_approved", phone=phone_number)
+                    return {
+                        "success": True,
+                        "valid": True,
+                        "status": status
+                    }
                 else:
-                    error_detail = response.text
-                    print(f"🔥 [SMS ERROR] Verification failed: {error_detail}")
-                    return {"success": False, "error": f"Verification error: {error_detail}"}
-                    
+                    log.warning("sms.code_rejected", phone=phone_number, status=status)
+                    return {
+                        "success": True,
+                        "valid": False,
+                        "status": status,
+                        "error": "Invalid or expired code"
+                    }
+            else:
+                error_detail = response.text
+                log.error("sms.verify_failed", status=response.status_code, body=error_detail)
+                return {"success": False, "error": f"Verification error: {error_detail}"}
+                
         except Exception as e:
-            print(f"🔥 [SMS Verify EXCEPTION] {str(e)}")
+            log.error("sms.exception", error=str(e))
             return {"success": False, "error": str(e)}
     
     def is_configured(self) -> bool:
@@ -0,0 +1,217 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+from fastapi import HTTPException, Request
+from app.services.logger import get_logger
+from app.services.metrics import metrics
+
+log = get_logger("throttle")
+
+otp_throttled_total = metrics.counter(
+    "tijzi_otp_throttled_total",
+    "Solicitudes de OTP rechazadas por límites de reenvío",
+    ("channel",),
+)
+
+
+class _Window:
+    """Contadores de la ventana actual y la anterior"""
+    __slots__ = ("start", "current", "previous")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.current = 0
+        self.previous = 0
+
+
+class SlidingWindowLimiter:
+    """
+    Límite de `limit` eventos por `window` segundos con ventana deslizante aproximada
+    (dos contadores por clave, ponderando la ventana anterior).
+
+    Memoria acotada: como máximo `max_keys` claves, se descartan las menos usadas.
+    """
+
+    def __init__(self, limit: int, window: float, max_keys: int = 100_000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[Hashable, _Window]" = OrderedDict()
+
+    def _get(self, key: Hashable, now: float) -> _Window:
+        entry = self._windows.get(key)
+        if entry is None:
+            entry = _Window(now - now % self.window)
+            self._windows[key] = entry
+            if len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+        else:
+            self._windows.move_to_end(key)
+        # Avanza la ventana si ya pasó
+        elapsed_windows = int((now - entry.start) // self.window)
+        if elapsed_windows >= 1:
+            entry.previous = entry.current if elapsed_windows == 1 else 0
+            entry.current = 0
+            entry.start += elapsed_windows * self.window
+        return entry
+
+    def retry_after(self, key: Hashable, now: Optional[float] = None) -> Optional[float]:
+        """Segundos a esperar si el siguiente evento excede el límite, None si se permite"""
+        if self.limit <= 0:
+            return None
+        now = time.time() if now is None else now
+        entry = self._get(key, now)
+        weight = 1 - (now - entry.start) / self.window
+        if entry.previous * weight + entry.current + 1 <= self.limit:
+            return None
+        if entry.current + 1 > self.limit:
+            return entry.start + self.window - now
+        # Tiempo hasta que el peso de la ventana anterior deje espacio
+        needed = entry.previous * weight + entry.current + 1 - self.limit
+        return max(needed / entry.previous * self.window, 0.001)
+
+    def hit(self, key: Hashable, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        self._get(key, now).current += 1
+
+
+class Cooldown:
+    """Tiempo mínimo entre dos eventos de la misma clave (memoria acotada)"""
+
+    def __init__(self, seconds: float, max_keys: int = 100_000):
+        self.seconds = seconds
+        self.max_keys = max_keys
+        self._last: "OrderedDict[Hashable, float]" = OrderedDict()
+
+    def retry_after(self, key: Hashable, now: Optional[float] = None) -> Optional[float]:
+        if self.seconds <= 0:
+            return None
+        now = time.time() if now is None else now
+        last = self._last.get(key)
+        if last is None or now - last >= self.seconds:
+            return None
+        return self.seconds - (now - last)
+
+    def hit(self, key: Hashable, now: Optional[float] = None):
+        self._last[key] = time.time() if now is None else now
+        self._last.move_to_end(key)
+        if len(self._last) > self.max_keys:
+            self._last.popitem(last=False)
+
+    def refund(self, key: Hashable):
+        """Anula el último evento de la clave (el siguiente se permite de inmediato)"""
+        self._last.pop(key, None)
+
+
+def client_ip(request: Request) -> str:
+    """
+    IP del cliente. Por defecto la de la conexión: X-Forwarded-For lo escribe
+    el cliente y solo se usa con TRUSTED_PROXY_HOPS > 0 (p. ej. 1 detrás del
+    proxy de Render), contando esas entradas desde el final (las añadidas por
+    proxies propios).
+    """
+    hops = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and hops > 0:
+        addresses = [address.strip() for address in forwarded.split(",") if address.strip()]
+        if addresses:
+            return addresses[max(0, len(addresses) - hops)]
+    return request.client.host if request.client else "unknown"
+
+
+class ResendThrottle:
+    """
+    Límites de reenvío de OTP antes de cualquier llamada al proveedor:
+    - cooldown y tope diario por número y canal
+    - topes por hora y por día por IP
+
+    Variables: OTP_COOLDOWN_SECONDS[_<CANAL>], OTP_DAILY_CAP[_<CANAL>],
+    OTP_IP_HOURLY_CAP, OTP_IP_DAILY_CAP, THROTTLE_MAX_KEYS.
+    """
+
+    def __init__(self):
+        self.max_keys = int(os.getenv("THROTTLE_MAX_KEYS", "100000"))
+        self._cooldowns = {}
+        self._daily = {}
+        self._ip_hourly = SlidingWindowLimiter(int(os.getenv("OTP_IP_HOURLY_CAP", "30")), 3600, self.max_keys)
+        self._ip_daily = SlidingWindowLimiter(int(os.getenv("OTP_IP_DAILY_CAP", "200")), 86400, self.max_keys)
+
+    def _channel_setting(self, name: str, channel: str, default: str) -> str:
+        return os.getenv(f"{name}_{channel.upper()}", os.getenv(name, default))
+
+    def _cooldown(self, channel: str) -> Cooldown:
+        cooldown = self._cooldowns.get(channel)
+        if cooldown is None:
+            seconds = float(self._channel_setting("OTP_COOLDOWN_SECONDS", channel, "60"))
+            cooldown = self._cooldowns[channel] = Cooldown(seconds, self.max_keys)
+        return cooldown
+
+    def _daily_cap(self, channel: str) -> SlidingWindowLimiter:
+        limiter = self._daily.get(channel)
+        if limiter is None:
+            cap = int(self._channel_setting("OTP_DAILY_CAP", channel, "10"))
+            limiter = self._daily[channel] = SlidingWindowLimiter(cap, 86400, self.max_keys)
+        return limiter
+
+    def check(self, channel: str, phone_number: str, ip: str) -> Optional[float]:
+        """
+        Registra el envío si está permitido. Si no, devuelve los segundos a esperar
+        (los intentos rechazados no consumen cupo).
+        """
+        now = time.time()
+        cooldown = self._cooldown(channel)
+        daily = self._daily_cap(channel)
+        checks = (
+            (cooldown, phone_number),
+            (daily, phone_number),
+            (self._ip_hourly, ip),
+            (self._ip_daily, ip),
+        )
+        waits = [limiter.retry_after(key, now) for limiter, key in checks]
+        waits = [wait for wait in waits if wait is not None]
+        if waits:
+            return max(waits)
+        for limiter, key in checks:
+            limiter.hit(key, now)
+        return None
+
+    def check_phone(self, channel: str, phone_number: str) -> Optional[float]:
+        """
+        Como `check` pero solo con los límites por número (cooldown y tope
+        diario). Lo usan los envíos por lote, que no tienen IP de cliente final.
+        """
+        now = time.time()
+        checks = ((self._cooldown(channel), phone_number), (self._daily_cap(channel), phone_number))
+        waits = [wait for wait in (limiter.retry_after(key, now) for limiter, key in checks) if wait is not None]
+        if waits:
+            return max(waits)
+        for limiter, key in checks:
+            limiter.hit(key, now)
+        return None
+
+    def refund(self, channel: str, phone_number: str):
+        """
+        Devuelve el cooldown de un envío que no llegó a salir (fallo del
+        proveedor): el usuario puede reintentar sin esperar. El tope diario y
+        los de IP siguen contando, así los fallos no permiten envíos ilimitados.
+        """
+        self._cooldown(channel).refund(phone_number)
+
+    def enforce(self, channel: str, phone_number: str, request: Request):
+        """Lanza 429 con Retry-After si el envío excede algún límite"""
+        ip = client_ip(request)
+        retry_after = self.check(channel, phone_number, ip)
+        if retry_after is not None:
+            otp_throttled_total.inc(channel)
+            log.warning("throttle.rejected", channel=channel, phone=phone_number, ip=ip, retry_after=round(retry_after, 1))
+            raise HTTPException(
+                status_code=429,
+                detail="Too many code requests. Try again later.",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+
+
+# Instancia global por proceso
+resend_throttle = ResendThrottle()
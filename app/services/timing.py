@@ -0,0 +1,150 @@
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+# Fases registradas por petición como máximo (el envío por lote podría generar miles)
+MAX_SPANS = 256
+
+# Eventos de httpcore (extensión "trace") → fase de la llamada al proveedor
+_TRACE_PHASES = {
+    "connect_tcp": "connect",
+    "start_tls": "tls",
+    "send_request_headers": "send",
+    "send_request_body": "send",
+    "receive_response_headers": "wait",
+    "receive_response_body": "body",
+}
+
+
+class RequestTiming:
+    """
+    Fases de una petición: (nombre, inicio y duración en segundos relativos al
+    inicio de la petición). Las tareas que crea la petición (failover,
+    single-flight) heredan la misma instancia y registran sus fases en ella.
+    """
+
+    __slots__ = ("started", "spans", "dropped")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+        self.dropped = 0
+
+    def add(self, name: str, started: float, duration: float):
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return
+        self.spans.append((name, started - self.started, duration))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def totals(self) -> Dict[str, float]:
+        """Duración acumulada por fase (varios intentos suman), en orden de aparición"""
+        totals: Dict[str, float] = {}
+        for name, _, duration in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration
+        return totals
+
+    def server_timing(self, total: float) -> str:
+        """Valor de la cabecera Server-Timing (duraciones en ms)"""
+        parts = [f"{name};dur={duration * 1000:.1f}" for name, duration in self.totals().items()]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_list(self) -> List[Dict]:
+        return [
+            {"name": name, "start_ms": round(start * 1000, 2), "duration_ms": round(duration * 1000, 2)}
+            for name, start, duration in self.spans
+        ]
+
+
+# Medición de la petición en curso (la crea ServerTimingMiddleware)
+timing_var: ContextVar[Optional[RequestTiming]] = ContextVar("timing", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """Mide el bloque como fase `name` de la petición en curso (sin petición no hace nada)"""
+    timing = timing_var.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, started, time.perf_counter() - started)
+
+
+def mark(name: str):
+    """Fase `name` desde el inicio de la petición hasta ahora (p. ej. validación del body)"""
+    timing = timing_var.get()
+    if timing is not None:
+        timing.add(name, timing.started, timing.elapsed())
+
+
+def provider_trace(prefix: str) -> Optional[Callable[[str, Dict], Awaitable[None]]]:
+    """
+    Callback de la extensión "trace" de httpx: separa conexión TCP, TLS, envío,
+    espera de la respuesta y lectura del body como `prefix.connect`, `prefix.tls`...
+    None fuera de una petición medida.
+    """
+    timing = timing_var.get()
+    if timing is None:
+        return None
+    opened: Dict[str, float] = {}
+
+    async def trace(event: str, info: Dict):
+        name, _, stage = event.rpartition(".")
+        phase = _TRACE_PHASES.get(name.rpartition(".")[2])
+        if phase is None:
+            return
+        now = time.perf_counter()
+        if stage == "started":
+            opened[name] = now
+        elif name in opened:
+            started = opened.pop(name)
+            timing.add(f"{prefix}.{phase}", started, now - started)
+
+    return trace
+
+
+class SlowRequestLog:
+    """
+    Últimas peticiones que superaron `threshold` segundos, con todas sus
+    fases, en un buffer circular de `capacity` entradas (solo memoria del
+    proceso). Con threshold 0 no se guarda nada.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, capacity: Optional[int] = None):
+        self.threshold = threshold if threshold is not None else float(os.getenv("SLOW_REQUEST_MS", "1000")) / 1000
+        self.capacity = capacity or int(os.getenv("SLOW_REQUEST_BUFFER", "100"))
+        self.recorded_total = 0
+        self._entries: Deque[Dict] = deque(maxlen=self.capacity)
+
+    def maybe_record(self, timing: RequestTiming, total: float, **request) -> bool:
+        if self.threshold <= 0 or total < self.threshold:
+            return False
+        entry = dict(request, ts=round(time.time(), 3), total_ms=round(total * 1000, 2), spans=timing.to_list())
+        if timing.dropped:
+            entry["spans_dropped"] = timing.dropped
+        self._entries.append(entry)
+        self.recorded_total += 1
+        return True
+
+    def snapshot(self) -> Dict:
+        """Más recientes primero"""
+        return {
+            "threshold_ms": round(self.threshold * 1000, 1),
+            "capacity": self.capacity,
+            "recorded_total": self.recorded_total,
+            "requests": list(reversed(self._entries)),
+        }
+
+
+# Instancia global (una por proceso)
+slow_requests = SlowRequestLog()
@@ -0,0 +1,106 @@
+import json
+import re
+from typing import Dict, List, Optional
+
+# Marcadores de los huecos del payload (to, code); json los serializa como "\u0000to\u0000"
+_SLOT_NAMES = ("to", "code")
+_SLOT_RE = re.compile(r'"\\u0000(to|code)\\u0000"')
+
+# Cabecera del cuerpo pre-serializado (la autenticación va en el cliente compartido)
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Templates OTP con parámetros de body y botón
+OTP_TEMPLATES = ("otp_login", "otp_tijzi", "otp_login_whatsapp")
+
+
+def _slot(name: str) -> str:
+    return f"\x00{name}\x00"
+
+
+def _json_string(value: str) -> bytes:
+    # Teléfonos y códigos son dígitos: no necesitan escape
+    if value.isdigit():
+        return b'"' + value.encode() + b'"'
+    return json.dumps(value, ensure_ascii=False).encode()
+
+
+class PayloadTemplate:
+    """
+    Payload de WhatsApp serializado una sola vez.
+
+    El JSON se guarda como segmentos de bytes alrededor de los huecos `to` y
+    `code`; por petición solo se intercalan esos dos valores.
+    """
+    __slots__ = ("template_name", "language_code", "segments", "slots")
+
+    def __init__(self, payload: Dict):
+        self.template_name = payload["template"]["name"]
+        self.language_code = payload["template"]["language"]["code"]
+        raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        parts = _SLOT_RE.split(raw)
+        self.segments: List[bytes] = [part.encode() for part in parts[0::2]]
+        self.slots: List[int] = [_SLOT_NAMES.index(name) for name in parts[1::2]]
+
+    def render(self, to: str, code: str) -> bytes:
+        values = (_json_string(to), _json_string(code))
+        segments = self.segments
+        chunks = [segments[0]]
+        for index, slot in enumerate(self.slots, 1):
+            chunks.append(values[slot])
+            chunks.append(segments[index])
+        return b"".join(chunks)
+
+
+def template_payload(template_name: str, language_code: str, with_code: bool = True) -> Dict:
+    """Payload de template con el código en el body y en el botón URL"""
+    template = {"name": template_name, "language": {"code": language_code}}
+    if with_code:
+        template["components"] = [
+            {
+                "type": "body",
+                "parameters": [{"type": "text", "text": _slot("code")}]
+            },
+            {
+                "type": "button",
+                "sub_type": "url",
+                "index": "0",
+                "parameters": [{"type": "text", "text": _slot("code")}]
+            }
+        ]
+    return {
+        "messaging_product": "whatsapp",
+        "to": _slot("to"),
+        "type": "template",
+        "template": template,
+    }
+
+
+def default_payload(template_name: str) -> PayloadTemplate:
+    """
+    Payload de /auth/send-code según TEMPLATE_NAME:
+    hello_world (prueba, sin parámetros), templates OTP o estructura básica
+    """
+    if template_name == "hello_world":
+        return PayloadTemplate(template_payload(template_name, "en_US", with_code=False))
+    if template_name in OTP_TEMPLATES:
+        return PayloadTemplate(template_payload(template_name, "es"))
+    return PayloadTemplate(template_payload(template_name, "es", with_code=False))
+
+
+def language_payloads(supported_languages: Dict[str, Dict]) -> Dict[str, PayloadTemplate]:
+    """Un payload por idioma con su template y código de idioma"""
+    return {
+        language: PayloadTemplate(template_payload(config["whatsapp_template"], config["whatsapp_language_code"]))
+        for language, config in supported_languages.items()
+    }
+
+
+class WhatsAppPayloads:
+    """Payloads precompilados de /auth/send-code y de cada idioma soportado"""
+
+    def __init__(self, template_name: str, supported_languages: Dict[str, Dict]):
+        self.default = default_payload(template_name)
+        self.by_language = language_payloads(supported_languages)
+
+    def for_language(self, language: str) -> Optional[PayloadTemplate]:
+        return self.by_language.get(language)
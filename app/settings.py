@@ -0,0 +1,100 @@
+import os
+from typing import Callable, List, Optional
+from app.services.http_clients import WHATSAPP_BASE_URL, TWILIO_API_URL, TWILIO_VERIFY_URL
+from app.services.languages import SUPPORTED_LANGUAGES
+from app.services.whatsapp_payloads import WhatsAppPayloads
+
+
+class SettingsError(ValueError):
+    """Configuración de proveedores inválida"""
+
+
+def _env(name: str, default: Optional[str] = None) -> Optional[str]:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip() or default
+
+
+class Settings:
+    """
+    Configuración de WhatsApp y Twilio leída y validada una sola vez.
+
+    Además de las credenciales guarda todo lo que antes se recalculaba por
+    petición: URLs de cada API y los payloads de WhatsApp pre-serializados
+    (por idioma y el de /auth/send-code).
+    """
+
+    def __init__(self):
+        # WhatsApp Cloud API
+        self.access_token: Optional[str] = _env("ACCESS_TOKEN")
+        self.phone_number_id: Optional[str] = _env("PHONE_NUMBER_ID")
+        self.template_name: str = _env("TEMPLATE_NAME", "otp_tijzi")
+
+        # Twilio
+        self.twilio_account_sid: Optional[str] = _env("TWILIO_ACCOUNT_SID")
+        self.twilio_auth_token: Optional[str] = _env("TWILIO_AUTH_TOKEN")
+        self.twilio_verify_service_sid: Optional[str] = _env("TWILIO_VERIFY_SERVICE_SID")
+        self.twilio_phone_number: Optional[str] = _env("TWILIO_PHONE_NUMBER")
+
+        # Webhooks de estado de entrega
+        self.public_base_url: Optional[str] = _env("PUBLIC_BASE_URL")
+        self.whatsapp_app_secret: Optional[str] = _env("WHATSAPP_APP_SECRET")
+        self.whatsapp_webhook_verify_token: Optional[str] = _env("WHATSAPP_WEBHOOK_VERIFY_TOKEN")
+
+        self.validate()
+
+        # Derivados
+        self.whatsapp_configured = bool(self.access_token and self.phone_number_id)
+        self.whatsapp_messages_url = f"{WHATSAPP_BASE_URL}/{self.phone_number_id}/messages"
+        self.whatsapp_payloads = WhatsAppPayloads(self.template_name, SUPPORTED_LANGUAGES)
+        self.twilio_verify_url = f"{TWILIO_VERIFY_URL}/v2/Services/{self.twilio_verify_service_sid}"
+        self.twilio_messages_url = f"{TWILIO_API_URL}/2010-04-01/Accounts/{self.twilio_account_sid}/Messages.json"
+        # Twilio solo envía callbacks de estado si el mensaje los pide (StatusCallback)
+        self.public_base_url = self.public_base_url.rstrip("/") if self.public_base_url else None
+        self.twilio_status_callback_url = (
+            f"{self.public_base_url}/webhooks/twilio/status" if self.public_base_url else None
+        )
+
+    def validate(self):
+        """Las credenciales pueden faltar (canal no configurado), pero no estar mal formadas"""
+        errors: List[str] = []
+        if self.phone_number_id and not self.phone_number_id.isdigit():
+            errors.append("PHONE_NUMBER_ID must be numeric")
+        if self.twilio_account_sid and not self.twilio_account_sid.startswith("AC"):
+            errors.append("TWILIO_ACCOUNT_SID must start with 'AC'")
+        if self.twilio_verify_service_sid and not self.twilio_verify_service_sid.startswith("VA"):
+            errors.append("TWILIO_VERIFY_SERVICE_SID must start with 'VA'")
+        if self.public_base_url and not self.public_base_url.startswith(("https://", "http://")):
+            errors.append("PUBLIC_BASE_URL must be an absolute http(s) URL")
+        if errors:
+            raise SettingsError("Invalid configuration: " + "; ".join(errors))
+
+
+_settings: Optional[Settings] = None
+_reload_callbacks: List[Callable[[Settings], None]] = []
+
+
+def get_settings() -> Settings:
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+    return _settings
+
+
+def reload_settings() -> Settings:
+    """
+    Vuelve a leer las variables de entorno. Si la nueva configuración es
+    inválida se lanza SettingsError y se mantiene la anterior.
+    """
+    global _settings
+    settings = Settings()
+    _settings = settings
+    for callback in _reload_callbacks:
+        callback(settings)
+    return settings
+
+
+def on_reload(callback: Callable[[Settings], None]):
+    """Registra una función que recibe la nueva configuración tras cada recarga"""
+    _reload_callbacks.append(callback)
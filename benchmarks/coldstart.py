@@ -0,0 +1,106 @@
+"""
+Arranque en frío: cada medición es un proceso Python nuevo que importa la
+aplicación, ejecuta el startup y envía /auth/send-code (proveedores simulados)
+hasta la primera respuesta 200.
+
+    python -m benchmarks.run --only coldstart --import-budget-ms 600
+
+Fases: interpreter_ms (hasta ejecutar este módulo), import_ms (import
+app.main), startup_ms, first_send_ms y total_ms (desde el spawn del proceso
+hasta el primer envío correcto).
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+PHASES = ("interpreter_ms", "import_ms", "startup_ms", "first_send_ms", "total_ms")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+def _child(latency: float, spawned_at: float) -> Dict:
+    """Proceso hijo: una medición (se imprime en JSON por stdout)"""
+    started = time.time()
+    from app.main import app
+    imported = time.time()
+
+    import asyncio
+    import httpx
+    from app.services.http_clients import http_clients
+    from benchmarks.fakes import FakeProviders
+
+    async def first_send() -> Dict:
+        http_clients.transport = FakeProviders(latency=latency, seed=42).transport
+        startup_started = time.time()
+        await app.router.startup()
+        ready = time.time()
+        attempts = 0
+        try:
+            async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+                while True:
+                    attempts += 1
+                    response = await client.post(
+                        "/auth/send-code", json={"countryCode": "+57", "phoneNumber": "3000000001"}
+                    )
+                    if response.status_code == 200 or attempts >= 10:
+                        break
+            sent = time.time()
+        finally:
+            await app.router.shutdown()
+        return {
+            "interpreter_ms": _ms(started - spawned_at),
+            "import_ms": _ms(imported - started),
+            "startup_ms": _ms(ready - startup_started),
+            "first_send_ms": _ms(sent - ready),
+            "total_ms": _ms(sent - spawned_at),
+            "attempts": attempts,
+            "status": response.status_code,
+        }
+
+    return asyncio.run(first_send())
+
+
+def _spawn(latency: float) -> Dict:
+    spawned_at = time.time()
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.coldstart", str(latency), repr(spawned_at)],
+        cwd=ROOT, env=os.environ.copy(), capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_profile(top: int = 10) -> List[Dict]:
+    """Módulos con más tiempo propio de importación (python -X importtime)"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT, env=os.environ.copy(), capture_output=True, text=True, check=True,
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        modules.append({"module": name.strip(), "self_ms": _ms(int(own) / 1e6), "cumulative_ms": _ms(int(cumulative) / 1e6)})
+    modules.sort(key=lambda module: module["self_ms"], reverse=True)
+    return modules[:top]
+
+
+def run_coldstart(runs: int = 5, latency: float = 0.05) -> Dict[str, Dict]:
+    """Mediana de cada fase sobre `runs` procesos nuevos"""
+    samples = [_spawn(latency) for _ in range(runs)]
+    failed = [sample for sample in samples if sample["status"] != 200]
+    result = {phase: round(statistics.median(sample[phase] for sample in samples), 1) for phase in PHASES}
+    result["runs"] = runs
+    result["error_rate"] = round(len(failed) / runs, 4)
+    return {"send_code": result}
+
+
+if __name__ == "__main__":
+    print(json.dumps(_child(float(sys.argv[1]), float(sys.argv[2]))))
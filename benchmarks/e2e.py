@@ -0,0 +1,92 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+
+from benchmarks.fakes import FakeProviders
+
+
+def summarize(latencies: List[float], statuses: Dict[int, int], elapsed: float) -> Dict:
+    ordered = sorted(latencies)
+    count = len(ordered)
+
+    def percentile(q: float) -> float:
+        return round(ordered[min(count - 1, int(q * count))] * 1000, 2)
+
+    errors = sum(n for status, n in statuses.items() if status >= 400)
+    return {
+        "requests": count,
+        "throughput_rps": round(count / elapsed, 1),
+        "mean_ms": round(sum(ordered) / count * 1000, 2),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "error_rate": round(errors / count, 4),
+        "statuses": {str(status): n for status, n in sorted(statuses.items())},
+    }
+
+
+async def drive(client: httpx.AsyncClient, build: Callable[[int], Tuple[str, Dict]], requests: int, concurrency: int) -> Dict:
+    """Lanza `requests` peticiones (`build(i)` → (ruta, body)) con `concurrency` clientes a la vez"""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    indexes = iter(range(requests))
+
+    async def user():
+        for index in indexes:
+            path, body = build(index)
+            started = time.perf_counter()
+            response = await client.post(path, json=body)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+
+def _number(scenario: int, index: int) -> str:
+    # Números colombianos distintos por escenario: 3SS + 7 dígitos
+    return f"3{scenario:02d}{index:07d}"
+
+
+async def run_e2e(fakes: FakeProviders, requests: int = 500, concurrency: int = 50) -> Dict[str, Dict]:
+    """
+    Recorre los endpoints de OTP contra proveedores simulados, en proceso
+    (ASGI, sin red). Cada endpoint de verificación usa los códigos que
+    "recibió" el proveedor simulado en el escenario de envío anterior.
+    """
+    from app.main import app
+    from app.services.http_clients import http_clients
+
+    http_clients.transport = fakes.transport
+    results: Dict[str, Dict] = {}
+
+    def phone_body(scenario: int, index: int, **extra) -> Dict:
+        return dict({"countryCode": "+57", "phoneNumber": _number(scenario, index)}, **extra)
+
+    def code_for(scenario: int, index: int) -> str:
+        return fakes.codes.get("+57" + _number(scenario, index), "000000")
+
+    scenarios = [
+        ("send_code", lambda i: ("/auth/send-code", phone_body(1, i))),
+        ("verify_code", lambda i: ("/auth/verify-code", phone_body(1, i, otp=code_for(1, i)))),
+        ("send_sms", lambda i: ("/auth/send-sms", phone_body(2, i))),
+        ("verify_sms", lambda i: ("/auth/verify-sms", phone_body(2, i, code="123456"))),
+        ("send_otp_multilingual_whatsapp", lambda i: (
+            "/auth/send-otp-multilingual", phone_body(3, i, channel="whatsapp", language="pt"))),
+        ("send_otp_multilingual_sms", lambda i: (
+            "/auth/send-otp-multilingual", phone_body(4, i, channel="sms", language="en"))),
+        ("verify_code_after_sms", lambda i: ("/auth/verify-code", phone_body(4, i, otp=code_for(4, i)))),
+    ]
+
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+            for name, build in scenarios:
+                results[name] = await drive(client, build, requests, concurrency)
+    finally:
+        await app.router.shutdown()
+        http_clients.transport = None
+    return results
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import random
+import secrets
+from typing import Dict, Optional
+from urllib.parse import parse_qsl
+
+import httpx
+
+
+class FakeProviders:
+    """
+    Graph (WhatsApp) y Twilio simulados en proceso, como transporte de httpx.
+
+    Cada llamada espera `latency` segundos (± `jitter`) y falla con 500 con
+    probabilidad `error_rate`. Guarda el último código enviado por número para
+    que el benchmark pueda verificarlo como lo haría el usuario.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.codes: Dict[str, str] = {}
+        self.calls: Dict[str, int] = {}
+
+    @property
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        operation = self._operation(request)
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if request.method == "POST" and self.random.random() < self.error_rate:
+            return httpx.Response(500, json={"error": "simulated failure"})
+
+        if operation == "graph_probe":
+            return httpx.Response(200, json={"id": "123"})
+        if operation == "twilio_probe":
+            return httpx.Response(200, json={"sid": "AC00000000000000000000000000000000"})
+        if operation == "graph_messages":
+            return self._graph_message(request)
+        if operation == "verify_check":
+            return httpx.Response(200, json={"status": "approved"})
+        if operation == "verify":
+            return httpx.Response(201, json={"sid": "VE" + secrets.token_hex(16), "status": "pending"})
+        return self._twilio_message(request)
+
+    @staticmethod
+    def _operation(request: httpx.Request) -> str:
+        path = request.url.path
+        if "graph" in request.url.host:
+            return "graph_messages" if path.endswith("/messages") else "graph_probe"
+        if path.endswith("/VerificationCheck"):
+            return "verify_check"
+        if path.endswith("/Verifications"):
+            return "verify"
+        if path.endswith("/Messages.json"):
+            return "sms"
+        return "twilio_probe"
+
+    def _graph_message(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        components = payload["template"].get("components")
+        if components:
+            self.codes["+" + payload["to"]] = components[0]["parameters"][0]["text"]
+        return httpx.Response(200, json={"messages": [{"id": "wamid." + secrets.token_hex(12)}]})
+
+    def _twilio_message(self, request: httpx.Request) -> httpx.Response:
+        form = dict(parse_qsl(request.content.decode()))
+        body = form.get("Body", "")
+        self.codes[form.get("To", "")] = body.split(" ", 1)[0]
+        return httpx.Response(201, json={"sid": "SM" + secrets.token_hex(16), "status": "queued", "to": form.get("To")})
@@ -0,0 +1,165 @@
+import itertools
+import json
+import os
+import time
+import timeit
+from typing import Callable, Dict
+from urllib.parse import urlencode
+
+from fastapi.encoders import jsonable_encoder
+
+from app.fast_json import dumps, loads
+from app.services.languages import SUPPORTED_LANGUAGES
+from app.services.otp_hmac import HMACOTP
+from app.services.otp_journal import JournalReader, otp_journal
+from app.services.otp_service import OTPService
+from app.services.otp_shm import SharedMemoryOTPStorage
+from app.services.otp_store import OTPStore
+from app.services.phone import normalize_phone
+from app.services.session_tokens import SessionTokens
+from app.services.whatsapp_payloads import language_payloads, template_payload
+
+
+def measure(function: Callable[[], object], repeat: int = 5) -> Dict[str, float]:
+    """Mejor de `repeat` rondas (cada ronda dura al menos 0,2 s)"""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return {"us_per_op": round(best * 1e6, 3), "ops_per_sec": round(1 / best, 1)}
+
+
+def measure_each(function: Callable[..., object], items) -> Dict[str, float]:
+    """Una pasada sobre `items` preparados (operaciones que consumen estado, como verificar)"""
+    items = list(items)
+    started = timeit.default_timer()
+    for item in items:
+        function(*item)
+    elapsed = (timeit.default_timer() - started) / len(items)
+    return {"us_per_op": round(elapsed * 1e6, 3), "ops_per_sec": round(1 / elapsed, 1)}
+
+
+def _phones():
+    # Números distintos en cada llamada (como usuarios reales), dentro de la numeración de Colombia
+    return (f"+573{n:09d}" for n in itertools.count())
+
+
+def bench_otp(repeat: int) -> Dict[str, Dict]:
+    results = {}
+
+    service = OTPService(storage=OTPStore(max_entries=1_000_000), mode="stored")
+    phones = _phones()
+    results["otp.generate"] = measure(lambda: service.generate_and_store_code(next(phones)), repeat)
+
+    issued = [(phone, service.generate_and_store_code(phone)) for phone in itertools.islice(phones, 100_000)]
+    results["otp.verify"] = measure_each(service.verify_code, issued)
+
+    # Memoria compartida entre workers (segmento propio del benchmark)
+    shm = SharedMemoryOTPStorage(name=f"tijzi-benchmark-{os.getpid()}", capacity=262_144)
+    try:
+        service = OTPService(storage=shm, mode="stored")
+        phones = _phones()
+        results["otp.generate_shm"] = measure(lambda: service.generate_and_store_code(next(phones)), repeat)
+        shm.purge_expired(now=time.time() + shm.ttl + 1)
+        issued = [(phone, service.generate_and_store_code(phone)) for phone in itertools.islice(_phones(), 100_000)]
+        results["otp.verify_shm"] = measure_each(service.verify_code, issued)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    hmac_otp = HMACOTP(b"benchmark-secret")
+    phones = _phones()
+    results["otp.generate_hmac"] = measure(lambda: hmac_otp.generate(next(phones)), repeat)
+    issued = [(phone, hmac_otp.generate(phone)) for phone in itertools.islice(_phones(), 50_000)]
+    results["otp.verify_hmac"] = measure_each(hmac_otp.verify, issued)
+    return results
+
+
+def bench_tokens(repeat: int) -> Dict[str, Dict]:
+    tokens = SessionTokens(secret="benchmark-secret")
+    token = tokens.issue("+573004051582", method="otp")
+    return {
+        "token.issue": measure(lambda: tokens.issue("+573004051582", method="otp"), repeat),
+        "token.verify_cached": measure(lambda: tokens.verify(token), repeat),
+        "token.verify_uncached": measure(lambda: tokens._decode(token), repeat),
+    }
+
+
+def bench_payloads(repeat: int) -> Dict[str, Dict]:
+    template = language_payloads(SUPPORTED_LANGUAGES)["es"]
+    config = SUPPORTED_LANGUAGES["es"]
+
+    def whatsapp_dict():
+        # Camino anterior: dict anidado por petición + json.dumps
+        payload = template_payload(config["whatsapp_template"], config["whatsapp_language_code"])
+        payload["to"] = "573004051582"
+        for component in payload["template"]["components"]:
+            component["parameters"][0]["text"] = "123456"
+        return json.dumps(payload).encode()
+
+    def sms_form():
+        body = config["sms_message"].replace("{code}", "123456")
+        return urlencode({"To": "+573004051582", "From": "+15550000000", "Body": body}).encode()
+
+    return {
+        "payload.whatsapp_precompiled": measure(lambda: template.render("573004051582", "123456"), repeat),
+        "payload.whatsapp_dict": measure(whatsapp_dict, repeat),
+        "payload.sms_form": measure(sms_form, repeat),
+    }
+
+
+def bench_phone(repeat: int) -> Dict[str, Dict]:
+    uncached = normalize_phone.__wrapped__
+    normalize_phone("+57", "300 405 1582")
+    return {
+        "phone.normalize_cached": measure(lambda: normalize_phone("+57", "300 405 1582"), repeat),
+        "phone.normalize_uncached": measure(lambda: uncached("+57", "300 405 1582"), repeat),
+    }
+
+
+def bench_json(repeat: int) -> Dict[str, Dict]:
+    body = b'{"countryCode": "+57", "phoneNumber": "3004051582", "otp": "123456"}'
+    response = {
+        "message": "Code verified successfully",
+        "session_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9." + "x" * 120,
+        "user_id": "+573004051582",
+        "method": "Twilio Verify",
+        "status": "approved",
+    }
+    return {
+        "json.decode_fast": measure(lambda: loads(body), repeat),
+        "json.decode_stdlib": measure(lambda: json.loads(body), repeat),
+        # Camino anterior: jsonable_encoder + json.dumps (JSONResponse por defecto)
+        "json.encode_fast": measure(lambda: dumps(response), repeat),
+        "json.encode_default": measure(lambda: json.dumps(jsonable_encoder(response)).encode(), repeat),
+    }
+
+
+def bench_journal(repeat: int) -> Dict[str, Dict]:
+    # Coste en el event loop (serializar + buffer) y velocidad del lector mmap
+    phones = _phones()
+    results = {"journal.append": measure(lambda: otp_journal.append("verified", next(phones), method="otp"), repeat)}
+    otp_journal.close()
+    otp_journal.start()
+    reader = JournalReader(otp_journal.directory)
+    scanned = [0]
+
+    def scan():
+        scanned[0] = sum(1 for _ in reader.scan(event="verified"))
+
+    timing = measure(scan, 1)
+    seconds = timing["us_per_op"] / 1e6
+    results["journal.scan"] = {"records": scanned[0], "records_per_sec": round(scanned[0] / seconds, 1) if seconds else 0}
+    return results
+
+
+def run_micro(repeat: int = 5) -> Dict[str, Dict]:
+    results = {}
+    # El journal escribe como en producción (hilo escritor con group commit)
+    otp_journal.start()
+    try:
+        for bench in (bench_otp, bench_tokens, bench_payloads, bench_phone, bench_json, bench_journal):
+            results.update(bench(repeat))
+    finally:
+        otp_journal.close()
+    results["journal.writer"] = otp_journal.stats()
+    return results
@@ -0,0 +1,172 @@
+"""
+Benchmarks del flujo OTP (sin red: proveedores simulados en proceso).
+
+    python -m benchmarks.run                       # micro + end-to-end + arranque en frío
+    python -m benchmarks.run --only micro
+    python -m benchmarks.run --only coldstart --import-budget-ms 600
+    python -m benchmarks.run --latency-ms 120 --error-rate 0.02 --concurrency 100
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+
+Los resultados se guardan en JSON (benchmarks/results/<fecha>.json). Con
+--compare se marcan las métricas que empeoran más de --threshold respecto a
+otra ejecución y el proceso termina con código 1, igual que si la importación
+de la aplicación supera --import-budget-ms (o IMPORT_BUDGET_MS).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# Configuración del entorno de benchmark antes de importar la aplicación:
+# credenciales ficticias y límites de reenvío / envío desactivados
+BENCHMARK_ENV = {
+    "ACCESS_TOKEN": "benchmark-token",
+    "PHONE_NUMBER_ID": "100000000000000",
+    "TWILIO_ACCOUNT_SID": "AC00000000000000000000000000000000",
+    "TWILIO_AUTH_TOKEN": "benchmark-token",
+    "TWILIO_VERIFY_SERVICE_SID": "VA00000000000000000000000000000000",
+    "TWILIO_PHONE_NUMBER": "+15550000000",
+    "SESSION_TOKEN_SECRET": "benchmark-secret",
+    "OTP_COOLDOWN_SECONDS": "0",
+    "OTP_DAILY_CAP": "0",
+    "OTP_IP_HOURLY_CAP": "0",
+    "OTP_IP_DAILY_CAP": "0",
+    "WHATSAPP_RATE_LIMIT": "1000000",
+    "WHATSAPP_SENDER_RATE_LIMIT": "1000000",
+    "TWILIO_RATE_LIMIT": "1000000",
+    "TWILIO_SENDER_RATE_LIMIT": "1000000",
+    "DELIVERY_RECEIPTS_PATH": "",
+    "OTP_JOURNAL_DIR": os.path.join(tempfile.gettempdir(), "tijzi-benchmark-journal"),
+    "LOG_LEVEL": "ERROR",
+}
+
+# Métricas donde "más" es peor / mejor
+HIGHER_IS_WORSE = (
+    "us_per_op", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "error_rate",
+    "interpreter_ms", "import_ms", "startup_ms", "first_send_ms", "total_ms",
+)
+LOWER_IS_WORSE = ("ops_per_sec", "throughput_rps")
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks del flujo OTP de Tijzi")
+    parser.add_argument("--only", choices=["micro", "e2e", "coldstart"], help="Ejecutar solo una parte")
+    parser.add_argument("--repeat", type=int, default=5, help="Rondas por micro-benchmark")
+    parser.add_argument("--requests", type=int, default=500, help="Peticiones por escenario end-to-end")
+    parser.add_argument("--concurrency", type=int, default=50, help="Clientes concurrentes")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Latencia de los proveedores simulados")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Variación de la latencia simulada")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de 500 del proveedor")
+    parser.add_argument("--cold-runs", type=int, default=5, help="Procesos nuevos por medición de arranque en frío")
+    parser.add_argument(
+        "--import-budget-ms", type=float,
+        default=float(os.environ["IMPORT_BUDGET_MS"]) if os.getenv("IMPORT_BUDGET_MS") else None,
+        help="Tiempo máximo de import app.main (mediana); si se supera el proceso termina con código 1",
+    )
+    parser.add_argument("--output", help="Archivo de resultados (por defecto benchmarks/results/<fecha>.json)")
+    parser.add_argument("--compare", help="Resultados previos contra los que buscar regresiones")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Empeoramiento tolerado (0.10 = 10%%)")
+    return parser.parse_args(argv)
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Lista de regresiones: 'e2e.send_code.p95_ms: 12.1 → 15.3 (+26%)'"""
+    regressions = []
+    for section in ("micro", "e2e", "coldstart"):
+        for name, metrics in current.get(section, {}).items():
+            previous = baseline.get(section, {}).get(name)
+            if not previous:
+                continue
+            for metric, value in metrics.items():
+                old = previous.get(metric)
+                if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old == 0:
+                    continue
+                change = (value - old) / old
+                worse = change > threshold if metric in HIGHER_IS_WORSE else (
+                    -change > threshold if metric in LOWER_IS_WORSE else False
+                )
+                if worse:
+                    regressions.append(f"{section}.{name}.{metric}: {old} → {value} ({change:+.0%})")
+    return regressions
+
+
+def print_table(section: str, results: Dict[str, Dict]):
+    for name, metrics in results.items():
+        shown = {k: v for k, v in metrics.items() if k != "statuses"}
+        print(f"{section:9} {name:34} " + "  ".join(f"{k}={v}" for k, v in shown.items()))
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    for name, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(name, value)
+    # El journal de benchmark empieza vacío en cada ejecución (solo el directorio por defecto)
+    if os.environ["OTP_JOURNAL_DIR"] == BENCHMARK_ENV["OTP_JOURNAL_DIR"]:
+        shutil.rmtree(BENCHMARK_ENV["OTP_JOURNAL_DIR"], ignore_errors=True)
+
+    report: Dict = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+    }
+
+    if args.only in (None, "micro"):
+        from benchmarks.micro import run_micro
+        report["micro"] = run_micro(args.repeat)
+        print_table("micro", report["micro"])
+
+    if args.only in (None, "e2e"):
+        from benchmarks.e2e import run_e2e
+        from benchmarks.fakes import FakeProviders
+        fakes = FakeProviders(
+            latency=args.latency_ms / 1000,
+            jitter=args.jitter_ms / 1000,
+            error_rate=args.error_rate,
+            seed=42,
+        )
+        report["e2e"] = asyncio.run(run_e2e(fakes, args.requests, args.concurrency))
+        report["provider_calls"] = fakes.calls
+        print_table("e2e", report["e2e"])
+
+    over_budget = False
+    if args.only in (None, "coldstart"):
+        from benchmarks.coldstart import import_profile, run_coldstart
+        report["coldstart"] = run_coldstart(args.cold_runs, args.latency_ms / 1000)
+        report["import_profile"] = import_profile()
+        print_table("coldstart", report["coldstart"])
+        for module in report["import_profile"]:
+            print(f"{'import':9} {module['module']:34} self_ms={module['self_ms']}  cumulative_ms={module['cumulative_ms']}")
+        import_ms = report["coldstart"]["send_code"]["import_ms"]
+        if args.import_budget_ms is not None and import_ms > args.import_budget_ms:
+            print(f"\nImport budget exceeded: import app.main {import_ms} ms > {args.import_budget_ms} ms")
+            over_budget = True
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", time.strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults: {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\nRegressions (> {args.threshold:.0%}):")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print("\nNo regressions")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))